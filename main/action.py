@@ -3,79 +3,43 @@
 # ==============================================================================
 # 0. 导入所有需要的库
 # ==============================================================================
+import argparse
 import winsound
 import time
 import random
-import sys
 # 从拆分出去的模块中导入我们需要的类
 from vision import OCRWatcher
+from ocr_worker import OCRWorkerPool
 from executors import ActionExecutor, PyAutoGuiExecutor
-from workflows import GameExiter, GameStarter
+from trajectory import TrajectoryEngine
+from workflows import GameExiter, GameStarter, RoundStateMachine
+from states import ScreenStateClassifier
+from scheduler import AdaptivePollScheduler
+from metrics import MetricsRecorder
+from logs import FileWriter, LogPipeline
+from preprocess import load_pipelines
+from screen_sources import create_source, screen_size
+from locator import UILocator
+from watchdog import StallWatchdog, default_recoveries
+from profiling import ResourceProfiler
 
 # ==============================================================================
-# 1. 配置常量
+# 1. 配置常量（定义在 config.py 中）
 # ==============================================================================
-# --- OCR 配置 ---
-# 定义了需要监控的屏幕区域 (左上角x, 左上角y, 宽度, 高度)
-MONITOR_REGION = (895, 1003, 283, 45)  
-# 定义了OCR需要识别的目标文字
-TARGET_TEXT = "精通科目开启"
-# 定义了识别出的文字与目标文字的相似度阈值，高于此值才算成功
-SIMILARITY_THRESHOLD = 0.80
+from config import (
+    MONITOR_REGION, TARGET_TEXT, SIMILARITY_THRESHOLD, CHANGE_SENSITIVITY, RECOGNIZE_ONLY, CROP_TEXT_ROWS, TEMPLATE_DIR,
+    OCR_CONFUSIONS, PREPROCESS_PIPELINES_PATH, RECORD_SESSION_PATH,
+    STARTUP_BUDGET, STARTUP_LOG, OCR_WORKERS, CAPTURE_INTERVAL, OCR_BACKEND, OCR_BACKEND_OPTIONS,
+    ADAPTIVE_POLLING, PHASE_STATS_PATH, METRICS_PATH, METRICS_SNAPSHOT_EVERY, UI_INDEX_PATH, UI_SCALE, UI_INDEX_MAX_MISSES,
+    SESSION_NAME, SESSION_OFFSET, SESSION_SIZE,
+    LOG_FILE, LOG_LEVEL, LOG_ROTATION, LOG_MAX_BYTES, LOG_BACKUP_COUNT, LOG_RATE_LIMIT_INTERVAL, RUN_COUNT_FILE,
+    INGAME_SENSITIVITY_MULTIPLIER, MOUSE_STEP_INTERVAL, MOUSE_NOISE, MOUSE_CURVATURE, MOUSE_SEED,
+    EXIT_SEQUENCE_STEPS, START_GAME_REGION, USE_STATE_MACHINE, SCREEN_STATE_PROBES,
+    WATCHDOG_ENABLED, WATCHDOG_DEADLINE_FACTOR, WATCHDOG_MIN_DEADLINE, WATCHDOG_MAX_DEADLINE, WATCHDOG_DEFAULT_DEADLINE,
+    WATCHDOG_DEFAULT_DEADLINES, WATCHDOG_HANG_TIMEOUT, STALL_STATS_PATH,
+    PROFILE_ENABLED, PROFILE_EVERY, PROFILE_DIR, PROFILE_TOP, PROFILE_FRAMES, PROFILE_RSS_BUDGET_MB,
+)
 
-# --- 自动化动作配置 ---
-# 游戏内灵敏度乘数。因为pydirectinput的moveRel是相对移动，需要一个乘数来匹配游戏内的鼠标灵敏度设置
-INGAME_SENSITIVITY_MULTIPLIER = 20.0  
-
-# --- 退出流程配置 ---
-# 这是一个列表，定义了退出游戏比赛的步骤。每个步骤包含要查找的按钮文字和搜索区域
-EXIT_SEQUENCE_STEPS = [
-    {'text': '离开比赛', 'region': (872, 633, 439, 49)},  
-    {'text': '确认', 'region': (966, 571, 100, 49)},      
-]
-# --- 重新开始配置 ---
-# 定义了“开始游戏”按钮所在的大致区域，程序会在此区域内随机点击
-START_GAME_REGION = (375, 513, 166, 160)
-
-
-# ==============================================================================
-# 1.5. 定义日志记录类
-# ==============================================================================
-class Logger:
-    """
-    一个日志记录类，可以将print输出同时发送到控制台和指定的日志文件。
-    实现原理是重载 sys.stdout，将所有输出流导向此类的一个实例。
-    """
-    def __init__(self, filename="output.log"):
-        """
-        初始化Logger。
-        :param filename: 要写入的日志文件名。
-        """
-        self.terminal = sys.stdout  # 保存原始的stdout（即控制台）
-        # 以写入模式('w')打开日志文件，并指定utf-8编码以支持中文
-        self.log = open(filename, "w", encoding="utf-8") 
-        print(f"日志功能已启动，所有控制台输出将被记录到 {filename}")
-
-    def write(self, message):
-        """
-        重写write方法，使得调用print时会执行此方法。
-        :param message: print函数要输出的内容。
-        """
-        self.terminal.write(message)  # 首先，在原始控制台打印内容
-        self.log.write(message)       # 然后，将相同内容写入日志文件
-
-    def flush(self):
-        """
-        重写flush方法，这是确保数据写入磁盘所必需的。
-        """
-        self.terminal.flush()
-        self.log.flush()
-
-    def close(self):
-        """
-        关闭日志文件。
-        """
-        self.log.close()
 
 def countdown_second(seconds):
     print(f"程序会在{seconds} s后运行,请切换到英雄精通难度选择界面")
@@ -90,25 +54,90 @@ def countdown_second(seconds):
 # 6. 主程序入口
 # ==============================================================================
 if __name__ == '__main__':
-    # 将标准输出重定向到我们的Logger类的实例
-    # 这会使得所有print的内容都输出到控制台并写入output.log文件
-    stdout_logger = Logger("output.log")
-    sys.stdout = stdout_logger
-    
-    original_stdout = sys.stdout # 保存我们自定义的logger
+    # 同一台机器上运行多个会话时，每个会话在自己的工作目录中启动（日志、指标等文件都使用相对路径），
+    # 并用这些参数指定各自的游戏画面位置；OCR 由共享OCR服务完成（OCR_BACKEND = "remote"）
+    parser = argparse.ArgumentParser(description="自动循环执行开始游戏、游戏内动作和退出比赛")
+    parser.add_argument("--session", default=SESSION_NAME, help="会话名称，共享OCR服务按会话统计排队时间")
+    parser.add_argument("--offset", type=int, nargs=2, default=SESSION_OFFSET, metavar=("X", "Y"),
+                        help="本会话游戏画面左上角在屏幕上的位置")
+    parser.add_argument("--size", type=int, nargs=2, default=SESSION_SIZE, metavar=("W", "H"),
+                        help="本会话游戏画面的尺寸，默认为整个屏幕")
+    args = parser.parse_args()
+    backend_options = OCR_BACKEND_OPTIONS.get(OCR_BACKEND)
+    if OCR_BACKEND == "remote":
+        backend_options = dict(backend_options or {}, session=args.session)
+
+    # 启动后台日志线程，并将标准输出重定向到日志
+    # 这会使得所有print的内容都由后台线程输出到控制台并写入日志文件，主循环不会等待磁盘
+    log_pipeline = LogPipeline(filename=LOG_FILE, level=LOG_LEVEL, rotation=LOG_ROTATION, max_bytes=LOG_MAX_BYTES,
+                               backup_count=LOG_BACKUP_COUNT, rate_limit_interval=LOG_RATE_LIMIT_INTERVAL)
+    log_pipeline.start()
+    # 每轮都要更新的计数、指标和统计文件也交给后台线程写入
+    file_writer = FileWriter()
+    file_writer.start()
+    ocr_pool = None
+    screen_source = None
+    scheduler = None
+    metrics = None
+    watchdog = None
+    profiler = None
     
     try:
         # --- 1. 初始化所有需要的对象 ---
-        # 初始化OCR观察者，传入相似度阈值
-        main_watcher = OCRWatcher(similarity_threshold=SIMILARITY_THRESHOLD)
+        # 初始化OCR观察者，传入相似度阈值和画面变化检测灵敏度
+        # OCR引擎会在后台加载，与下面的倒计时同时进行
+        if OCR_WORKERS > 0:
+            ocr_pool = OCRWorkerPool(workers=OCR_WORKERS, capture_interval=CAPTURE_INTERVAL,
+                                     change_sensitivity=CHANGE_SENSITIVITY, backend=OCR_BACKEND,
+                                     backend_options=backend_options)
+            ocr_pool.start()
+        # 自适应轮询调度器：根据历史阶段耗时决定多久识别一次
+        scheduler = AdaptivePollScheduler(stats_path=PHASE_STATS_PATH, writer=file_writer) if ADAPTIVE_POLLING else None
+        # 运行指标：各阶段和每次OCR的耗时，每轮结束时追加到指标文件
+        metrics = MetricsRecorder(path=METRICS_PATH, snapshot_every=METRICS_SNAPSHOT_EVERY, writer=file_writer)
+        # 截图来源：实时截图，配置了 RECORD_SESSION_PATH 时同时录制
+        screen_source = create_source(record_path=RECORD_SESSION_PATH)
+        # 界面元素定位：把参考坐标换算到当前屏幕，校准过的元素使用索引中的紧凑区域
+        locator = UILocator(path=UI_INDEX_PATH, screen_size=args.size or screen_size(), ui_scale=UI_SCALE,
+                            max_misses=UI_INDEX_MAX_MISSES, offset=args.offset)
+        monitor_region = locator.region(TARGET_TEXT, MONITOR_REGION)
+        exit_steps = locator.resolve_steps(EXIT_SEQUENCE_STEPS)
+        start_region = locator.region("start", START_GAME_REGION)
+        screen_probes = [(state, locator.resolve_steps(probes)) for state, probes in SCREEN_STATE_PROBES]
+        print(f"[定位器] 当前布局 {locator.key}，索引中已校准 {len(locator.elements)} 个元素")
+        main_watcher = OCRWatcher(similarity_threshold=SIMILARITY_THRESHOLD, change_sensitivity=CHANGE_SENSITIVITY,
+                                  recognize_only=RECOGNIZE_ONLY, template_dir=TEMPLATE_DIR,
+                                  startup_budget=STARTUP_BUDGET, startup_log=STARTUP_LOG, worker_pool=ocr_pool,
+                                  backend=OCR_BACKEND, backend_options=backend_options,
+                                  scheduler=scheduler, metrics=metrics, crop_rows=CROP_TEXT_ROWS,
+                                  preprocess=load_pipelines(PREPROCESS_PIPELINES_PATH), source=screen_source,
+                                  confusions=OCR_CONFUSIONS, locator=locator)
+        # 两个执行者共用同一个鼠标轨迹引擎
+        trajectory = TrajectoryEngine(step_interval=MOUSE_STEP_INTERVAL, noise=MOUSE_NOISE, curvature=MOUSE_CURVATURE,
+                                      seed=MOUSE_SEED)
         # 初始化游戏内动作执行者，传入鼠标灵敏度乘数
-        ingame_executor = ActionExecutor(sensitivity_multiplier=INGAME_SENSITIVITY_MULTIPLIER)
+        ingame_executor = ActionExecutor(sensitivity_multiplier=INGAME_SENSITIVITY_MULTIPLIER, trajectory=trajectory)
         # 初始化菜单/UI执行者
-        menu_executor = PyAutoGuiExecutor()
+        menu_executor = PyAutoGuiExecutor(trajectory=trajectory)
         # 初始化游戏退出者，将观察者、UI执行者和退出步骤配置传入
-        main_exiter = GameExiter(watcher=main_watcher, executor=menu_executor, steps_config=EXIT_SEQUENCE_STEPS)
+        main_exiter = GameExiter(watcher=main_watcher, executor=menu_executor, steps_config=exit_steps)
         # 初始化游戏启动者，将UI执行者和开始区域配置传入
-        main_starter = GameStarter(executor=menu_executor, start_region=START_GAME_REGION)
+        main_starter = GameStarter(executor=menu_executor, start_region=start_region)
+        # 看门狗：阶段截止时间来自调度器的历史耗时，卡住时逐级执行恢复动作，并统计每天损失的时间
+        if WATCHDOG_ENABLED:
+            watchdog = StallWatchdog(scheduler=scheduler,
+                                     recoveries=default_recoveries(menu_executor, main_exiter, main_starter),
+                                     stats_path=STALL_STATS_PATH, deadline_factor=WATCHDOG_DEADLINE_FACTOR,
+                                     min_deadline=WATCHDOG_MIN_DEADLINE, max_deadline=WATCHDOG_MAX_DEADLINE,
+                                     default_deadline=WATCHDOG_DEFAULT_DEADLINE,
+                                     default_deadlines=WATCHDOG_DEFAULT_DEADLINES, hang_timeout=WATCHDOG_HANG_TIMEOUT,
+                                     writer=file_writer)
+        # 初始化画面状态机，根据观察到的界面推进每一轮流程
+        state_machine = None
+        if USE_STATE_MACHINE:
+            classifier = ScreenStateClassifier(watcher=main_watcher, probes=screen_probes)
+            state_machine = RoundStateMachine(classifier=classifier, starter=main_starter, exiter=main_exiter,
+                                              ingame_executor=ingame_executor, watchdog=watchdog)
         
         # --- 2. 准备开始 ---
         print("程序将在5秒后开始......请切换到游戏窗口。")
@@ -116,33 +145,79 @@ if __name__ == '__main__':
         countdown_second(sleep_seconds)
 
         run_count = 0
-        log_filename = "num.log" # 这个文件只记录运行轮次
+        log_filename = RUN_COUNT_FILE # 这个文件只记录运行轮次
+        if watchdog is not None:
+            watchdog.start()
+        # 资源剖析：定期记录内存、句柄和线程，超出增长预算时在两轮之间重启OCR引擎
+        if PROFILE_ENABLED:
+            profiler = ResourceProfiler(directory=PROFILE_DIR, every=PROFILE_EVERY, top=PROFILE_TOP,
+                                        frames=PROFILE_FRAMES, rss_budget_mb=PROFILE_RSS_BUDGET_MB,
+                                        on_budget=main_watcher.restart_engine, watch_files=[LOG_FILE, METRICS_PATH],
+                                        child_pids=(lambda: ocr_pool.pids) if ocr_pool is not None else None)
+            profiler.start()
 
         # --- 3. 主循环 ---
         # 这是一个无限循环，除非用户手动中断（按Ctrl+C）
         while True:
-            # 步骤A: 开始新游戏
-            main_starter.start_new_game()
-            
-            # 步骤B: 等待特定文本出现，表示游戏内某个阶段已开始
-            main_watcher.wait_for_text(target_text=TARGET_TEXT, monitor_region=MONITOR_REGION)
-            
-            # 步骤C: 执行游戏内的主要动作
-            ingame_executor.run_action_sequence()
-            time.sleep(2) # 动作执行后稍作等待
-            
-            # 步骤D: 执行退出流程
-            main_exiter.run_exit_sequence()
+            if watchdog is not None:
+                watchdog.round_started()
+            if state_machine is not None:
+                # 步骤A-D: 由画面状态机完成开始、等待、游戏内动作和退出
+                completed = state_machine.run_round()
+            else:
+                # 步骤A: 开始新游戏
+                with metrics.span("round.start"):
+                    main_starter.start_new_game()
+                if scheduler is not None:
+                    scheduler.begin("loading")
+
+                # 步骤B: 等待特定文本出现，表示游戏内某个阶段已开始
+                # 启用看门狗时，超过加载阶段的截止时间就放弃这一轮
+                with metrics.span("round.loading"):
+                    completed = main_watcher.wait_for_text(
+                        target_text=TARGET_TEXT, monitor_region=monitor_region, phase="loading",
+                        timeout=watchdog.deadline("loading") if watchdog is not None else None)
+
+                if completed:
+                    # 步骤C: 执行游戏内的主要动作
+                    with metrics.span("round.action"):
+                        ingame_executor.run_action_sequence()
+                    time.sleep(2) # 动作执行后稍作等待
+
+                    # 步骤D: 执行退出流程
+                    exit_timeout = max(watchdog.deadline(GameExiter.step_phase(step)) for step in exit_steps) \
+                        if watchdog is not None else 8
+                    with metrics.span("round.exit"):
+                        completed = main_exiter.run_exit_sequence(timeout=exit_timeout)
+
+            if not completed:
+                print("[主程序] 本轮流程未能顺利完成，将从头开始下一轮。")
+                metrics.end_round(completed=False)
+                if watchdog is not None:
+                    # 按卡住的次数逐级执行恢复动作
+                    watchdog.round_failed()
+                    print(f"[看门狗] {watchdog.report()}")
+                continue
+            if watchdog is not None:
+                watchdog.round_completed()
 
             # --- 4. 记录和休息 ---
             run_count += 1
             timestamp_str = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime())
             log_entry = f"{timestamp_str}\t{run_count}"
             
-            # 将当前轮次写入num.log文件（'w'模式会覆盖旧内容）
-            with open(log_filename, 'w') as f:
-                f.write(log_entry)
+            # 将当前轮次写入num.log文件（由后台线程原子地覆盖旧内容，读取方不会看到写了一半的文件）
+            file_writer.replace(log_filename, log_entry)
             
+            record = metrics.end_round()
+            print(f"[指标] 本轮 {record['round_seconds']:.1f}s，OCR {record['ocr_calls']} 次；{metrics.report()}")
+            if scheduler is not None:
+                saving = scheduler.summary()
+                print(f"[调度器] 累计轮询 {saving['polls']} 次，固定间隔约需 {saving['baseline_polls']} 次，节省 {saving['saved']} 次")
+            if watchdog is not None:
+                print(f"[看门狗] {watchdog.report()}")
+            if profiler is not None:
+                profiler.sample(run_count)
             print(f"\n\n=============== 第 {run_count} 轮流程结束 ===============\n\n")
 
             # 每运行40轮，就休息60秒
@@ -158,9 +233,22 @@ if __name__ == '__main__':
         print(f"\n程序遇到未处理的异常: {e}")
     finally:
         # 无论程序是正常结束、用户中断还是出错，这个块都会执行
+        if scheduler is not None:
+            scheduler.flush()
+        if metrics is not None:
+            metrics.close()
+        if watchdog is not None:
+            watchdog.stop()
+        if profiler is not None:
+            profiler.stop()
+        if ocr_pool is not None:
+            ocr_pool.stop()
+        if screen_source is not None:
+            # 录制时写完最后一个数据块
+            screen_source.close()
+        # 写完上面各组件最后交给后台线程的文件
+        file_writer.stop()
         print("正在关闭日志文件并恢复标准输出...")
-        # 恢复原始的stdout，并关闭文件句柄
-        if isinstance(original_stdout, Logger):
-            sys.stdout = original_stdout.terminal
-            original_stdout.close()
+        # 恢复原始的stdout，写完队列中剩余的日志并关闭文件句柄
+        log_pipeline.stop()
         print("程序已完全关闭。")
\ No newline at end of file
@@ -0,0 +1,163 @@
+# config.py
+# 所有配置常量集中在这里，主程序 action.py 和 tools 目录下的工具脚本都从这里读取。
+
+# ==============================================================================
+# 1. 配置常量
+# ==============================================================================
+# --- OCR 配置 ---
+# 定义了需要监控的屏幕区域 (左上角x, 左上角y, 宽度, 高度)
+MONITOR_REGION = (895, 1003, 283, 45)  
+# 定义了OCR需要识别的目标文字
+TARGET_TEXT = "精通科目开启"
+# 定义了识别出的文字与目标文字的相似度阈值，高于此值才算成功
+SIMILARITY_THRESHOLD = 0.80
+# 额外的OCR混淆字符对，例如 [("赛", "寨")]。混淆字符之间的替换在相似度计算中只算很小的代价，默认表见 matcher.DEFAULT_CONFUSIONS
+OCR_CONFUSIONS = []
+# 画面变化检测的灵敏度：二值化画面的平均像素差比例低于此值时，视为画面未变化，直接复用上次的OCR结果
+# 设为 None 可关闭变化检测，每次轮询都进行OCR
+CHANGE_SENSITIVITY = 0.02
+# 是否启用“只识别不检测”的快速路径：监控区域都是紧贴文字的固定小框，可以跳过文字检测模型
+RECOGNIZE_ONLY = True
+# 快速路径是否只把含有文字的行送入识别模型（用水平投影找出文字行）。开启前可以先用 tools/benchmark_recognize.py --crop-rows 核对识别结果
+CROP_TEXT_ROWS = False
+# 各区域的预处理流水线（由 tools/tune_preprocess.py 生成）。文件不存在或未列出的区域使用固定阈值 150 的二值化
+PREPROCESS_PIPELINES_PATH = "preprocess.json"
+# 录制会话：指定文件路径后，每次截图都会连同时间戳写入这个文件（压缩、去重），可以用 tools/replay_session.py 离线回放
+RECORD_SESSION_PATH = None
+# 按钮模板库目录：首次识别成功后保存按钮截图，之后优先用模板匹配代替OCR。设为 None 可关闭
+TEMPLATE_DIR = "templates"
+# OCR引擎加载的时间预算（秒），超出时会打印警告；每次启动的各阶段耗时会追加到 STARTUP_LOG
+STARTUP_BUDGET = 30.0
+STARTUP_LOG = "startup.log"
+# 独立OCR工作进程的数量。0 表示在主线程内OCR；大于0时截图、识别和输入操作互不阻塞，多核机器上可以调大
+OCR_WORKERS = 0
+# 使用工作进程时，截图线程两次截图之间的间隔（秒）
+CAPTURE_INTERVAL = 0.1
+# OCR后端："easyocr"（默认，基于PyTorch）或 "onnx"（int8量化的ONNX Runtime识别模型，仅CPU，更省内存、启动更快），
+# 或 "remote"（不在本进程加载模型，把识别请求发给本机的共享OCR服务，见下面的 OCR_SERVICE_* 配置）
+OCR_BACKEND = "easyocr"
+# 共享OCR服务（python main/ocr_service.py）：一台机器上同时运行多个会话时，只加载一个模型，并把各会话的请求合并成批次识别。
+# 服务本身使用的后端和监听地址。服务只监听本机回环地址，监听其他地址需要显式加上 --allow-remote
+OCR_SERVICE_BACKEND = "easyocr"
+OCR_SERVICE_ADDRESS = ("127.0.0.1", 6010)
+# 认证密钥：优先读取这个环境变量，没有设置时读取当前用户的密钥文件，第一次运行时随机生成（只有当前用户可读）。
+# 服务会反序列化客户端发来的数据，密钥不能写死在代码里，也不要提交到仓库
+OCR_SERVICE_AUTHKEY_ENV = "OCR_SERVICE_AUTHKEY"
+OCR_SERVICE_KEY_FILE = "~/.ocr_service_key"
+# 服务收到第一个请求后，最多再等待多少秒收集其他会话的请求组成一批，以及一批最多包含的请求数
+OCR_SERVICE_BATCH_WINDOW = 0.01
+OCR_SERVICE_MAX_BATCH = 16
+# 传给OCR后端构造函数的参数。onnx 后端的模型由 tools/export_onnx_recognizer.py 导出
+OCR_BACKEND_OPTIONS = {
+    "easyocr": {"languages": ("ch_sim", "en")},
+    "onnx": {"model_path": "models/recognizer_int8.onnx", "charset_path": "models/charset.json", "threads": 1},
+    "remote": {"address": OCR_SERVICE_ADDRESS, "key_path": OCR_SERVICE_KEY_FILE, "key_env": OCR_SERVICE_AUTHKEY_ENV},
+}
+# 是否根据历史阶段耗时自适应调整轮询间隔：目标通常出现之前稀疏轮询，通常出现的时间段内密集轮询
+ADAPTIVE_POLLING = True
+# 各阶段历史耗时的保存文件，跨运行累积
+PHASE_STATS_PATH = "phase_stats.json"
+# 运行指标文件（JSON-lines，每轮追加一行本轮的各阶段耗时、每小时轮数、每轮OCR次数）。设为 None 可关闭导出
+METRICS_PATH = "metrics.jsonl"
+# 每隔多少轮（以及退出时）向指标文件追加一行累计直方图
+METRICS_SNAPSHOT_EVERY = 50
+
+# --- 日志配置 ---
+# 日志文件，所有 print 的内容都会由后台线程写入这里
+LOG_FILE = "output.log"
+# 最低记录级别："DEBUG"、"INFO"、"WARNING" 或 "ERROR"
+LOG_LEVEL = "INFO"
+# 日志轮转方式："size" 按大小轮转，"time" 每天午夜轮转
+LOG_ROTATION = "size"
+# 按大小轮转时单个日志文件的最大字节数，以及保留的旧日志数量
+LOG_MAX_BYTES = 10 * 1024 * 1024
+LOG_BACKUP_COUNT = 5
+# 轮询时重复的“未达标”“未检测到任何文字”行，每隔多少秒最多记录一条。设为 None 可关闭限流
+LOG_RATE_LIMIT_INTERVAL = 5.0
+# 只记录当前运行轮次的文件
+RUN_COUNT_FILE = "num.log"
+
+# --- 自动化动作配置 ---
+# 游戏内灵敏度乘数。因为pydirectinput的moveRel是相对移动，需要一个乘数来匹配游戏内的鼠标灵敏度设置
+INGAME_SENSITIVITY_MULTIPLIER = 20.0  
+# 鼠标轨迹：相邻两步的间隔（秒）、随机抖动的最大幅度、曲线弯曲程度，见 trajectory.TrajectoryEngine
+MOUSE_STEP_INTERVAL = 0.01
+MOUSE_NOISE = 1.5
+MOUSE_CURVATURE = 0.1
+# 鼠标轨迹的随机种子，设为整数可以复现完全相同的轨迹；None 表示每次随机
+MOUSE_SEED = None
+
+# --- 退出流程配置 ---
+# 这是一个列表，定义了退出游戏比赛的步骤。每个步骤包含要查找的按钮文字和搜索区域
+EXIT_SEQUENCE_STEPS = [
+    {'text': '离开比赛', 'region': (872, 633, 439, 49)},  
+    {'text': '确认', 'region': (966, 571, 100, 49)},      
+]
+# --- 重新开始配置 ---
+# 定义了“开始游戏”按钮所在的大致区域，程序会在此区域内随机点击
+START_GAME_REGION = (375, 513, 166, 160)
+
+# --- 界面定位配置 ---
+# 上面的所有区域都是在 1920x1080 下选取的参考坐标。用 tools/calibrate_ui.py 校准后，
+# 各元素在当前分辨率下的紧凑区域保存在这个索引文件中（按分辨率和界面缩放比例区分）；没有校准的元素按分辨率比例缩放
+UI_INDEX_PATH = "ui_index.json"
+# 游戏设置中的界面缩放比例，不同缩放比例分别校准
+UI_SCALE = 1.0
+# 同一个元素连续多少次没有找到后，认为索引已过时并删除它
+UI_INDEX_MAX_MISSES = 3
+# “开始游戏”按钮上的文字。填写后校准工具才能自动定位开始按钮；为 None 时开始按钮总是按比例缩放 START_GAME_REGION
+START_GAME_TEXT = None
+# 同一台机器上运行多个会话（多个游戏窗口）时，本会话的名称、游戏画面左上角在屏幕上的位置和游戏画面的尺寸。
+# 尺寸为 None 表示整个屏幕。也可以用 action.py 的 --session、--offset、--size 参数指定
+SESSION_NAME = None
+SESSION_OFFSET = (0, 0)
+SESSION_SIZE = None
+
+# --- 画面状态机配置 ---
+# 是否使用画面状态机驱动每一轮：看到下一个界面就立即执行下一步，代替固定的等待时间
+USE_STATE_MACHINE = True
+# 画面状态探针，按优先级排列：(状态, [{'text': 该界面上一定会出现的文字, 'region': 文字所在区域}, ...])
+# 确认框会盖在ESC菜单上面，所以排在前面。探针列表为空的状态不会被识别：
+# 主菜单和结算画面的文字区域需要先用 tools/region_selector.py 选取后填入；
+# 主菜单未配置时，状态机会在退出后使用原来的固定按键流程跳过结算。
+SCREEN_STATE_PROBES = [
+    ('confirm_dialog', [EXIT_SEQUENCE_STEPS[1]]),
+    ('esc_menu', [EXIT_SEQUENCE_STEPS[0]]),
+    ('in_match', [{'text': TARGET_TEXT, 'region': MONITOR_REGION}]),
+    ('results', []),
+    ('main_menu', []),
+]
+
+# --- 卡住检测与恢复配置 ---
+# 是否启用看门狗：某个阶段超过截止时间就判定这一轮卡住，按顺序执行恢复动作（重按ESC -> 重新执行退出流程 -> 重新点击开始），
+# 连续卡住时逐级升级，顺利完成一轮后回到第一级
+WATCHDOG_ENABLED = True
+# 阶段截止时间 = 该阶段历史耗时的 99% 分位数 × 这个系数，并限制在上下限之间（秒）。历史耗时由 ADAPTIVE_POLLING 积累
+WATCHDOG_DEADLINE_FACTOR = 1.5
+WATCHDOG_MIN_DEADLINE = 5.0
+WATCHDOG_MAX_DEADLINE = 300.0
+# 历史数据不足时各阶段的截止时间（秒），未列出的阶段使用 WATCHDOG_DEFAULT_DEADLINE
+WATCHDOG_DEFAULT_DEADLINE = 60.0
+# （退出按钮的阶段名称为 "exit:按钮文字"）
+WATCHDOG_DEFAULT_DEADLINES = {
+    'loading': 120.0,
+    'confirm': 10.0,
+    **{f"exit:{step['text']}": 8.0 for step in EXIT_SEQUENCE_STEPS},
+}
+# 一轮运行超过这么多秒仍未结束（例如某个调用被阻塞），打印警告和各线程的调用栈
+WATCHDOG_HANG_TIMEOUT = 600.0
+# 每天卡住次数、损失时间和恢复动作次数的统计文件
+STALL_STATS_PATH = "stall_stats.json"
+
+# --- 资源剖析配置 ---
+# 是否开启长时间运行的资源剖析：每隔 PROFILE_EVERY 轮记录一次常驻内存、Python 内存分配（tracemalloc）、句柄数、线程数
+# 和日志文件大小，并与第一次记录对比列出增长最多的分配位置。tracemalloc 会拖慢内存分配，只在排查内存增长时开启
+PROFILE_ENABLED = False
+PROFILE_EVERY = 50
+# 剖析文件所在的目录，每次运行写入一个新文件
+PROFILE_DIR = "profiles"
+# 每次记录列出增长最多的分配位置数量，以及 tracemalloc 保存的调用栈深度
+PROFILE_TOP = 10
+PROFILE_FRAMES = 1
+# 常驻内存（包括OCR工作进程）比基准增长超过多少MB时，在两轮之间重启OCR引擎，不停止主循环。None 表示只记录
+PROFILE_RSS_BUDGET_MB = None
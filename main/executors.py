@@ -4,6 +4,7 @@ import pyautogui
 import pydirectinput
 import time
 import random
+from trajectory import TrajectoryEngine
 
 # ==============================================================================
 # 3. 定义“执行者”类 - 负责操作
@@ -13,12 +14,14 @@ class ActionExecutor:
     游戏内动作执行者。
     使用 pydirectinput 库，它通常比 pyautogui 更适合在全屏游戏内模拟输入。
     """
-    def __init__(self, sensitivity_multiplier):
+    def __init__(self, sensitivity_multiplier, trajectory=None):
         """
         初始化执行者。
         :param sensitivity_multiplier: 鼠标移动的灵敏度修正值。
+        :param trajectory: 鼠标轨迹引擎，可与 PyAutoGuiExecutor 共用。默认新建一个。
         """
         self.multiplier = sensitivity_multiplier
+        self.trajectory = trajectory if trajectory is not None else TrajectoryEngine()
 
     def human_like_press(self, key):
         """
@@ -33,7 +36,7 @@ class ActionExecutor:
     def human_like_move_to(self, target_x, target_y, duration=0.5):
         """
         以类似人类的方式将鼠标移动到绝对屏幕坐标。
-        它通过计算相对位移，并应用灵敏度乘数，然后分步移动来实现。
+        它通过计算相对位移，并应用灵敏度乘数，然后由轨迹引擎分步移动来实现，见 TrajectoryEngine。
         注意：pydirectinput.moveRel 使用的是相对位移。
         :param target_x: 目标点的X坐标。
         :param target_y: 目标点的Y坐标。
@@ -47,21 +50,15 @@ class ActionExecutor:
         # 应用灵敏度乘数，将屏幕像素偏移转换为游戏内的移动量
         offset_x = raw_offset_x * self.multiplier
         offset_y = raw_offset_y * self.multiplier
-        print(f"[PDI执行者] 原始偏移: ({raw_offset_x}, {raw_offset_y}), 应用倍率({self.multiplier}x)后: ({int(offset_x)}, {int(offset_y)})")
-        
-        # 将总移动分成许多小步，模拟平滑移动
-        steps = int(duration / 0.01)
-        if steps <= 0: steps = 1
-        step_x = offset_x / steps
-        step_y = offset_y / steps
+        print(f"[PDI执行者] 原始偏移: ({raw_offset_x}, {raw_offset_y}), 应用倍率({self.multiplier}x)后: ({round(offset_x)}, {round(offset_y)})")
 
-        # 循环执行每一步移动
-        for i in range(steps):
-            # 添加微小的随机抖动，让移动轨迹更像人类
-            jitter_x = random.randint(-2, 2)
-            jitter_y = random.randint(-2, 2)
-            pydirectinput.moveRel(int(step_x + jitter_x), int(step_y + jitter_y), relative=True)
-            time.sleep(random.uniform(0.005, 0.015)) # 每一步之间有微小延迟
+        # 轨迹引擎预先算好整条平滑轨迹，并按截止时间逐步发送；
+        # _pause=False 关闭 pydirectinput 每次调用后默认的 0.1 秒停顿，时间完全由轨迹引擎控制
+        elapsed, sent, merged = self.trajectory.move(
+            offset_x, offset_y, duration,
+            lambda dx, dy: pydirectinput.moveRel(dx, dy, relative=True, _pause=False))
+        print(f"[PDI执行者] 移动完成: 计划 {duration:.2f}s, 实际 {elapsed:.3f}s, 发送 {sent} 步"
+              f"{f' (迟到合并 {merged} 步)' if merged else ''}")
 
     def run_action_sequence(self):
         """
@@ -86,15 +83,29 @@ class PyAutoGuiExecutor:
     游戏外（菜单/UI）动作执行者。
     使用 pyautogui 库，它对于标准的窗口和UI界面操作非常可靠。
     """
+    def __init__(self, trajectory=None):
+        """
+        初始化执行者。
+        :param trajectory: 鼠标轨迹引擎，可与 ActionExecutor 共用。默认新建一个。
+        """
+        self.trajectory = trajectory if trajectory is not None else TrajectoryEngine()
+
     def human_like_move_to(self, target_x, target_y, duration=0.15):
         """
-        使用pyautogui平滑地移动鼠标到目标坐标。
+        沿轨迹引擎生成的平滑轨迹移动鼠标到目标坐标，终点精确落在目标上。
         :param target_x: 目标X坐标。
         :param target_y: 目标Y坐标。
         :param duration: 鼠标移动持续时间。
         """
-        # pyautogui.easeOutQuad 是一种缓动函数，使移动开始快，结束慢，更自然
-        pyautogui.moveTo(target_x, target_y, duration=duration, tween=pyautogui.easeOutQuad)
+        position = list(pyautogui.position())
+
+        def move_by(dx, dy):
+            # 记录轨迹上的绝对位置，用 moveTo 发送，不必每一步都查询鼠标位置
+            position[0] += dx
+            position[1] += dy
+            pyautogui.moveTo(position[0], position[1], _pause=False)
+
+        self.trajectory.move(target_x - position[0], target_y - position[1], duration, move_by)
         print(f"[GUI执行者] 移动到: ({target_x}, {target_y})")
 
     def click(self):
@@ -0,0 +1,177 @@
+# locator.py
+
+import json
+import os
+import time
+
+from logs import write_text_atomic
+
+# ==============================================================================
+# 2.13 界面元素定位 - 与分辨率无关的元素索引
+# ==============================================================================
+# config.py 中的绝对坐标都是在这个分辨率下选取的
+REFERENCE_SIZE = (1920, 1080)
+
+
+def layout_key(screen_size, ui_scale=1.0):
+    """
+    :param screen_size: 屏幕尺寸 (宽, 高)。
+    :param ui_scale: 游戏的界面缩放比例。
+    :return: 索引中该布局的键，例如 "2560x1440@1.25"。
+    """
+    return f"{screen_size[0]}x{screen_size[1]}@{ui_scale:g}"
+
+
+def pad_region(region, screen_size, padding=0.25, min_padding=6):
+    """
+    在文字框四周留出余量，容纳文字位置的轻微抖动，并限制在屏幕范围内。
+    :param region: 区域元组 (x, y, width, height)。
+    :param screen_size: 屏幕尺寸 (宽, 高)。
+    :param padding: 余量占文字高度的比例。
+    :param min_padding: 最小余量（像素）。
+    :return: 扩大后的区域元组。
+    """
+    x, y, w, h = region
+    pad = max(min_padding, int(round(h * padding)))
+    left, top = max(0, x - pad), max(0, y - pad)
+    right, bottom = min(screen_size[0], x + w + pad), min(screen_size[1], y + h + pad)
+    return left, top, right - left, bottom - top
+
+
+class UILocator:
+    """
+    界面元素定位器。校准时（tools/calibrate_ui.py）对全屏做一次OCR，找到每个元素的文字框，
+    按屏幕尺寸归一化后保存在索引文件中，键为分辨率和界面缩放比例；运行时直接换算成当前屏幕上的紧凑区域。
+    - 当前布局没有校准过的元素，按分辨率比例缩放 config.py 中的参考坐标；
+    - 同一个元素连续多次没有找到时，认为索引已经过时，从索引中删除它、立即改用参考坐标，并提示重新校准；
+    - 同一台机器上并排运行多个游戏窗口时，每个会话的区域都加上该窗口左上角的偏移。
+    """
+    def __init__(self, path="ui_index.json", screen_size=REFERENCE_SIZE, ui_scale=1.0, max_misses=3,
+                 reference_size=REFERENCE_SIZE, offset=(0, 0)):
+        """
+        初始化定位器。
+        :param path: 索引文件路径。
+        :param screen_size: 当前屏幕尺寸 (宽, 高)。
+        :param ui_scale: 游戏的界面缩放比例。
+        :param max_misses: 连续多少次没有找到元素后让它的索引失效。
+        :param reference_size: config.py 中参考坐标对应的屏幕尺寸。
+        :param offset: 游戏画面左上角在屏幕上的位置 (x, y)，返回的区域都加上这个偏移。此时 screen_size 是游戏画面的尺寸。
+        """
+        self.path = path
+        self.screen_size = tuple(screen_size)
+        self.ui_scale = ui_scale
+        self.max_misses = max_misses
+        self.reference_size = tuple(reference_size)
+        self.offset = tuple(offset)
+        self.key = layout_key(self.screen_size, ui_scale)
+        self.index = self._load()
+        # 当前布局的元素：名称 -> {"bbox": 归一化的 [x, y, w, h], "calibrated_at": 时间戳}
+        self.elements = self.index["layouts"].setdefault(self.key, {})
+        # 运行时解析出的区域 -> 元素名称，用于把命中/未命中归到元素上；元素名称 -> 查询时给出的参考区域
+        self._names = {}
+        self._defaults = {}
+        self._misses = {}
+
+    def _load(self):
+        """读取索引文件；文件不存在或损坏时返回空索引。"""
+        if self.path and os.path.exists(self.path):
+            try:
+                with open(self.path, "r", encoding="utf-8") as f:
+                    index = json.load(f)
+                if isinstance(index.get("layouts"), dict):
+                    return index
+            except (OSError, ValueError) as e:
+                print(f"[定位器] 无法读取界面索引 {self.path}: {e}，将使用参考坐标。")
+        return {"version": 1, "layouts": {}}
+
+    def save(self):
+        """把索引写回文件。"""
+        if self.path:
+            write_text_atomic(self.path, json.dumps(self.index, ensure_ascii=False, indent=2))
+
+    def is_calibrated(self, name):
+        """
+        :return: 当前布局下该元素是否有校准过的位置。
+        """
+        return name in self.elements
+
+    def region(self, name, default=None):
+        """
+        查询元素在当前屏幕上的区域。
+        :param name: 元素名称。
+        :param default: 参考分辨率下的区域，元素没有校准过时按比例缩放使用。
+        :return: 屏幕上的区域元组 (x, y, width, height)，已加上 offset；既没有校准也没有默认值时返回 None。
+        """
+        if default is not None:
+            self._defaults[name] = tuple(default)
+        entry = self.elements.get(name)
+        if entry is not None:
+            nx, ny, nw, nh = entry["bbox"]
+            sw, sh = self.screen_size
+            region = (int(round(nx * sw)), int(round(ny * sh)), max(1, int(round(nw * sw))), max(1, int(round(nh * sh))))
+        elif default is not None:
+            sx = self.screen_size[0] / self.reference_size[0]
+            sy = self.screen_size[1] / self.reference_size[1]
+            x, y, w, h = default
+            region = (int(round(x * sx)), int(round(y * sy)), max(1, int(round(w * sx))), max(1, int(round(h * sy))))
+        else:
+            return None
+        region = (region[0] + self.offset[0], region[1] + self.offset[1], region[2], region[3])
+        self._names[region] = name
+        return region
+
+    def resolve_steps(self, steps):
+        """
+        把 {'text': 文字, 'region': 参考区域} 格式的配置（退出步骤、画面探针）换算到当前屏幕，以文字作为元素名称。
+        :param steps: 配置列表。
+        :return: 新的配置列表，区域已替换。
+        """
+        return [dict(step, region=self.region(step['text'], step['region'])) for step in steps]
+
+    def calibrate(self, name, region):
+        """
+        记录一个元素在当前屏幕上的区域（需要之后调用 save 写入文件）。
+        :param name: 元素名称。
+        :param region: 屏幕上的区域元组 (x, y, width, height)，包含 offset。
+        """
+        sw, sh = self.screen_size
+        x, y, w, h = region
+        x, y = x - self.offset[0], y - self.offset[1]
+        self.elements[name] = {"bbox": [x / sw, y / sh, w / sw, h / sh], "calibrated_at": time.time()}
+        self._misses.pop(name, None)
+
+    def hit(self, region):
+        """某个区域中找到了它的元素，清零连续未命中次数。"""
+        name = self._names.get(tuple(region))
+        if name is not None:
+            self._misses.pop(name, None)
+
+    def miss(self, region):
+        """
+        某个区域中没有找到它的元素（例如按钮超时）。连续未命中达到 max_misses 次时让该元素的索引失效，
+        并立即重新解析它的区域（退回按比例缩放的参考坐标），调用方应当从此改用返回的区域。
+        :param region: 运行时使用的区域。
+        :return: 之后应当使用的区域；索引没有失效（或者没有参考坐标可以退回）时就是传入的区域。
+        """
+        region = tuple(region)
+        name = self._names.get(region)
+        if name is None:
+            return region
+        misses = self._misses[name] = self._misses.get(name, 0) + 1
+        if misses < self.max_misses:
+            return region
+        self._misses[name] = 0
+        if name not in self.elements:
+            print(f"[定位器] 警告：元素 '{name}' 连续 {misses} 次没有找到，它使用的是按比例缩放的参考坐标，"
+                  f"请运行 tools/calibrate_ui.py 校准当前布局 {self.key}。")
+            return region
+        del self.elements[name]
+        self.save()
+        relocated = self.region(name, self._defaults.get(name))
+        if relocated is None:
+            print(f"[定位器] 警告：元素 '{name}' 连续 {misses} 次没有找到，已从布局 {self.key} 的索引中删除，"
+                  f"但它没有参考坐标，本次运行继续使用原来的区域。请运行 tools/calibrate_ui.py 重新校准。")
+            return region
+        print(f"[定位器] 警告：元素 '{name}' 连续 {misses} 次没有找到，已从布局 {self.key} 的索引中删除，"
+              f"改用参考坐标 {relocated}。请运行 tools/calibrate_ui.py 重新校准。")
+        return relocated
@@ -0,0 +1,258 @@
+# logs.py
+
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+import threading
+
+# ==============================================================================
+# 1.5. 日志 - 后台线程写入，主循环里的 print 从不等待磁盘
+# ==============================================================================
+# 包含这些文字的行视为对应级别，其余的行都是 INFO
+LEVEL_MARKERS = (
+    ("异常", logging.ERROR),
+    ("错误", logging.ERROR),
+    ("警告", logging.WARNING),
+)
+# 轮询循环中每次未命中都会打印的行，需要限流
+RATE_LIMITED_MARKERS = ("未达标", "未检测到任何文字")
+
+
+def write_text_atomic(path, text):
+    """
+    原子地覆盖写入一个小文本文件：先写临时文件再替换，读取方不会看到写了一半的内容。
+    :param path: 文件路径。
+    :param text: 文件内容。
+    """
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(text)
+    os.replace(tmp_path, path)
+
+
+class FileWriter:
+    """
+    后台写文件的线程，与日志管线一样让主循环从不等待磁盘：每轮都要更新的计数文件、指标文件和统计文件
+    只是把内容交给它，真正的写入在后台完成。
+    - replace：原子地覆盖写入（见 write_text_atomic）。同一个文件还没来得及写入的旧内容会被新内容取代，只写最新的；
+    - append：按调用顺序追加。
+    内容在调用方线程中生成好再交给它，后台线程只负责磁盘操作。
+    """
+    def __init__(self, name="file-writer"):
+        """
+        初始化写入线程（调用 start 后才生效；未启动时所有写入直接在调用方线程完成）。
+        :param name: 线程名称。
+        """
+        self.name = name
+        self.queue = queue.SimpleQueue()
+        # 文件路径 -> 等待覆盖写入的最新内容
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def start(self):
+        """启动后台写入线程。"""
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """写完队列中剩余的内容，然后停止后台线程。"""
+        if self._thread is None:
+            return
+        self.queue.put(None)
+        self._thread.join()
+        self._thread = None
+
+    def replace(self, path, text):
+        """
+        原子地覆盖写入一个小文本文件。
+        :param path: 文件路径。
+        :param text: 文件内容。
+        """
+        if self._thread is None:
+            write_text_atomic(path, text)
+            return
+        with self._lock:
+            queued = path in self._pending
+            self._pending[path] = text
+        if not queued:
+            self.queue.put(("replace", path, None))
+
+    def append(self, path, text):
+        """
+        向文件末尾追加内容。
+        :param path: 文件路径。
+        :param text: 追加的内容（需要自带换行符）。
+        """
+        if self._thread is None:
+            self._append(path, text)
+            return
+        self.queue.put(("append", path, text))
+
+    @staticmethod
+    def _append(path, text):
+        with open(path, "a", encoding="utf-8") as f:
+            f.write(text)
+
+    def _run(self):
+        """
+        后台线程：依次执行写入，单个文件写入失败不影响其他文件。
+        任何异常都只打印警告，线程一旦退出，之后的写入都会堆在队列里，stop() 也会一直等待。
+        """
+        while True:
+            item = self.queue.get()
+            if item is None:
+                return
+            kind, path, text = item
+            try:
+                if kind == "replace":
+                    with self._lock:
+                        text = self._pending.pop(path)
+                    write_text_atomic(path, text)
+                else:
+                    self._append(path, text)
+            except Exception as e:
+                print(f"[写入线程] 警告：写入 {path} 失败: {type(e).__name__}: {e}")
+
+
+class RateLimitFilter(logging.Filter):
+    """
+    对重复出现的行限流：包含同一个标记的行，每 interval 秒最多放行一条，
+    被丢弃的条数附在下一条放行的行后面。
+    """
+    def __init__(self, markers=RATE_LIMITED_MARKERS, interval=5.0):
+        """
+        初始化限流器。
+        :param markers: 需要限流的标记文字，每个标记单独计时。
+        :param interval: 同一个标记两次放行之间的最短间隔（秒）。
+        """
+        super().__init__()
+        self.markers = markers
+        self.interval = interval
+        # 标记 -> [上次放行的时间, 之后被丢弃的条数]
+        self._state = {}
+
+    def filter(self, record):
+        message = record.getMessage()
+        for marker in self.markers:
+            if marker not in message:
+                continue
+            state = self._state.setdefault(marker, [0.0, 0])
+            if record.created - state[0] < self.interval:
+                state[1] += 1
+                return False
+            if state[1]:
+                record.msg = f"{message} (过去 {record.created - state[0]:.1f} 秒内省略了 {state[1]} 条相似消息)"
+                record.args = ()
+            state[0], state[1] = record.created, 0
+            return True
+        return True
+
+
+class PrintRedirect:
+    """
+    替代 sys.stdout：把 print 的内容按行交给 logging。日志只是放进队列，真正的写入在后台线程完成。
+    """
+    def __init__(self, logger):
+        """
+        :param logger: 接收这些行的 logging.Logger。
+        """
+        self.logger = logger
+        self._buffer = ""
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def level_for(line):
+        """
+        根据行内容推断日志级别。
+        :param line: 一行文字。
+        :return: logging 级别。
+        """
+        for marker, level in LEVEL_MARKERS:
+            if marker in line:
+                return level
+        return logging.INFO
+
+    def write(self, message):
+        # print 会把内容和换行符分两次写入，凑够一整行再交给 logging
+        with self._lock:
+            self._buffer += message
+            if "\n" not in self._buffer:
+                return len(message)
+            *lines, self._buffer = self._buffer.split("\n")
+        for line in lines:
+            # 纯装饰用的空行不记录
+            if line.strip():
+                self.logger.log(self.level_for(line), line)
+        return len(message)
+
+    def flush(self):
+        """日志由后台线程负责写入，这里不需要做任何事。"""
+
+
+class LogPipeline:
+    """
+    基于队列的日志管线：主线程的 print / logging 调用只是把记录放进内存队列，
+    后台的 QueueListener 线程负责写控制台和日志文件。日志文件按大小或按时间轮转，不会无限增长。
+    """
+    def __init__(self, filename="output.log", level="INFO", rotation="size", max_bytes=10 * 1024 * 1024,
+                 backup_count=5, when="midnight", rate_limit_interval=5.0, name="farm"):
+        """
+        初始化日志管线（调用 start 后才生效）。
+        :param filename: 日志文件路径。
+        :param level: 最低记录级别，例如 "DEBUG"、"INFO"、"WARNING"。
+        :param rotation: "size" 按大小轮转，"time" 按时间轮转。
+        :param max_bytes: 按大小轮转时单个日志文件的最大字节数。
+        :param backup_count: 保留的旧日志文件数量。
+        :param when: 按时间轮转时的周期，与 TimedRotatingFileHandler 的 when 参数一致。
+        :param rate_limit_interval: 重复的“未达标”等行的限流间隔（秒），为 None 时不限流。
+        :param name: logger 的名称。
+        """
+        self.logger = logging.getLogger(name)
+        self.logger.setLevel(level)
+        self.logger.propagate = False
+        if rotation == "time":
+            file_handler = logging.handlers.TimedRotatingFileHandler(filename, when=when, backupCount=backup_count,
+                                                                     encoding="utf-8")
+        elif rotation == "size":
+            file_handler = logging.handlers.RotatingFileHandler(filename, maxBytes=max_bytes, backupCount=backup_count,
+                                                                encoding="utf-8")
+        else:
+            raise ValueError(f"未知的日志轮转方式 '{rotation}'，可选: size, time")
+        file_handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(message)s"))
+        console_handler = logging.StreamHandler(sys.__stdout__)
+        console_handler.setFormatter(logging.Formatter("%(message)s"))
+
+        # 不限长度的队列，放入记录永远不会阻塞
+        self.queue = queue.SimpleQueue()
+        self.queue_handler = logging.handlers.QueueHandler(self.queue)
+        if rate_limit_interval is not None:
+            # 在放入队列之前限流，被丢弃的行连队列都不进
+            self.queue_handler.addFilter(RateLimitFilter(interval=rate_limit_interval))
+        self.listener = logging.handlers.QueueListener(self.queue, console_handler, file_handler,
+                                                       respect_handler_level=True)
+        self.filename = filename
+        self._original_stdout = None
+
+    def start(self):
+        """启动后台写入线程，并把 sys.stdout 重定向到日志。"""
+        self.logger.addHandler(self.queue_handler)
+        self.listener.start()
+        self._original_stdout = sys.stdout
+        sys.stdout = PrintRedirect(self.logger)
+        print(f"日志功能已启动，所有控制台输出将被记录到 {self.filename}")
+
+    def stop(self):
+        """恢复标准输出，写完队列中剩余的日志并关闭文件。"""
+        if self._original_stdout is None:
+            return
+        sys.stdout = self._original_stdout
+        self._original_stdout = None
+        self.listener.stop()
+        self.logger.removeHandler(self.queue_handler)
+        for handler in self.listener.handlers:
+            handler.close()
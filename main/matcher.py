@@ -0,0 +1,170 @@
+# matcher.py
+
+import unicodedata
+
+# ==============================================================================
+# 2.12 模糊匹配 - 预编译目标文字，一次调用对所有目标打分
+# ==============================================================================
+# OCR 常见的混淆字符对（双向）。混淆字符之间的替换只计 confusion_cost，而不是完整的一次编辑
+DEFAULT_CONFUSIONS = [
+    # 数字和字母（比较前已转为小写、全角转半角）
+    ("0", "o"), ("1", "l"), ("1", "i"), ("l", "i"), ("5", "s"), ("8", "b"), ("2", "z"), ("6", "b"),
+    # 游戏界面文字中识别模型容易认错的汉字
+    ("开", "升"), ("开", "井"), ("启", "后"), ("离", "高"), ("赛", "塞"), ("赛", "寒"),
+    ("确", "碗"), ("认", "队"), ("认", "从"), ("比", "此"), ("通", "道"), ("科", "料"), ("目", "日"),
+]
+
+
+def union_bbox(ocr_results):
+    """
+    计算多个识别结果文字框的外接矩形。
+    :param ocr_results: EasyOCR格式的识别结果列表。
+    :return: 四个角点格式的文字框。
+    """
+    xs = [point[0] for res in ocr_results for point in res[0]]
+    ys = [point[1] for res in ocr_results for point in res[0]]
+    x0, x1, y0, y1 = min(xs), max(xs), min(ys), max(ys)
+    return [[x0, y0], [x1, y0], [x1, y1], [x0, y1]]
+
+
+def normalize_text(text):
+    """
+    统一文字的写法：全角转半角（NFKC）、字母转小写、去掉所有空白。
+    :param text: 原始文字。
+    :return: 规范化后的文字。
+    """
+    return "".join(unicodedata.normalize("NFKC", text).casefold().split())
+
+
+class FuzzyMatcher:
+    """
+    多目标模糊匹配器。每个目标文字只预处理一次（规范化、每个位置可接受的混淆字符），
+    之后把识别结果同时与所有目标比较，返回最相似的目标以及它所在的文字框。
+
+    相似度 = 1 - 编辑距离 / 目标长度，其中编辑距离允许识别结果在目标前后多出任意文字
+    （目标包含在识别结果中时相似度为 1），混淆字符之间的替换只计 confusion_cost。
+    """
+    def __init__(self, targets=(), threshold=0.8, confusions=None, confusion_cost=0.2):
+        """
+        初始化匹配器。
+        :param targets: 预先编译的目标文字；之后用到的新目标会自动编译。
+        :param threshold: 判定匹配成功的相似度阈值。
+        :param confusions: 额外的混淆字符对列表，追加在 DEFAULT_CONFUSIONS 之后。
+        :param confusion_cost: 混淆字符之间替换的代价 (0~1)。
+        """
+        self.threshold = threshold
+        self.confusion_cost = confusion_cost
+        # 字符 -> 与它混淆的字符集合
+        self.confusions = {}
+        for a, b in DEFAULT_CONFUSIONS + list(confusions or []):
+            a, b = normalize_text(a), normalize_text(b)
+            self.confusions.setdefault(a, set()).add(b)
+            self.confusions.setdefault(b, set()).add(a)
+        # 目标文字 -> (规范化后的文字, [(字符, 混淆字符集合), ...], 可接受字符 -> 与每个位置的替换代价)
+        self._compiled = {}
+        for target in targets:
+            self.compile(target)
+
+    def compile(self, target):
+        """
+        预处理一个目标文字（已编译过的直接返回缓存）。
+        :param target: 目标文字。
+        :return: 编译结果。
+        """
+        compiled = self._compiled.get(target)
+        if compiled is None:
+            normalized = normalize_text(target)
+            chars = [(c, frozenset(self.confusions.get(c, ()))) for c in normalized]
+            accepted = set(normalized).union(*(confusable for _, confusable in chars))
+            # 预先算好每个可接受字符与目标每个位置的替换代价，其余字符与任何位置的替换代价都是 1
+            costs = {ch: tuple(0.0 if ch == c else self.confusion_cost if ch in confusable else 1.0
+                               for c, confusable in chars)
+                     for ch in accepted}
+            compiled = self._compiled[target] = (normalized, chars, costs)
+        return compiled
+
+    def similarity(self, target, text, floor=0.0):
+        """
+        计算识别文字与一个目标的相似度。
+        :param target: 目标文字。
+        :param text: 识别出的文字。
+        :param floor: 只关心不低于该值的相似度。能提前证明相似度低于 floor 时，不再做完整计算，
+                      直接返回一个低于 floor 的上限估计。
+        :return: 相似度 (0~1)。
+        """
+        normalized, chars, costs = self.compile(target)
+        if not normalized:
+            return 0.0
+        text = normalize_text(text)
+        if normalized in text:
+            return 1.0
+        length = len(normalized)
+        # 识别文字中完全没有出现（包括混淆字符）的目标字符，每个至少要一次编辑
+        present = set(text).intersection(costs)
+        lower_bound = sum(1 for c, confusable in chars if c not in present and not (confusable & present))
+        if 1.0 - lower_bound / length < floor:
+            return 1.0 - lower_bound / length
+        # 动态规划：previous[j] 为目标前 j 个字符与“以当前位置结尾的某段识别文字”的最小编辑代价。
+        # 每一列的起点代价为 0，即识别文字前面多出的内容不计代价
+        previous = [float(j) for j in range(length + 1)]
+        best = previous[length]
+        mismatch = (1.0,) * length
+        for c in text:
+            row = costs.get(c, mismatch)
+            current = [0.0]
+            left = 0.0
+            for j in range(length):
+                left = min(previous[j] + row[j], previous[j + 1] + 1.0, left + 1.0)
+                current.append(left)
+            previous = current
+            if previous[length] < best:
+                best = previous[length]
+                if best <= lower_bound:
+                    # 已经达到下限，不可能更好
+                    break
+        return max(0.0, 1.0 - best / length)
+
+    def best(self, ocr_results, targets=None, floor=0.0):
+        """
+        把识别结果与多个目标比较，找出最相似的一对。
+        每个文字框单独比较，所有文字框拼接起来也比较一次（目标被拆成多个文字框时）。
+        :param ocr_results: 识别结果列表，每项为 (bbox, text, prob)。
+        :param targets: 目标文字列表，默认为所有已编译的目标。
+        :param floor: 见 similarity。
+        :return: (目标文字, 相似度, (bbox, text, prob))；没有识别结果或目标时返回 None。
+        """
+        targets = list(self._compiled) if targets is None else targets
+        if not ocr_results or not targets:
+            return None
+        candidates = list(ocr_results)
+        if len(ocr_results) > 1:
+            candidates.append(self._joined(ocr_results))
+        best = None
+        for target in targets:
+            for result in candidates:
+                score = self.similarity(target, result[1], floor)
+                if best is None or score > best[1]:
+                    best = (target, score, result)
+                    if score >= 1.0:
+                        return best
+        return best
+
+    def match(self, ocr_results, targets=None, threshold=None):
+        """
+        查找相似度达到阈值的目标。
+        :param ocr_results: 识别结果列表。
+        :param targets: 目标文字列表，默认为所有已编译的目标。
+        :param threshold: 相似度阈值，默认使用构造时的阈值。
+        :return: 与 best 相同；没有达到阈值时返回 None。
+        """
+        threshold = self.threshold if threshold is None else threshold
+        found = self.best(ocr_results, targets, floor=threshold)
+        if found is None or found[1] < threshold:
+            return None
+        return found
+
+    @staticmethod
+    def _joined(ocr_results):
+        """把所有文字框拼接成一个结果：文字按顺序拼接，文字框取外接矩形，置信度取最低值。"""
+        text = "".join(res[1] for res in ocr_results)
+        return union_bbox(ocr_results), text, min(res[2] for res in ocr_results)
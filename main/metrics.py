@@ -0,0 +1,234 @@
+# metrics.py
+
+import bisect
+import json
+import time
+
+# ==============================================================================
+# 2.10 运行指标 - 各阶段耗时直方图、每小时轮数和每轮OCR次数
+# ==============================================================================
+# 直方图的桶上界（秒），覆盖从一次截图（毫秒级）到一整轮加载（数十秒）的范围
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+class Histogram:
+    """固定桶的耗时直方图。只做计数，记录一个值的开销是一次二分查找。"""
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        """
+        初始化直方图。
+        :param buckets: 递增的桶上界（秒），最后还有一个隐含的 +Inf 桶。
+        """
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, value):
+        """
+        记录一个值。
+        :param value: 耗时（秒）。
+        """
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.total += value
+        if value > self.max:
+            self.max = value
+
+    def quantile(self, q):
+        """
+        估算分位数：返回累计计数达到 q 的那个桶的上界（不超过最大值）。
+        :param q: 分位数 (0~1)。
+        :return: 估算值（秒）；没有数据时返回 0。
+        """
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        cumulative = 0
+        for i, bucket_count in enumerate(self.counts):
+            cumulative += bucket_count
+            if cumulative >= rank and bucket_count:
+                return min(self.buckets[i], self.max) if i < len(self.buckets) else self.max
+        return self.max
+
+    def snapshot(self):
+        """
+        导出直方图的当前状态。
+        :return: 字典，包含次数、总和、平均值、p50/p95/p99、最大值和各桶的累计计数（与 Prometheus 的 le 桶一致）。
+        """
+        cumulative = []
+        running = 0
+        for bucket_count in self.counts:
+            running += bucket_count
+            cumulative.append(running)
+        return {
+            "count": self.count,
+            "sum": round(self.total, 6),
+            "mean": round(self.total / self.count, 6) if self.count else 0.0,
+            "p50": self.quantile(0.5),
+            "p95": self.quantile(0.95),
+            "p99": self.quantile(0.99),
+            "max": round(self.max, 6),
+            "buckets": dict(zip([str(b) for b in self.buckets] + ["+Inf"], cumulative)),
+        }
+
+
+class _Span:
+    """MetricsRecorder.span 返回的计时器，用 with 语句包住要计时的代码。"""
+    __slots__ = ("recorder", "name", "start")
+
+    def __init__(self, recorder, name):
+        self.recorder = recorder
+        self.name = name
+        self.start = 0.0
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.recorder.observe(self.name, time.perf_counter() - self.start)
+        return False
+
+
+class MetricsRecorder:
+    """
+    收集主循环的运行指标：
+    - 计时区间（span），例如 "ocr.capture"、"ocr.inference"、"round.loading"，聚合成直方图；
+    - 计数器，例如 "ocr.calls"，同时按轮统计。
+    每轮结束时调用 end_round，把这一轮的计数和各区间耗时（只是这一轮的增量）作为一行 JSON 追加到指标文件；
+    累计直方图比较大，只每隔 snapshot_every 轮和 close() 时各写一行（"type": "snapshot"）。
+    可以用 tail、jq 或本地的采集脚本读取。所有方法都只在主线程调用，不加锁。
+    """
+    def __init__(self, path=None, buckets=DEFAULT_BUCKETS, snapshot_every=50, writer=None):
+        """
+        初始化指标收集器。
+        :param path: JSON-lines 指标文件，只追加不覆盖。为 None 时只在内存中聚合。
+        :param buckets: 直方图的桶上界（秒）。
+        :param snapshot_every: 每隔多少轮写一次累计直方图。
+        :param writer: 可选的 logs.FileWriter，由它在后台线程写文件；为 None 时直接写入。
+        """
+        self.path = path
+        self.buckets = buckets
+        self.snapshot_every = snapshot_every
+        self.writer = writer
+        self.histograms = {}
+        self.counters = {}
+        # 当前这一轮的计数和各区间的累计耗时
+        self._round_counters = {}
+        self._round_spans = {}
+        self.started_at = time.time()
+        self._round_started_at = self.started_at
+        self.rounds = 0
+        self.failed_rounds = 0
+
+    def span(self, name):
+        """
+        返回一个计时上下文，退出时把耗时记入同名直方图。
+        :param name: 区间名称。
+        :return: 上下文管理器。
+        """
+        return _Span(self, name)
+
+    def observe(self, name, seconds):
+        """
+        记录一段耗时。
+        :param name: 区间名称。
+        :param seconds: 耗时（秒）。
+        """
+        histogram = self.histograms.get(name)
+        if histogram is None:
+            histogram = self.histograms[name] = Histogram(self.buckets)
+        histogram.observe(seconds)
+        self._round_spans[name] = self._round_spans.get(name, 0.0) + seconds
+
+    def increment(self, name, amount=1):
+        """
+        增加一个计数器。
+        :param name: 计数器名称。
+        :param amount: 增加的数量。
+        """
+        self.counters[name] = self.counters.get(name, 0) + amount
+        self._round_counters[name] = self._round_counters.get(name, 0) + amount
+
+    def rounds_per_hour(self):
+        """
+        :return: 从创建到现在，平均每小时完成的轮数。
+        """
+        elapsed = time.time() - self.started_at
+        return self.rounds * 3600.0 / elapsed if elapsed > 0 else 0.0
+
+    def _append(self, record):
+        """向指标文件追加一行。"""
+        if not self.path:
+            return
+        line = json.dumps(record, ensure_ascii=False) + "\n"
+        if self.writer is not None:
+            self.writer.append(self.path, line)
+        else:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(line)
+
+    def snapshot(self):
+        """
+        把所有累计直方图作为一行追加到指标文件。
+        :return: 写入的记录字典。
+        """
+        record = {
+            "type": "snapshot",
+            "ts": round(time.time(), 3),
+            "round": self.rounds,
+            "failed_rounds": self.failed_rounds,
+            "counters": dict(self.counters),
+            "histograms": {name: histogram.snapshot() for name, histogram in self.histograms.items()},
+        }
+        self._append(record)
+        return record
+
+    def close(self):
+        """程序退出前调用，写入最后一次累计直方图。"""
+        if self.rounds or self.failed_rounds:
+            self.snapshot()
+
+    def end_round(self, completed=True):
+        """
+        结束一轮：把本轮的数据追加到指标文件（每隔 snapshot_every 轮再追加一次累计直方图），然后清空本轮计数。
+        :param completed: 这一轮是否顺利完成。未完成的轮次不计入每小时轮数。
+        :return: 写入的记录字典。
+        """
+        now = time.time()
+        if completed:
+            self.rounds += 1
+            self.observe("round.total", now - self._round_started_at)
+        else:
+            self.failed_rounds += 1
+        record = {
+            "type": "round",
+            "ts": round(now, 3),
+            "round": self.rounds,
+            "completed": completed,
+            "failed_rounds": self.failed_rounds,
+            "round_seconds": round(now - self._round_started_at, 3),
+            "rounds_per_hour": round(self.rounds_per_hour(), 2),
+            "ocr_calls": self._round_counters.get("ocr.calls", 0),
+            "counters": self._round_counters,
+            "spans": {name: round(seconds, 4) for name, seconds in self._round_spans.items()},
+        }
+        self._append(record)
+        if completed and self.snapshot_every and self.rounds % self.snapshot_every == 0:
+            self.snapshot()
+        self._round_counters = {}
+        self._round_spans = {}
+        self._round_started_at = now
+        return record
+
+    def report(self):
+        """
+        :return: 一行便于打印的摘要。
+        """
+        parts = [f"每小时 {self.rounds_per_hour():.1f} 轮"]
+        for name in ("ocr.capture", "ocr.preprocess", "ocr.inference"):
+            histogram = self.histograms.get(name)
+            if histogram is not None and histogram.count:
+                parts.append(f"{name} p50 {histogram.quantile(0.5) * 1000:.1f}ms p95 {histogram.quantile(0.95) * 1000:.1f}ms")
+        return "，".join(parts)
@@ -0,0 +1,282 @@
+# ocr_backends.py
+
+import json
+import math
+import os
+import socket
+import threading
+
+import cv2
+import numpy as np
+
+# ==============================================================================
+# 2.7 可替换的OCR后端
+# ==============================================================================
+class OCRBackend:
+    """
+    OCR后端的接口。方法签名与 easyocr.Reader 保持一致，所以 OCRWatcher 和 recognize_boxes
+    不需要关心背后到底是哪个引擎。
+    """
+    # 后端名称，用于配置和日志
+    name = "base"
+
+    @classmethod
+    def load_dependencies(cls):
+        """导入后端依赖的重量级库（例如 torch、onnxruntime）。单独拆出来是为了能分别统计导入耗时。"""
+
+    def readtext(self, img):
+        """
+        完整的文字检测 + 识别。
+        :param img: 二值或灰度图像。
+        :return: EasyOCR格式的结果列表 [(bbox, text, prob), ...]。
+        """
+        raise NotImplementedError
+
+    def recognize(self, img, horizontal_list=None, free_list=None, detail=1, batch_size=1):
+        """
+        跳过检测，只识别给定位置的文字行。
+        :param img: 二值或灰度图像。
+        :param horizontal_list: 文字行的列表，每项为 [x_min, x_max, y_min, y_max]。
+        :param free_list: 任意四边形文字框（本项目中不使用）。
+        :param detail: 与 EasyOCR 一致，1 表示返回 (bbox, text, prob)。
+        :param batch_size: 一次推理的文字行数量。
+        :return: EasyOCR格式的结果列表。
+        """
+        raise NotImplementedError
+
+
+class EasyOCRBackend(OCRBackend):
+    """基于 easyocr.Reader（PyTorch）的后端，也是默认后端。"""
+    name = "easyocr"
+
+    @classmethod
+    def load_dependencies(cls):
+        import easyocr
+
+    def __init__(self, languages=('ch_sim', 'en'), gpu=False):
+        """
+        创建 easyocr.Reader。
+        :param languages: 识别的语言列表。
+        :param gpu: 是否使用GPU。
+        """
+        import easyocr
+        self.reader = easyocr.Reader(list(languages), gpu=gpu)
+
+    def readtext(self, img):
+        return self.reader.readtext(img)
+
+    def recognize(self, img, horizontal_list=None, free_list=None, detail=1, batch_size=1):
+        return self.reader.recognize(img, horizontal_list=horizontal_list, free_list=free_list,
+                                     detail=detail, batch_size=batch_size)
+
+
+class OnnxRecognizerBackend(OCRBackend):
+    """
+    基于 ONNX Runtime 的纯CPU识别后端，运行 int8 量化后的识别模型（由 tools/export_onnx_recognizer.py 从
+    EasyOCR 的识别模型导出）。不依赖 PyTorch，内存占用和启动时间都小得多。
+    它没有文字检测模型，readtext 会把整张图当作一行文字识别，这对本项目紧贴按钮的小区域已经足够。
+    """
+    name = "onnx"
+
+    @classmethod
+    def load_dependencies(cls):
+        import onnxruntime
+
+    def __init__(self, model_path="models/recognizer_int8.onnx", charset_path="models/charset.json",
+                 img_height=64, threads=1):
+        """
+        载入ONNX模型和字符表。
+        :param model_path: int8 量化后的识别模型路径。
+        :param charset_path: 字符表（JSON列表，第0项为CTC空白符）。
+        :param img_height: 模型输入的图像高度，与导出时一致。
+        :param threads: ONNX Runtime 的算子内线程数。农场机器上每个进程用1个线程最划算。
+        """
+        import onnxruntime
+        options = onnxruntime.SessionOptions()
+        options.intra_op_num_threads = threads
+        options.inter_op_num_threads = 1
+        options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = onnxruntime.InferenceSession(model_path, sess_options=options,
+                                                    providers=["CPUExecutionProvider"])
+        self.input_name = self.session.get_inputs()[0].name
+        with open(charset_path, "r", encoding="utf-8") as f:
+            self.characters = json.load(f)
+        self.img_height = img_height
+
+    def _prepare(self, crop, width):
+        """
+        按 EasyOCR 的方式预处理一行文字：保持宽高比缩放到模型高度，归一化到 [-1, 1]，
+        右侧用最后一列像素填充到批次的统一宽度。
+        :param crop: 一行文字的灰度图。
+        :param width: 批次的统一宽度。
+        :return: 形状为 (1, 高, 宽) 的 float32 数组。
+        """
+        height, crop_width = crop.shape[:2]
+        resized_width = min(width, max(1, math.ceil(self.img_height * crop_width / height)))
+        resized = cv2.resize(crop, (resized_width, self.img_height), interpolation=cv2.INTER_CUBIC)
+        line = np.empty((self.img_height, width), dtype=np.float32)
+        line[:, :resized_width] = resized / 127.5 - 1.0
+        line[:, resized_width:] = line[:, resized_width - 1:resized_width]
+        return line[np.newaxis]
+
+    def _decode(self, logits):
+        """
+        CTC贪心解码：每个时间步取概率最大的字符，合并连续重复并去掉空白符。
+        置信度的计算方式与 EasyOCR 相同。
+        :param logits: 形状为 (时间步, 类别数) 的输出。
+        :return: (文字, 置信度)
+        """
+        exp = np.exp(logits - logits.max(axis=1, keepdims=True))
+        probs = exp / exp.sum(axis=1, keepdims=True)
+        best = probs.argmax(axis=1)
+        best_probs = probs[np.arange(len(best)), best]
+        chars = []
+        kept_probs = []
+        previous = 0
+        for index, prob in zip(best, best_probs):
+            if index != 0 and index != previous:
+                chars.append(self.characters[index])
+                kept_probs.append(prob)
+            previous = index
+        if not kept_probs:
+            return "", 0.0
+        confidence = float(np.prod(kept_probs) ** (2.0 / math.sqrt(len(kept_probs))))
+        return "".join(chars), confidence
+
+    def recognize(self, img, horizontal_list=None, free_list=None, detail=1, batch_size=1):
+        height, width = img.shape[:2]
+        if not horizontal_list:
+            horizontal_list = [[0, width, 0, height]]
+        boxes = []
+        crops = []
+        for x_min, x_max, y_min, y_max in horizontal_list:
+            x_min, y_min = max(0, x_min), max(0, y_min)
+            x_max, y_max = min(width, x_max), min(height, y_max)
+            if x_max - x_min < 1 or y_max - y_min < 1:
+                continue
+            boxes.append([[x_min, y_min], [x_max, y_min], [x_max, y_max], [x_min, y_max]])
+            crops.append(img[y_min:y_max, x_min:x_max])
+        if not crops:
+            return []
+        # 所有文字行缩放到同一高度后，按最宽的一行统一宽度，组成一个批次只推理一次
+        batch_width = max(math.ceil(self.img_height * c.shape[1] / c.shape[0]) for c in crops)
+        batch = np.stack([self._prepare(crop, batch_width) for crop in crops])
+        logits = self.session.run(None, {self.input_name: batch})[0]
+        results = []
+        for bbox, line_logits in zip(boxes, logits):
+            text, confidence = self._decode(line_logits)
+            results.append((bbox, text, confidence))
+        return results
+
+    def readtext(self, img):
+        return [res for res in self.recognize(img) if res[1].strip()]
+
+
+class RemoteOCRBackend(OCRBackend):
+    """
+    不在本进程加载模型，把识别请求通过本机套接字发给共享OCR服务（见 ocr_service.py）。
+    同一台机器上的多个会话共用服务中的一个模型，服务会把各会话同时到达的请求合并成一批识别。
+    """
+    name = "remote"
+
+    @classmethod
+    def load_dependencies(cls):
+        from multiprocessing import connection
+
+    def __init__(self, address=("127.0.0.1", 6010), authkey=None, key_path="~/.ocr_service_key",
+                 key_env="OCR_SERVICE_AUTHKEY", session=None):
+        """
+        连接共享OCR服务。
+        :param address: 服务的地址 (主机, 端口)。
+        :param authkey: 认证密钥，与服务一致；为 None 时从 key_env 环境变量或 key_path 密钥文件读取，见 ocr_service.load_authkey。
+        :param key_path: 当前用户的密钥文件。
+        :param key_env: 保存密钥的环境变量名称。
+        :param session: 会话名称，服务按会话统计排队时间；默认使用 主机名-进程号。
+        """
+        from multiprocessing.connection import Client
+        if authkey is None:
+            from ocr_service import load_authkey
+            authkey = load_authkey(key_path, key_env)
+        self.address = tuple(address)
+        self.session = session or f"{socket.gethostname()}-{os.getpid()}"
+        try:
+            self.conn = Client(self.address, authkey=authkey)
+        except OSError as e:
+            raise RuntimeError(f"无法连接共享OCR服务 {self.address[0]}:{self.address[1]}（请先运行 main/ocr_service.py）: {e}")
+        self.conn.send(("hello", self.session))
+        self._lock = threading.Lock()
+        # 最近一次请求在服务端的排队时间，以及累计的请求次数和排队时间（秒）
+        self.last_wait = 0.0
+        self.requests = 0
+        self.total_wait = 0.0
+
+    def _call(self, *message):
+        """
+        发送一个请求并等待回复。同一个连接上的请求依次进行。
+        :return: (服务返回的结果, 请求在服务端的排队时间)。
+        """
+        with self._lock:
+            self.conn.send(message)
+            status, payload, wait = self.conn.recv()
+        if status != "ok":
+            raise RuntimeError(f"共享OCR服务出错: {payload}")
+        return payload, wait
+
+    def _ocr(self, *message):
+        """发送一个识别请求，并累计排队时间。"""
+        results, wait = self._call(*message)
+        self.last_wait = wait
+        self.requests += 1
+        self.total_wait += wait
+        return results
+
+    def recognize(self, img, horizontal_list=None, free_list=None, detail=1, batch_size=1):
+        return self._ocr("recognize", np.ascontiguousarray(img), horizontal_list)
+
+    def readtext(self, img):
+        return self._ocr("readtext", np.ascontiguousarray(img))
+
+    def stats(self):
+        """
+        :return: 服务端的统计信息，见 OCRService.stats。
+        """
+        return self._call("stats")[0]
+
+
+# 可在配置中选择的后端。只用于测试的后端由所在模块自己注册，见 register_backend
+BACKENDS = {
+    EasyOCRBackend.name: EasyOCRBackend,
+    OnnxRecognizerBackend.name: OnnxRecognizerBackend,
+    RemoteOCRBackend.name: RemoteOCRBackend,
+}
+
+
+def register_backend(backend_class):
+    """
+    注册一个额外的后端，之后可以通过名称创建，例如 simulator.py 在被导入时注册模拟后端。
+    :param backend_class: OCRBackend 的子类，使用它的 name 作为名称。
+    :return: 传入的类。
+    """
+    BACKENDS[backend_class.name] = backend_class
+    return backend_class
+
+
+def get_backend_class(name):
+    """
+    根据名称查找后端类。
+    :param name: 后端名称，见 BACKENDS。
+    :return: 后端类。
+    """
+    if name not in BACKENDS:
+        raise ValueError(f"未知的OCR后端 '{name}'，可选: {', '.join(BACKENDS)}")
+    return BACKENDS[name]
+
+
+def create_backend(name, **options):
+    """
+    根据名称创建OCR后端。
+    :param name: 后端名称，见 BACKENDS。
+    :param options: 传给后端构造函数的参数。
+    :return: OCRBackend 实例。
+    """
+    return get_backend_class(name)(**options)
@@ -0,0 +1,430 @@
+# ocr_service.py
+
+import argparse
+import ipaddress
+import os
+import queue
+import secrets
+import socket
+import threading
+import time
+from multiprocessing.connection import Listener
+
+import numpy as np
+
+from metrics import Histogram
+from ocr_backends import create_backend
+
+# ==============================================================================
+# 2.14 共享OCR服务 - 一台机器上的多个会话共用一个模型，跨会话批量识别
+# ==============================================================================
+# 服务默认监听的本机地址、认证密钥的环境变量和密钥文件，与 ocr_backends.RemoteOCRBackend 的默认值一致
+DEFAULT_ADDRESS = ("127.0.0.1", 6010)
+DEFAULT_KEY_ENV = "OCR_SERVICE_AUTHKEY"
+DEFAULT_KEY_PATH = "~/.ocr_service_key"
+# 客户端消息类型 -> 消息元组的长度
+MESSAGE_LENGTHS = {"hello": 2, "recognize": 3, "readtext": 2, "stats": 1}
+
+
+def load_authkey(key_path=DEFAULT_KEY_PATH, key_env=DEFAULT_KEY_ENV):
+    """
+    读取服务和客户端共用的认证密钥。服务会反序列化收到的数据，任何拿到密钥的程序都能让服务执行任意代码，
+    所以密钥不能写死在代码或配置里：
+    - 设置了环境变量 key_env 时使用它的值；
+    - 否则读取当前用户的密钥文件，文件不存在时随机生成一个（权限 0600，只有当前用户可读）。
+    :param key_path: 密钥文件路径，可以使用 ~ 表示用户目录。
+    :param key_env: 环境变量名称，为 None 时不读取环境变量。
+    :return: 密钥（字节串）。
+    """
+    if key_env and os.environ.get(key_env):
+        return os.environ[key_env].encode("utf-8")
+    path = os.path.expanduser(key_path)
+    try:
+        # O_EXCL 保证同时启动的多个进程只有一个会生成密钥
+        fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    except FileExistsError:
+        pass
+    else:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write(secrets.token_hex(32))
+        print(f"[OCR服务] 已生成新的认证密钥 {path}")
+    with open(path, "r", encoding="utf-8") as f:
+        key = f.read().strip()
+    if not key:
+        raise RuntimeError(f"认证密钥文件 {path} 是空的，请删除后重新运行")
+    return key.encode("utf-8")
+
+
+def is_loopback(host):
+    """
+    :param host: 主机名或IP地址。
+    :return: 地址是否只能从本机访问（127.0.0.0/8、::1 或解析到它们的主机名，例如 localhost）。
+    """
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        pass
+    try:
+        return all(ipaddress.ip_address(info[4][0]).is_loopback for info in socket.getaddrinfo(host, None))
+    except (OSError, ValueError):
+        return False
+
+
+class _Request:
+    """一个等待识别的请求。"""
+    __slots__ = ("session", "conn", "kind", "img", "horizontal_list", "received")
+
+    def __init__(self, session, conn, kind, img, horizontal_list, received):
+        self.session = session
+        self.conn = conn
+        self.kind = kind
+        self.img = img
+        self.horizontal_list = horizontal_list
+        self.received = received
+
+
+class _Connection:
+    """一个客户端连接。回复可能来自识别线程和连接线程，发送时加锁。"""
+    def __init__(self, conn):
+        self.conn = conn
+        self.lock = threading.Lock()
+
+    def send(self, message):
+        with self.lock:
+            try:
+                self.conn.send(message)
+            except (OSError, EOFError):
+                # 客户端已经断开，丢弃回复
+                pass
+
+
+class OCRService:
+    """
+    本机OCR服务。只加载一个OCR后端，多个会话（各自的 action.py 进程，使用 "remote" 后端）通过本机套接字提交识别请求：
+    - 每个连接一个线程负责接收请求，放入同一个队列；
+    - 唯一的识别线程拿到第一个请求后，最多再等 batch_window 秒收集其他会话的请求，
+      把所有 recognize 请求的图像上下拼成一张图，一次推理全部识别，再按位置把结果分回各个请求；
+      readtext（完整检测）请求逐个执行；
+    - 按会话统计排队等待时间（收到请求到开始推理），并统计模型的忙碌比例。
+      增加会话直到排队时间明显变长、忙碌比例接近 100%，就到了这台机器的吞吐上限。
+    """
+    def __init__(self, backend="easyocr", backend_options=None, address=DEFAULT_ADDRESS, authkey=None,
+                 batch_window=0.01, max_batch=16, report_interval=60.0, reader=None, allow_remote=False):
+        """
+        初始化服务。
+        :param backend: OCR后端名称，见 ocr_backends.BACKENDS。
+        :param backend_options: 传给后端构造函数的参数字典。
+        :param address: 监听地址 (主机, 端口)。
+        :param authkey: 客户端连接时使用的认证密钥，None 表示使用 load_authkey() 读取（或生成）的密钥。
+        :param batch_window: 收到第一个请求后，最多再等待多少秒收集其他请求组成一批。
+        :param max_batch: 一批最多包含的请求数。
+        :param report_interval: 每隔多少秒打印一次各会话的排队统计，None 表示不打印。
+        :param reader: 可选，直接使用已创建好的后端实例（此时忽略 backend 和 backend_options）。
+        :param allow_remote: 是否允许监听本机回环以外的地址。服务会反序列化收到的数据，默认拒绝。
+        """
+        self.backend = backend
+        self.backend_options = backend_options or {}
+        self.address = tuple(address)
+        self.authkey = authkey if authkey is not None else load_authkey()
+        self.allow_remote = allow_remote
+        self.batch_window = batch_window
+        self.max_batch = max_batch
+        self.report_interval = report_interval
+        self.reader = reader
+        self._requests = queue.Queue()
+        self._stop_event = threading.Event()
+        self._listener = None
+        self._threads = []
+        self._lock = threading.Lock()
+        # 当前的连接数。只有一个连接时没有可以合并的请求，不等待 batch_window
+        self.connections = 0
+        # 会话名称 -> 排队等待时间的直方图；批次数、批次中的请求数、推理的累计耗时
+        self.session_waits = {}
+        self.batches = 0
+        self.batched_requests = 0
+        self.busy_seconds = 0.0
+        self.started_at = None
+        self._last_report = None
+
+    def start(self):
+        """加载后端，开始监听，并启动接收线程和识别线程。"""
+        if not self.allow_remote and not is_loopback(self.address[0]):
+            raise ValueError(f"拒绝监听非本机地址 {self.address[0]}：任何能连上服务并拿到密钥的程序都能让服务执行任意代码。"
+                             f"确实需要时请使用 --allow-remote（allow_remote=True）")
+        if self.reader is None:
+            start = time.perf_counter()
+            print(f"[OCR服务] 正在加载 OCR 后端 ({self.backend})...")
+            self.reader = create_backend(self.backend, **self.backend_options)
+            print(f"[OCR服务] OCR 后端加载完成，用时 {time.perf_counter() - start:.1f}s")
+        self._listener = Listener(self.address, authkey=self.authkey)
+        # 使用端口 0 时，记录系统实际分配的端口
+        self.address = self._listener.address
+        self.started_at = self._last_report = time.perf_counter()
+        for target, name in ((self._accept_loop, "ocr-service-accept"), (self._batch_loop, "ocr-service-batch")):
+            thread = threading.Thread(target=target, name=name, daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        print(f"[OCR服务] 正在监听 {self.address[0]}:{self.address[1]}，批次等待 {self.batch_window * 1000:.0f}ms，"
+              f"每批最多 {self.max_batch} 个请求")
+
+    def stop(self):
+        """停止服务。"""
+        self._stop_event.set()
+        self._requests.put(None)
+        if self._listener is not None:
+            self._listener.close()
+            self._listener = None
+        for thread in self._threads:
+            thread.join(timeout=2)
+        self._threads = []
+
+    def serve_forever(self):
+        """启动服务并一直运行，直到按下 Ctrl+C。"""
+        self.start()
+        try:
+            while not self._stop_event.wait(1.0):
+                pass
+        except KeyboardInterrupt:
+            print("\n[OCR服务] 收到中断，正在退出...")
+        finally:
+            self.stop()
+            print(f"[OCR服务] {self.report()}")
+
+    def _accept_loop(self):
+        """接收线程：为每个新连接启动一个线程。"""
+        while not self._stop_event.is_set():
+            try:
+                conn = self._listener.accept()
+            except (OSError, EOFError) as e:
+                if not self._stop_event.is_set():
+                    print(f"[OCR服务] 接受连接失败: {e}")
+                    continue
+                return
+            threading.Thread(target=self._connection_loop, args=(conn,), name="ocr-service-conn",
+                             daemon=True).start()
+
+    def _connection_loop(self, raw_conn):
+        """
+        连接线程：读取一个客户端的消息。
+        ("hello", 会话名称) 注册会话；("recognize", 图像, horizontal_list) 和 ("readtext", 图像) 放入识别队列；
+        ("stats",) 立即回复统计信息。
+        """
+        conn = _Connection(raw_conn)
+        session = "unknown"
+        with self._lock:
+            self.connections += 1
+        try:
+            while not self._stop_event.is_set():
+                try:
+                    message = raw_conn.recv()
+                except (EOFError, OSError):
+                    raise
+                except Exception as e:
+                    # 消息已经完整收到，只是无法反序列化（例如客户端发送了服务端没有的类），连接仍然可用
+                    conn.send(("error", f"无法解析请求: {e}", 0.0))
+                    continue
+                error = self._check_message(message)
+                if error is not None:
+                    # 格式不对的请求必须回复，否则客户端会一直等待
+                    conn.send(("error", error, 0.0))
+                    continue
+                kind = message[0]
+                if kind == "hello":
+                    session = message[1]
+                    with self._lock:
+                        self.session_waits.setdefault(session, Histogram())
+                    print(f"[OCR服务] 会话 '{session}' 已连接")
+                elif kind == "recognize":
+                    self._requests.put(_Request(session, conn, kind, message[1], message[2], time.perf_counter()))
+                elif kind == "readtext":
+                    self._requests.put(_Request(session, conn, kind, message[1], None, time.perf_counter()))
+                else:
+                    conn.send(("ok", self.stats(), 0.0))
+        except (EOFError, OSError):
+            pass
+        finally:
+            with self._lock:
+                self.connections -= 1
+            raw_conn.close()
+            print(f"[OCR服务] 会话 '{session}' 已断开")
+
+    @staticmethod
+    def _check_message(message):
+        """
+        检查客户端消息的格式。识别线程一次处理多个会话的请求，格式错误的图像不能进入识别队列，
+        否则同一批的其他请求也会一起失败。
+        :param message: 收到的消息。
+        :return: 格式错误时返回错误说明，否则返回 None。
+        """
+        if not isinstance(message, tuple) or not message:
+            return f"请求必须是非空元组，收到 {type(message).__name__}"
+        kind = message[0]
+        if not isinstance(kind, str) or kind not in MESSAGE_LENGTHS:
+            return f"未知的请求类型 '{kind}'"
+        if len(message) != MESSAGE_LENGTHS[kind]:
+            return f"请求 '{kind}' 应有 {MESSAGE_LENGTHS[kind]} 项，收到 {len(message)} 项"
+        if kind == "hello" and not isinstance(message[1], str):
+            return "会话名称必须是字符串"
+        if kind in ("recognize", "readtext") and not isinstance(message[1], np.ndarray):
+            return f"图像必须是 numpy 数组，收到 {type(message[1]).__name__}"
+        if kind == "recognize" and (message[1].ndim != 2 or message[1].dtype != np.uint8):
+            return f"recognize 的图像必须是二维 uint8 灰度图，收到 {message[1].dtype} {message[1].shape}"
+        if kind == "recognize" and message[2] is not None and not isinstance(message[2], list):
+            return "horizontal_list 必须是列表或 None"
+        return None
+
+    def _collect_batch(self):
+        """
+        取出一批请求：阻塞等待第一个请求，然后在 batch_window 内继续收集，直到达到 max_batch。
+        只有一个连接时只取出已经在队列中的请求，不再等待。
+        :return: 请求列表；服务停止时返回 None。
+        """
+        first = self._requests.get()
+        if first is None:
+            return None
+        batch = [first]
+        deadline = time.perf_counter() + (self.batch_window if self.connections > 1 else 0.0)
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.perf_counter()
+            try:
+                request = self._requests.get(timeout=remaining) if remaining > 0 else self._requests.get_nowait()
+            except queue.Empty:
+                break
+            if request is None:
+                self._requests.put(None)
+                break
+            batch.append(request)
+        return batch
+
+    def _batch_loop(self):
+        """识别线程：唯一使用模型的线程。"""
+        while not self._stop_event.is_set():
+            batch = self._collect_batch()
+            if batch is None:
+                return
+            start = time.perf_counter()
+            with self._lock:
+                for request in batch:
+                    self.session_waits.setdefault(request.session, Histogram()).observe(start - request.received)
+            recognize = [request for request in batch if request.kind == "recognize"]
+            if recognize:
+                try:
+                    outputs = self._recognize_batch(recognize)
+                except Exception as e:
+                    print(f"[OCR服务] 识别出错: {e}")
+                    outputs = e
+                for i, request in enumerate(recognize):
+                    self._reply(request, outputs if isinstance(outputs, Exception) else outputs[i], start)
+            for request in batch:
+                if request.kind == "readtext":
+                    try:
+                        results = self.reader.readtext(request.img)
+                    except Exception as e:
+                        print(f"[OCR服务] 识别出错: {e}")
+                        results = e
+                    self._reply(request, results, start)
+            with self._lock:
+                self.busy_seconds += time.perf_counter() - start
+                self.batches += 1
+                self.batched_requests += len(batch)
+            if self.report_interval is not None and time.perf_counter() - self._last_report >= self.report_interval:
+                self._last_report = time.perf_counter()
+                print(f"[OCR服务] {self.report()}")
+
+    def _recognize_batch(self, requests):
+        """
+        把多个请求的图像上下拼成一张图，一次推理识别所有文字行（与 OCRWatcher.read_text_from_regions 的做法相同）。
+        :param requests: recognize 请求列表。
+        :return: 与 requests 一一对应的识别结果列表，坐标相对于各自的图像。
+        """
+        if len(requests) == 1:
+            request = requests[0]
+            lines = request.horizontal_list or [[0, request.img.shape[1], 0, request.img.shape[0]]]
+            return [self.reader.recognize(request.img, horizontal_list=lines, free_list=[], detail=1,
+                                          batch_size=len(lines))]
+        height = sum(request.img.shape[0] for request in requests)
+        width = max(request.img.shape[1] for request in requests)
+        mosaic = np.zeros((height, width), dtype=np.uint8)
+        horizontal_list = []
+        spans = []
+        offset = 0
+        for request in requests:
+            h, w = request.img.shape[:2]
+            mosaic[offset:offset + h, :w] = request.img
+            lines = request.horizontal_list or [[0, w, 0, h]]
+            horizontal_list += [[x_min, x_max, y_min + offset, y_max + offset] for x_min, x_max, y_min, y_max in lines]
+            spans.append((offset, offset + h))
+            offset += h
+        results = self.reader.recognize(mosaic, horizontal_list=horizontal_list, free_list=[], detail=1,
+                                        batch_size=len(horizontal_list))
+        # 按文字框中心所在的行范围把结果分回各个请求，并换算回请求自己的坐标
+        outputs = [[] for _ in requests]
+        for bbox, text, prob in results:
+            center_y = (bbox[0][1] + bbox[2][1]) / 2
+            for i, (top, bottom) in enumerate(spans):
+                if top <= center_y < bottom:
+                    outputs[i].append(([[px, py - top] for px, py in bbox], text, prob))
+                    break
+        return outputs
+
+    @staticmethod
+    def _reply(request, results, start):
+        """
+        把识别结果发回请求的客户端，同时附上该请求的排队时间。
+        :param results: 识别结果列表，或识别时抛出的异常。
+        :param start: 这一批开始推理的时间。
+        """
+        if isinstance(results, Exception):
+            request.conn.send(("error", str(results), start - request.received))
+        else:
+            request.conn.send(("ok", results, start - request.received))
+
+    def stats(self):
+        """
+        :return: 字典，包含每个会话的排队时间统计、批次数、平均每批请求数和模型忙碌比例。
+        """
+        with self._lock:
+            elapsed = time.perf_counter() - self.started_at if self.started_at is not None else 0.0
+            return {
+                "sessions": {name: histogram.snapshot() for name, histogram in self.session_waits.items()},
+                "batches": self.batches,
+                "mean_batch": self.batched_requests / self.batches if self.batches else 0.0,
+                "requests_per_second": self.batched_requests / elapsed if elapsed else 0.0,
+                "utilization": self.busy_seconds / elapsed if elapsed else 0.0,
+            }
+
+    def report(self):
+        """
+        :return: 各会话排队时间和模型忙碌比例的摘要。
+        """
+        stats = self.stats()
+        sessions = "；".join(
+            f"{name} {snapshot['count']} 次，排队 平均 {snapshot['mean'] * 1000:.1f}ms / p95 {snapshot['p95'] * 1000:.1f}ms"
+            for name, snapshot in stats["sessions"].items())
+        return (f"{len(stats['sessions'])} 个会话，{stats['requests_per_second']:.1f} 请求/秒，"
+                f"平均每批 {stats['mean_batch']:.1f} 个请求，模型忙碌 {stats['utilization'] * 100:.0f}%"
+                + (f"。{sessions}" if sessions else ""))
+
+
+# --- 主程序入口 ---
+if __name__ == '__main__':
+    from config import (
+        OCR_BACKEND_OPTIONS, OCR_SERVICE_ADDRESS, OCR_SERVICE_AUTHKEY_ENV, OCR_SERVICE_BACKEND, OCR_SERVICE_BATCH_WINDOW,
+        OCR_SERVICE_KEY_FILE, OCR_SERVICE_MAX_BATCH,
+    )
+    parser = argparse.ArgumentParser(description="启动本机共享OCR服务，供多个会话（OCR_BACKEND = \"remote\"）共用一个模型")
+    parser.add_argument("--backend", default=OCR_SERVICE_BACKEND, help="服务使用的OCR后端")
+    parser.add_argument("--host", default=OCR_SERVICE_ADDRESS[0], help="监听地址")
+    parser.add_argument("--port", type=int, default=OCR_SERVICE_ADDRESS[1], help="监听端口")
+    parser.add_argument("--batch-window", type=float, default=OCR_SERVICE_BATCH_WINDOW,
+                        help="收集一批请求的最长等待时间（秒）")
+    parser.add_argument("--max-batch", type=int, default=OCR_SERVICE_MAX_BATCH, help="一批最多包含的请求数")
+    parser.add_argument("--report-interval", type=float, default=60.0, help="打印排队统计的间隔（秒）")
+    parser.add_argument("--allow-remote", action="store_true",
+                        help="允许监听本机回环以外的地址（服务会反序列化收到的数据，只在可信的网络中使用）")
+    args = parser.parse_args()
+
+    OCRService(backend=args.backend, backend_options=OCR_BACKEND_OPTIONS.get(args.backend),
+               address=(args.host, args.port), authkey=load_authkey(OCR_SERVICE_KEY_FILE, OCR_SERVICE_AUTHKEY_ENV),
+               batch_window=args.batch_window, max_batch=args.max_batch, report_interval=args.report_interval,
+               allow_remote=args.allow_remote).serve_forever()
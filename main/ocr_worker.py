@@ -0,0 +1,398 @@
+# ocr_worker.py
+
+import multiprocessing as mp
+import queue
+import threading
+import time
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from ocr_backends import get_backend_class
+from screen_sources import MSSSource
+from vision import FrameBuffers, FrameChangeGate, recognize_fixed_region
+
+# ==============================================================================
+# 2.4 共享内存帧环形缓冲区 - 截图在进程之间传递时不做任何序列化拷贝
+# ==============================================================================
+# 每个槽位的头部字段：序号、区域编号、高度、宽度、截图时间（纳秒）
+_SEQ, _REGION_ID, _HEIGHT, _WIDTH, _TIMESTAMP = range(5)
+_HEADER_FIELDS = 5
+
+
+class FrameRing:
+    """
+    一个基于 multiprocessing.shared_memory 的定长环形缓冲区，存放预处理后的二值截图。
+    写入方按序号轮流覆盖槽位；读取方直接在共享内存上读取，读完后再核对一次序号，
+    如果槽位在读取期间被覆盖（序号变了），就丢弃这次的结果（类似 seqlock）。
+    """
+    def __init__(self, slots=16, max_frame_bytes=640 * 480, names=None):
+        """
+        创建或连接一个环形缓冲区。
+        :param slots: 槽位数量。
+        :param max_frame_bytes: 每个槽位能存放的最大帧字节数（宽 x 高）。
+        :param names: (数据块名称, 头部块名称)。为 None 时新建共享内存，否则连接到已有的共享内存。
+        """
+        self.slots = slots
+        self.max_frame_bytes = max_frame_bytes
+        self.owner = names is None
+        if self.owner:
+            self._data_shm = shared_memory.SharedMemory(create=True, size=slots * max_frame_bytes)
+            self._header_shm = shared_memory.SharedMemory(create=True, size=slots * _HEADER_FIELDS * 8)
+        else:
+            self._data_shm = shared_memory.SharedMemory(name=names[0])
+            self._header_shm = shared_memory.SharedMemory(name=names[1])
+        self.data = np.ndarray((slots, max_frame_bytes), dtype=np.uint8, buffer=self._data_shm.buf)
+        self.header = np.ndarray((slots, _HEADER_FIELDS), dtype=np.int64, buffer=self._header_shm.buf)
+        if self.owner:
+            self.header[:] = 0
+        self._next_seq = 1
+
+    @property
+    def names(self):
+        """共享内存块的名称，传给其他进程用于连接。"""
+        return self._data_shm.name, self._header_shm.name
+
+    def write(self, region_id, frame):
+        """
+        把一帧写入下一个槽位（只能由唯一的写入线程调用）。
+        :param region_id: 区域编号。
+        :param frame: 二维 uint8 图像。
+        :return: (槽位, 序号)
+        """
+        height, width = frame.shape[:2]
+        if height * width > self.max_frame_bytes:
+            raise ValueError(f"截图 {width}x{height} 超出了环形缓冲区槽位的大小 {self.max_frame_bytes} 字节")
+        seq = self._next_seq
+        self._next_seq += 1
+        slot = seq % self.slots
+        row = self.header[slot]
+        # 先把序号置为0，表示槽位正在写入
+        row[_SEQ] = 0
+        np.copyto(self.data[slot, :height * width].reshape(height, width), frame)
+        row[_REGION_ID] = region_id
+        row[_HEIGHT] = height
+        row[_WIDTH] = width
+        row[_TIMESTAMP] = time.time_ns()
+        # 最后写入序号，读取方看到序号即表示数据已完整
+        row[_SEQ] = seq
+        return slot, seq
+
+    def view(self, slot, seq):
+        """
+        以零拷贝的方式查看槽位中的帧。
+        :param slot: 槽位。
+        :param seq: 期望的序号。
+        :return: (区域编号, 截图时间(秒), 图像视图)；如果槽位已被覆盖则返回 None。
+        """
+        row = self.header[slot]
+        if row[_SEQ] != seq:
+            return None
+        height, width = int(row[_HEIGHT]), int(row[_WIDTH])
+        frame = self.data[slot, :height * width].reshape(height, width)
+        return int(row[_REGION_ID]), row[_TIMESTAMP] / 1e9, frame
+
+    def is_current(self, slot, seq):
+        """读取完成后核对槽位是否仍是同一帧。"""
+        return self.header[slot, _SEQ] == seq
+
+    def close(self):
+        """断开共享内存；创建者还会释放共享内存。"""
+        del self.data
+        del self.header
+        self._data_shm.close()
+        self._header_shm.close()
+        if self.owner:
+            self._data_shm.unlink()
+            self._header_shm.unlink()
+
+
+# ==============================================================================
+# 2.5 OCR工作进程
+# ==============================================================================
+def _worker_main(ring_names, slots, max_frame_bytes, task_queue, result_queue, stop_event,
+                 backend_class, backend_options, min_confidence, change_sensitivity, torch_threads):
+    """
+    OCR工作进程的主函数。每个工作进程加载自己的OCR引擎，从任务队列领取 (槽位, 序号)，
+    直接在共享内存上识别，然后把结果放入结果队列。
+    :param ring_names: FrameRing 的共享内存名称。
+    :param slots: 槽位数量。
+    :param max_frame_bytes: 每个槽位的大小。
+    :param task_queue: 任务队列，元素为 (槽位, 序号)。
+    :param result_queue: 结果队列，元素为 (区域编号, 序号, 截图时间, 识别结果)。
+    :param stop_event: 这一批工作进程专用的停止信号，处理完手中的任务后退出。
+    :param backend_class: OCR后端类。传类而不是名称：类按模块路径传给子进程，子进程导入该模块时，
+                          用 register_backend 注册的后端（例如模拟器的 sim 后端）也随之可用。
+    :param backend_options: 传给OCR后端构造函数的参数字典。
+    :param min_confidence: 快速识别路径的最低置信度。
+    :param change_sensitivity: 进程内画面变化检测的灵敏度，None 表示关闭。
+    :param torch_threads: 每个进程使用的 torch 线程数，None 表示使用默认值。
+    """
+    if torch_threads and backend_class.name == "easyocr":
+        import torch
+        torch.set_num_threads(torch_threads)
+    ring = FrameRing(slots, max_frame_bytes, names=ring_names)
+    reader = backend_class(**(backend_options or {}))
+    gate = FrameChangeGate(sensitivity=change_sensitivity) if change_sensitivity is not None else None
+    try:
+        while not stop_event.is_set():
+            try:
+                tasks = [task_queue.get(timeout=0.2)]
+            except queue.Empty:
+                continue
+            # 把积压的任务一次取完，每个区域只识别最新的一帧
+            while True:
+                try:
+                    tasks.append(task_queue.get_nowait())
+                except queue.Empty:
+                    break
+            newest = {}
+            for slot, seq in tasks:
+                frame_info = ring.view(slot, seq)
+                if frame_info is not None:
+                    newest[frame_info[0]] = (slot, seq, frame_info)
+            for region_id, (slot, seq, (_, timestamp, frame)) in newest.items():
+                results = None
+                signature = None
+                if gate is not None:
+                    unchanged, results, signature = gate.lookup(region_id, frame)
+                recognized = results is None
+                if recognized:
+                    results, _ = recognize_fixed_region(reader, frame, min_confidence)
+                    # 转换成普通的 Python 类型，便于通过队列传回主进程
+                    results = [([[int(px), int(py)] for px, py in bbox], text, float(prob)) for bbox, text, prob in results]
+                # 识别期间槽位被覆盖，说明读到的数据可能不完整，丢弃；
+                # 不完整的帧也不能存入变化检测的缓存，否则之后相同的画面会一直复用这次错误的结果
+                if not ring.is_current(slot, seq):
+                    continue
+                if recognized and gate is not None:
+                    gate.store(region_id, signature, results)
+                result_queue.put((region_id, seq, timestamp, results))
+    finally:
+        ring.close()
+
+
+# ==============================================================================
+# 2.6 OCR工作进程池 - 截图线程 + N个识别进程 + 结果收集线程
+# ==============================================================================
+class OCRWorkerPool:
+    """
+    把截图、识别和输入操作拆开：截图线程以固定频率截取最近被请求过的区域并写入共享内存环形缓冲区，
+    N 个工作进程并行识别，结果收集线程只保留每个区域最新的结果。
+    调用方通过 latest() 以非阻塞的方式读取最新结果。
+    """
+    def __init__(self, workers=1, capture_interval=0.1, slots=16, max_frame_bytes=640 * 480,
+                 backend="easyocr", backend_options=None, min_confidence=0.5, change_sensitivity=0.02,
+                 torch_threads=None, idle_timeout=5.0, source_factory=MSSSource):
+        """
+        初始化工作进程池（调用 start() 后才开始工作）。
+        :param workers: OCR工作进程的数量，多核机器上可以适当调大。
+        :param capture_interval: 截图线程两次截图之间的间隔（秒）。
+        :param slots: 环形缓冲区的槽位数量。
+        :param max_frame_bytes: 单个区域截图的最大字节数（宽 x 高）。
+        :param backend: OCR后端名称，见 ocr_backends.BACKENDS。
+        :param backend_options: 传给OCR后端构造函数的参数字典。
+        :param min_confidence: 快速识别路径的最低置信度。
+        :param change_sensitivity: 工作进程内画面变化检测的灵敏度，None 表示关闭。
+        :param torch_threads: 每个工作进程使用的 torch 线程数，None 表示使用默认值。
+        :param idle_timeout: 区域超过这么多秒没有被请求过，就暂停截取它。
+        :param source_factory: 在截图线程中创建截图来源的无参数函数，见 screen_sources。
+                               截图来源在截图线程中创建，因为 mss 实例只能在创建它的线程中使用。
+        """
+        self.workers = workers
+        self.capture_interval = capture_interval
+        self.idle_timeout = idle_timeout
+        self.source_factory = source_factory
+        self.ring = FrameRing(slots, max_frame_bytes)
+        self._worker_args = (get_backend_class(backend), backend_options, min_confidence, change_sensitivity,
+                             torch_threads)
+        # 区域 -> 区域编号；区域编号 -> 区域；区域编号 -> 最近一次被请求的时间
+        self._region_ids = {}
+        self._regions = {}
+        self._last_requested = {}
+        # 区域编号 -> (序号, 截图时间, 识别结果)
+        self._latest = {}
+        self._lock = threading.Lock()
+        # 使用 spawn 方式创建进程，保证在 Windows 和 Linux 上行为一致
+        self._ctx = mp.get_context("spawn")
+        self._task_queue = self._ctx.Queue(maxsize=slots // 2)
+        self._result_queue = self._ctx.Queue()
+        self._stop_event = self._ctx.Event()
+        # 只通知当前这一批工作进程退出的信号，重启工作进程时使用
+        self._worker_stop_event = self._ctx.Event()
+        self._processes = []
+        self._threads = []
+        # 后台重启工作进程的线程，见 restart_workers
+        self._restart_thread = None
+        self._restart_lock = threading.Lock()
+
+    def _start_workers(self):
+        """启动一批工作进程。"""
+        print(f"[OCR进程池] 正在启动 {self.workers} 个OCR工作进程...")
+        for i in range(self.workers):
+            process = self._ctx.Process(
+                target=_worker_main, name=f"ocr-worker-{i}", daemon=True,
+                args=(self.ring.names, self.ring.slots, self.ring.max_frame_bytes, self._task_queue,
+                      self._result_queue, self._worker_stop_event) + self._worker_args)
+            process.start()
+            self._processes.append(process)
+
+    def _stop_workers(self, timeout=5.0, recreate_queues=True):
+        """
+        让当前这一批工作进程退出：设置这一批专用的停止信号，等待它们处理完手中的任务自己结束，
+        超时仍未结束的进程才强制终止。
+        不往共享的任务队列里放退出标记：忙碌的进程看到停止信号就会退出，不会取走自己的标记，
+        留在队列里的标记会让下一批进程一启动就退出。
+        :param timeout: 等待所有进程自己退出的总秒数。
+        :param recreate_queues: 强制终止过进程时是否重新创建任务队列和结果队列。
+                                被终止的进程可能正拿着队列的锁或者只写了一半的数据，旧队列不能再用。
+        """
+        self._worker_stop_event.set()
+        deadline = time.time() + timeout
+        terminated = 0
+        for process in self._processes:
+            process.join(timeout=max(0.0, deadline - time.time()))
+            if process.is_alive():
+                process.terminate()
+                process.join(timeout=1)
+                if process.is_alive():
+                    process.kill()
+                    process.join(timeout=1)
+                terminated += 1
+        self._processes = []
+        if terminated:
+            print(f"[OCR进程池] 警告：{terminated} 个工作进程在 {timeout:.0f}s 内没有退出，已被强制终止。")
+            if recreate_queues:
+                self._recreate_queues()
+
+    def _recreate_queues(self):
+        """丢弃可能已损坏的任务队列和结果队列，换成新的。截图线程和结果收集线程每次循环都会读取新的队列。"""
+        old_queues = (self._task_queue, self._result_queue)
+        self._task_queue = self._ctx.Queue(maxsize=self.ring.slots // 2)
+        self._result_queue = self._ctx.Queue()
+        for old in old_queues:
+            old.cancel_join_thread()
+            old.close()
+
+    @property
+    def pids(self):
+        """当前工作进程的进程号列表。"""
+        return [process.pid for process in self._processes if process.pid is not None]
+
+    def start(self):
+        """启动工作进程、截图线程和结果收集线程。"""
+        self._start_workers()
+        for target, name in ((self._capture_loop, "ocr-capture"), (self._collect_loop, "ocr-collector")):
+            thread = threading.Thread(target=target, name=name, daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def watch(self, region):
+        """
+        请求截取并识别一个区域。区域会在 idle_timeout 秒内持续被截取。
+        :param region: 区域元组 (x, y, width, height)。
+        :return: 区域编号。
+        """
+        if region[2] * region[3] > self.ring.max_frame_bytes:
+            raise ValueError(f"区域 {region} 超出了环形缓冲区槽位的大小 {self.ring.max_frame_bytes} 字节")
+        with self._lock:
+            region_id = self._region_ids.get(region)
+            if region_id is None:
+                region_id = len(self._region_ids) + 1
+                self._region_ids[region] = region_id
+                self._regions[region_id] = region
+            self._last_requested[region_id] = time.time()
+        return region_id
+
+    def latest(self, region, newer_than=0.0):
+        """
+        非阻塞地获取区域最新的识别结果。
+        :param region: 区域元组。
+        :param newer_than: 只接受截图时间晚于此时间戳的结果。
+        :return: (识别结果列表, 截图时间)；还没有符合条件的结果时返回 None。
+        """
+        region_id = self.watch(region)
+        with self._lock:
+            latest = self._latest.get(region_id)
+        if latest is None or latest[1] < newer_than:
+            return None
+        return latest[2], latest[1]
+
+    def _capture_loop(self):
+        """截图线程：按固定频率截取最近被请求过的区域，预处理后写入环形缓冲区。"""
+        source = self.source_factory()
+        # 帧写入环形缓冲区时会被复制，所以预处理缓冲区可以一直复用
+        buffers = FrameBuffers()
+        try:
+            self._capture_frames(source, buffers)
+        finally:
+            source.close()
+
+    def _capture_frames(self, source, buffers):
+        """截图线程的主循环，直到停止信号被设置。"""
+        while not self._stop_event.is_set():
+            tick = time.perf_counter()
+            now = time.time()
+            with self._lock:
+                active = [(region_id, self._regions[region_id]) for region_id, requested in self._last_requested.items()
+                          if now - requested <= self.idle_timeout]
+            for region_id, region in active:
+                frame = buffers.preprocess(region_id, source.grab(region))
+                slot, seq = self.ring.write(region_id, frame)
+                try:
+                    self._task_queue.put_nowait((slot, seq))
+                except queue.Full:
+                    # 工作进程跟不上时丢弃这一帧，下一轮会有更新的帧
+                    pass
+            elapsed = time.perf_counter() - tick
+            time.sleep(max(0.0, self.capture_interval - elapsed))
+
+    def _collect_loop(self):
+        """结果收集线程：只保留每个区域序号最新的结果。"""
+        while not self._stop_event.is_set():
+            try:
+                region_id, seq, timestamp, results = self._result_queue.get(timeout=0.2)
+            except queue.Empty:
+                continue
+            with self._lock:
+                current = self._latest.get(region_id)
+                if current is None or seq > current[0]:
+                    self._latest[region_id] = (seq, timestamp, results)
+
+    def restart_workers(self, background=True):
+        """
+        重启所有工作进程，释放它们的OCR引擎占用的内存。截图线程和结果收集线程继续运行，
+        重启期间的帧会留在任务队列中（队列满时丢弃），新进程加载完成后接着识别。
+        :param background: 是否在后台线程中重启。等待旧进程退出可能需要几秒，不应阻塞调用方（主循环）。
+        :return: 是否开始了重启；上一次重启尚未完成时返回 False。
+        """
+        with self._restart_lock:
+            if self._restart_thread is not None and self._restart_thread.is_alive():
+                return False
+            if not background:
+                self._restart()
+                return True
+            self._restart_thread = threading.Thread(target=self._restart, name="ocr-restart", daemon=True)
+            self._restart_thread.start()
+        return True
+
+    def _restart(self):
+        """停止当前这一批工作进程，再启动新的一批。"""
+        start = time.perf_counter()
+        self._stop_workers()
+        self._worker_stop_event = self._ctx.Event()
+        if self._stop_event.is_set():
+            return
+        self._start_workers()
+        print(f"[OCR进程池] 已重启工作进程，用时 {time.perf_counter() - start:.1f}s。")
+
+    def stop(self):
+        """停止所有线程和工作进程，并释放共享内存。"""
+        self._stop_event.set()
+        if self._restart_thread is not None:
+            self._restart_thread.join()
+        for thread in self._threads:
+            thread.join(timeout=2)
+        self._stop_workers(recreate_queues=False)
+        self.ring.close()
+        print("[OCR进程池] 已停止。")
@@ -0,0 +1,167 @@
+# preprocess.py
+
+import json
+import os
+
+import cv2
+import numpy as np
+
+# ==============================================================================
+# 1.8 可配置的预处理流水线 - 每个区域可以使用不同的预处理步骤
+# ==============================================================================
+# 默认流水线：与原来固定的 cv2.threshold(gray, 150, ...) 完全相同
+DEFAULT_STEPS = [{"op": "threshold", "value": 150}]
+
+
+def _resize(img, step):
+    """按比例缩放。缩小用区域平均插值，放大用三次插值。"""
+    scale = step["scale"]
+    interpolation = cv2.INTER_AREA if scale < 1 else cv2.INTER_CUBIC
+    return cv2.resize(img, None, fx=scale, fy=scale, interpolation=interpolation)
+
+
+def _stretch(img, step):
+    """对比度拉伸：把最暗和最亮的像素分别拉到 0 和 255。"""
+    return cv2.normalize(img, None, 0, 255, cv2.NORM_MINMAX)
+
+
+def _threshold(img, step):
+    """固定阈值二值化。"""
+    return cv2.threshold(img, step.get("value", 150), 255, cv2.THRESH_BINARY)[1]
+
+
+def _otsu(img, step):
+    """Otsu 自动阈值二值化，适合亮度整体变化的画面。"""
+    return cv2.threshold(img, 0, 255, cv2.THRESH_BINARY | cv2.THRESH_OTSU)[1]
+
+
+def _adaptive(img, step):
+    """局部自适应阈值二值化，适合背景明暗不均的画面。"""
+    return cv2.adaptiveThreshold(img, 255, cv2.ADAPTIVE_THRESH_MEAN_C, cv2.THRESH_BINARY,
+                                 step.get("block_size", 15), step.get("c", -5))
+
+
+def _invert(img, step):
+    """黑白反转。"""
+    return cv2.bitwise_not(img)
+
+
+# 形态学操作的名称 -> OpenCV 常量
+_MORPH_KINDS = {
+    "open": cv2.MORPH_OPEN,
+    "close": cv2.MORPH_CLOSE,
+    "dilate": cv2.MORPH_DILATE,
+    "erode": cv2.MORPH_ERODE,
+}
+
+
+def _morph(img, step):
+    """形态学操作：open 去掉小噪点，close 填补笔画断口，dilate/erode 加粗/变细笔画。"""
+    size = step.get("size", 2)
+    kernel = np.ones((size, size), dtype=np.uint8)
+    return cv2.morphologyEx(img, _MORPH_KINDS[step.get("kind", "close")], kernel)
+
+
+# 可在流水线中使用的步骤：名称 -> 处理函数
+OPERATIONS = {
+    "resize": _resize,
+    "stretch": _stretch,
+    "threshold": _threshold,
+    "otsu": _otsu,
+    "adaptive": _adaptive,
+    "invert": _invert,
+    "morph": _morph,
+}
+
+
+class PreprocessPipeline:
+    """
+    由一组步骤组成的预处理流水线，例如
+    [{"op": "resize", "scale": 0.5}, {"op": "otsu"}, {"op": "invert"}, {"op": "morph", "kind": "close"}]。
+    截图总是先转为灰度图，再依次执行各个步骤。所有步骤都是 OpenCV 的整图运算。
+    """
+    def __init__(self, steps=None):
+        """
+        创建流水线。
+        :param steps: 步骤列表，每步是一个带 "op" 键的字典，见 OPERATIONS。为 None 时使用 DEFAULT_STEPS。
+        """
+        self.steps = [dict(step) for step in (steps if steps is not None else DEFAULT_STEPS)]
+        for step in self.steps:
+            if step.get("op") not in OPERATIONS:
+                raise ValueError(f"未知的预处理步骤 '{step.get('op')}'，可选: {', '.join(OPERATIONS)}")
+            if step["op"] == "morph" and step.get("kind", "close") not in _MORPH_KINDS:
+                raise ValueError(f"未知的形态学操作 '{step['kind']}'，可选: {', '.join(_MORPH_KINDS)}")
+        # 所有缩放步骤的总比例。识别结果的坐标需要除以这个比例才能换算回截图坐标
+        self.scale = 1.0
+        for step in self.steps:
+            if step["op"] == "resize":
+                self.scale *= step["scale"]
+        # 默认流水线可以走 FrameBuffers 的复用缓冲区快速路径
+        self.is_default = self.steps == DEFAULT_STEPS
+
+    def apply(self, frame):
+        """
+        对截图执行流水线。
+        :param frame: BGRA、BGR 或灰度格式的截图数组。
+        :return: 处理后的图像。
+        """
+        if frame.ndim == 3:
+            code = cv2.COLOR_BGRA2GRAY if frame.shape[2] == 4 else cv2.COLOR_BGR2GRAY
+            img = cv2.cvtColor(frame, code)
+        else:
+            img = frame
+        for step in self.steps:
+            img = OPERATIONS[step["op"]](img, step)
+        return img
+
+    def describe(self):
+        """
+        :return: 便于打印的一行描述。
+        """
+        parts = []
+        for step in self.steps:
+            options = ",".join(f"{k}={v}" for k, v in step.items() if k != "op")
+            parts.append(f"{step['op']}({options})" if options else step["op"])
+        return " -> ".join(parts)
+
+
+def scale_bbox(bbox, factor):
+    """
+    按比例缩放文字框。
+    :param bbox: 四个角点格式的文字框。
+    :param factor: 缩放比例。
+    :return: 缩放后的文字框。
+    """
+    if factor == 1.0:
+        return bbox
+    return [[point[0] * factor, point[1] * factor] for point in bbox]
+
+
+def region_key(region):
+    """区域元组在配置文件中的键，例如 "895,1003,283,45"。"""
+    return ",".join(str(v) for v in region)
+
+
+def load_pipelines(path):
+    """
+    读取各区域的预处理流水线配置（由 tools/tune_preprocess.py 生成）。
+    :param path: JSON 文件路径，内容为 {"x,y,w,h": [步骤, ...]}。
+    :return: 字典，区域元组 -> 步骤列表；文件不存在时返回空字典。
+    """
+    if not path or not os.path.exists(path):
+        return {}
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    return {tuple(int(v) for v in key.split(",")): steps for key, steps in data.items()}
+
+
+def save_pipelines(path, pipelines):
+    """
+    保存各区域的预处理流水线配置。先写临时文件再替换。
+    :param path: JSON 文件路径。
+    :param pipelines: 字典，区域元组 -> 步骤列表。
+    """
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump({region_key(region): steps for region, steps in pipelines.items()}, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, path)
@@ -0,0 +1,234 @@
+# profiling.py
+
+import gc
+import json
+import os
+import sys
+import threading
+import time
+import tracemalloc
+
+# ==============================================================================
+# 2.15 长时间运行的资源剖析 - 定期记录内存、句柄和线程，发现持续增长
+# ==============================================================================
+def process_rss(pid=None):
+    """
+    :param pid: 进程号，None 表示当前进程。
+    :return: 进程的常驻内存（字节）；无法获取时返回 None。
+    """
+    pid = pid or os.getpid()
+    try:
+        import psutil
+        return psutil.Process(pid).memory_info().rss
+    except ImportError:
+        pass
+    except Exception:
+        return None
+    if sys.platform == "win32":
+        import ctypes
+        from ctypes import wintypes
+
+        class PROCESS_MEMORY_COUNTERS(ctypes.Structure):
+            _fields_ = [("cb", wintypes.DWORD), ("PageFaultCount", wintypes.DWORD),
+                        ("PeakWorkingSetSize", ctypes.c_size_t), ("WorkingSetSize", ctypes.c_size_t),
+                        ("QuotaPeakPagedPoolUsage", ctypes.c_size_t), ("QuotaPagedPoolUsage", ctypes.c_size_t),
+                        ("QuotaPeakNonPagedPoolUsage", ctypes.c_size_t), ("QuotaNonPagedPoolUsage", ctypes.c_size_t),
+                        ("PagefileUsage", ctypes.c_size_t), ("PeakPagefileUsage", ctypes.c_size_t)]
+
+        kernel32 = ctypes.windll.kernel32
+        psapi = ctypes.windll.psapi
+        # 64位系统上句柄是指针宽度，必须声明参数和返回值类型，否则会被截断为 int
+        kernel32.OpenProcess.restype = wintypes.HANDLE
+        kernel32.OpenProcess.argtypes = (wintypes.DWORD, wintypes.BOOL, wintypes.DWORD)
+        kernel32.CloseHandle.argtypes = (wintypes.HANDLE,)
+        psapi.GetProcessMemoryInfo.argtypes = (wintypes.HANDLE, ctypes.POINTER(PROCESS_MEMORY_COUNTERS), wintypes.DWORD)
+        # PROCESS_QUERY_LIMITED_INFORMATION | PROCESS_VM_READ
+        handle = kernel32.OpenProcess(0x1000 | 0x0010, False, pid)
+        if not handle:
+            return None
+        try:
+            counters = PROCESS_MEMORY_COUNTERS()
+            counters.cb = ctypes.sizeof(counters)
+            if not psapi.GetProcessMemoryInfo(handle, ctypes.byref(counters), counters.cb):
+                return None
+            return counters.WorkingSetSize
+        finally:
+            kernel32.CloseHandle(handle)
+    try:
+        with open(f"/proc/{pid}/statm", "r") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        return None
+
+
+def handle_counts():
+    """
+    统计当前进程打开的句柄。截图库每次截图都会用到设备上下文和位图，泄漏时这些数字会持续增长。
+    :return: 字典：Windows 上为 {"handles": 内核句柄数, "gdi": GDI对象数, "user": USER对象数}，
+             其他系统为 {"fds": 打开的文件描述符数}；无法获取的项不包含在内。
+    """
+    if sys.platform == "win32":
+        import ctypes
+        from ctypes import wintypes
+        kernel32 = ctypes.windll.kernel32
+        user32 = ctypes.windll.user32
+        kernel32.GetCurrentProcess.restype = wintypes.HANDLE
+        kernel32.GetProcessHandleCount.argtypes = (wintypes.HANDLE, ctypes.POINTER(wintypes.DWORD))
+        user32.GetGuiResources.argtypes = (wintypes.HANDLE, wintypes.DWORD)
+        user32.GetGuiResources.restype = wintypes.DWORD
+        process = kernel32.GetCurrentProcess()
+        counts = {}
+        handles = wintypes.DWORD()
+        if kernel32.GetProcessHandleCount(process, ctypes.byref(handles)):
+            counts["handles"] = handles.value
+        # GR_GDIOBJECTS = 0, GR_USEROBJECTS = 1
+        counts["gdi"] = user32.GetGuiResources(process, 0)
+        counts["user"] = user32.GetGuiResources(process, 1)
+        return counts
+    try:
+        return {"fds": len(os.listdir("/proc/self/fd"))}
+    except OSError:
+        return {}
+
+
+class ResourceProfiler:
+    """
+    为无限循环的主流程准备的资源剖析，按需开启：
+    - 每隔 every 轮记录一次常驻内存、tracemalloc 追踪到的 Python 内存、句柄数、线程数和指定文件（例如日志）的大小；
+    - 第一次记录作为基准（此时OCR引擎已经加载、各种缓存已经建立），之后每次与基准对比，列出增长最多的分配位置；
+    - 常驻内存比基准增长超过预算时调用 on_budget（例如重启OCR引擎），下一次记录重新作为基准；
+    - 每次运行写入一个新的剖析文件，每次记录一行紧凑的 JSON。
+    tracemalloc 只能看到 Python 自己的分配，torch 等原生库的内存只体现在常驻内存中。
+    """
+    def __init__(self, directory="profiles", every=50, top=10, frames=1, rss_budget_mb=None, on_budget=None,
+                 watch_files=(), child_pids=None):
+        """
+        初始化剖析器。
+        :param directory: 剖析文件所在的目录。
+        :param every: 每隔多少轮记录一次。
+        :param top: 每次记录列出增长最多的多少个分配位置。
+        :param frames: tracemalloc 为每次分配保存的调用栈深度，越深越慢。
+        :param rss_budget_mb: 常驻内存相对基准的增长预算（MB），None 表示只记录。
+        :param on_budget: 超出预算时调用的无参数函数，例如 OCRWatcher.restart_engine。
+        :param watch_files: 需要记录大小的文件路径列表。
+        :param child_pids: 可选的无参数函数，返回需要一并统计常驻内存的子进程号列表（例如OCR工作进程）。
+        """
+        self.directory = directory
+        self.every = every
+        self.top = top
+        self.frames = frames
+        self.rss_budget_mb = rss_budget_mb
+        self.on_budget = on_budget
+        self.watch_files = list(watch_files)
+        self.child_pids = child_pids
+        self.path = None
+        self.restarts = 0
+        self._baseline = None
+        self._baseline_rss = None
+        self._started_tracing = False
+
+    def start(self):
+        """开始追踪内存分配，并创建本次运行的剖析文件。"""
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(self.frames)
+            self._started_tracing = True
+        os.makedirs(self.directory, exist_ok=True)
+        self.path = os.path.join(self.directory, time.strftime("profile-%Y%m%d-%H%M%S.jsonl", time.localtime()))
+        self._write({"event": "start", "time": round(time.time(), 1), "pid": os.getpid(), "every": self.every,
+                     "rss_budget_mb": self.rss_budget_mb})
+        print(f"[剖析] 已开启资源剖析，每 {self.every} 轮记录一次，写入 {self.path}")
+
+    def stop(self):
+        """停止追踪内存分配。"""
+        self._baseline = None
+        if self._started_tracing:
+            tracemalloc.stop()
+            self._started_tracing = False
+
+    def _write(self, record):
+        """向剖析文件追加一行。"""
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(record, ensure_ascii=False, separators=(",", ":")) + "\n")
+
+    def _snapshot(self):
+        """获取一次内存分配快照，排除 tracemalloc 自身和导入机制的分配。"""
+        return tracemalloc.take_snapshot().filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+            tracemalloc.Filter(False, "<unknown>"),
+        ))
+
+    def _total_rss(self):
+        """当前进程与子进程常驻内存之和（字节）；无法获取时返回 None。"""
+        rss = process_rss()
+        if rss is None:
+            return None
+        for pid in (self.child_pids() if self.child_pids is not None else ()):
+            rss += process_rss(pid) or 0
+        return rss
+
+    def sample(self, round_index):
+        """
+        每轮结束时调用，每隔 every 轮记录一次。
+        :param round_index: 已完成的轮数。
+        :return: 这次写入的记录；这一轮不需要记录时返回 None。
+        """
+        if round_index % self.every:
+            return None
+        start = time.perf_counter()
+        gc.collect()
+        snapshot = self._snapshot()
+        traced, _ = tracemalloc.get_traced_memory()
+        rss = self._total_rss()
+        record = {
+            "round": round_index,
+            "time": round(time.time(), 1),
+            "rss_mb": round(rss / 1048576, 1) if rss is not None else None,
+            "traced_mb": round(traced / 1048576, 2),
+            "threads": threading.active_count(),
+            **handle_counts(),
+        }
+        files = {path: os.path.getsize(path) for path in self.watch_files if os.path.exists(path)}
+        if files:
+            record["files"] = files
+
+        if self._baseline is None:
+            # 第一次记录（或重启OCR引擎之后）作为基准
+            self._baseline = snapshot
+            self._baseline_rss = rss
+            record["baseline"] = True
+        else:
+            stats = snapshot.compare_to(self._baseline, "lineno")
+            record["top"] = [[f"{stat.traceback[0].filename}:{stat.traceback[0].lineno}",
+                              round(stat.size_diff / 1024, 1), stat.count_diff] for stat in stats[:self.top]]
+            if rss is not None and self._baseline_rss is not None:
+                growth = (rss - self._baseline_rss) / 1048576
+                record["rss_growth_mb"] = round(growth, 1)
+                if self.rss_budget_mb is not None and growth > self.rss_budget_mb:
+                    record["restart"] = True
+        record["cost_ms"] = round((time.perf_counter() - start) * 1000, 1)
+        self._write(record)
+        self._report(record)
+
+        if record.get("restart"):
+            self.restarts += 1
+            print(f"[剖析] 常驻内存比基准增长 {record['rss_growth_mb']:.1f}MB，超出预算 {self.rss_budget_mb}MB，"
+                  f"第 {self.restarts} 次重启OCR引擎。")
+            if self.on_budget is not None:
+                self.on_budget()
+            # 重启之后的下一次记录重新作为基准
+            self._baseline = None
+            gc.collect()
+        return record
+
+    def _report(self, record):
+        """打印一次记录的摘要。"""
+        handles = "，".join(f"{name} {record[name]}" for name in ("handles", "gdi", "user", "fds") if name in record)
+        summary = (f"[剖析] 第 {record['round']} 轮: 常驻内存 {record['rss_mb']}MB"
+                   + (f" (较基准 {record['rss_growth_mb']:+.1f}MB)" if "rss_growth_mb" in record else "")
+                   + f"，Python 分配 {record['traced_mb']}MB，线程 {record['threads']}"
+                   + (f"，{handles}" if handles else "") + f"，用时 {record['cost_ms']:.0f}ms")
+        print(summary)
+        for site, size_kb, count in record.get("top", [])[:3]:
+            print(f"[剖析]   {site}: {size_kb:+.1f}KB ({count:+d} 个对象)")
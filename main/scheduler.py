@@ -0,0 +1,256 @@
+# scheduler.py
+
+import json
+import os
+import time
+
+from logs import write_text_atomic
+
+# ==============================================================================
+# 2.9 自适应轮询调度器 - 根据历史阶段耗时决定多久轮询一次
+# ==============================================================================
+class AdaptivePollScheduler:
+    """
+    记录每个阶段（例如 点击开始 -> 出现“精通科目开启”）实际花费的时间，并据此安排轮询：
+    在历史上目标几乎不可能出现的早期稀疏轮询，在目标通常出现的时间段内密集轮询。
+    历史数据保存在 JSON 文件中，跨运行累积。
+    每个阶段排好序的样本和轮询窗口会被缓存，只在该阶段记录新的耗时后重新计算，每次轮询只是查表。
+    """
+    def __init__(self, stats_path="phase_stats.json", min_interval=0.2, max_interval=2.0,
+                 default_interval=0.75, early_quantile=0.05, late_quantile=0.95, min_samples=5, history=200,
+                 save_interval=60.0, writer=None):
+        """
+        初始化调度器。
+        :param stats_path: 保存历史阶段耗时的文件，为 None 时不持久化。
+        :param min_interval: 密集轮询时的间隔（秒）。
+        :param max_interval: 稀疏轮询时的最大间隔（秒）。
+        :param default_interval: 历史数据不足，或者已经超出历史分布时使用的间隔（秒），也是计算节省次数的基准。
+        :param early_quantile: 早于历史耗时的这个分位数时，视为“目标还不可能出现”。
+        :param late_quantile: 密集轮询持续到历史耗时的这个分位数。
+        :param min_samples: 至少积累多少个样本才开始自适应。
+        :param history: 每个阶段最多保留的样本数量。
+        :param save_interval: 两次写入历史文件之间至少间隔的秒数；退出前调用 flush() 写入剩余的样本。
+        :param writer: 可选的 logs.FileWriter，由它在后台线程写文件；为 None 时直接写入。
+        """
+        self.stats_path = stats_path
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.default_interval = default_interval
+        self.early_quantile = early_quantile
+        self.late_quantile = late_quantile
+        self.min_samples = min_samples
+        self.history = history
+        self.save_interval = save_interval
+        self.writer = writer
+        # 阶段 -> 历史耗时列表；阶段 -> (开始时间, 已轮询次数)
+        self.durations = {}
+        self._active = {}
+        # 阶段 -> 排好序的历史耗时；阶段 -> 轮询窗口（样本不足时为 None）。记录新的耗时后失效
+        self._sorted = {}
+        self._windows = {}
+        # 上次写入历史文件的时间，以及之后是否有尚未写入的样本
+        self._saved_at = time.time()
+        self._dirty = False
+        # 所有阶段累计的实际轮询次数，以及按固定间隔估算需要的次数
+        self.total_polls = 0
+        self.total_baseline_polls = 0
+        self._load()
+
+    def _load(self):
+        """读取历史阶段耗时。"""
+        if self.stats_path and os.path.exists(self.stats_path):
+            with open(self.stats_path, "r", encoding="utf-8") as f:
+                self.durations = json.load(f)
+
+    def _save(self):
+        """把历史阶段耗时写入磁盘。先写临时文件再替换，避免中途退出导致文件损坏。"""
+        self._saved_at = time.time()
+        self._dirty = False
+        if not self.stats_path:
+            return
+        text = json.dumps(self.durations, ensure_ascii=False)
+        if self.writer is not None:
+            self.writer.replace(self.stats_path, text)
+        else:
+            write_text_atomic(self.stats_path, text)
+
+    @staticmethod
+    def _quantile(sorted_values, q):
+        """
+        计算已排序列表的分位数（线性插值）。
+        :param sorted_values: 已排序的数值列表。
+        :param q: 分位数 (0~1)。
+        :return: 分位数值。
+        """
+        position = (len(sorted_values) - 1) * q
+        lower = int(position)
+        upper = min(lower + 1, len(sorted_values) - 1)
+        return sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * (position - lower)
+
+    def flush(self):
+        """把尚未写入的样本写入历史文件，程序退出前调用。"""
+        if self._dirty:
+            self._save()
+
+    def _ordered(self, phase):
+        """
+        :param phase: 阶段名称。
+        :return: 排好序的历史耗时（缓存）；样本不足时返回 None。
+        """
+        ordered = self._sorted.get(phase)
+        if ordered is None:
+            samples = self.durations.get(phase, [])
+            if len(samples) < self.min_samples:
+                return None
+            ordered = self._sorted[phase] = sorted(samples)
+        return ordered
+
+    def quantile(self, phase, q):
+        """
+        阶段历史耗时的分位数，例如看门狗用它计算截止时间。
+        :param phase: 阶段名称。
+        :param q: 分位数 (0~1)。
+        :return: 秒数；样本不足时返回 None。
+        """
+        ordered = self._ordered(phase)
+        return self._quantile(ordered, q) if ordered is not None else None
+
+    def window(self, phase):
+        """
+        返回阶段的密集轮询窗口。
+        :param phase: 阶段名称。
+        :return: (窗口开始秒数, 窗口结束秒数)；样本不足时返回 None。
+        """
+        if phase not in self._windows:
+            ordered = self._ordered(phase)
+            self._windows[phase] = None if ordered is None else (
+                self._quantile(ordered, self.early_quantile), self._quantile(ordered, self.late_quantile))
+        return self._windows[phase]
+
+    def interval_at(self, phase, elapsed, default=None):
+        """
+        计算阶段进行到 elapsed 秒时，距离下一次轮询应等待的时间。
+        :param phase: 阶段名称。
+        :param elapsed: 阶段已经进行的秒数。
+        :param default: 没有足够历史数据时使用的间隔，默认使用 default_interval。
+        :return: 等待的秒数。
+        """
+        default = default if default is not None else self.default_interval
+        window = self.window(phase)
+        if window is None:
+            return default
+        early, late = window
+        if elapsed < early:
+            # 目标还不太可能出现：每次等待剩余时间的一半，越接近窗口轮询越密
+            return min(self.max_interval, max(self.min_interval, (early - elapsed) / 2))
+        if elapsed <= late:
+            return self.min_interval
+        # 已经超出历史分布，说明这次比平时慢，恢复到普通间隔
+        return default
+
+    def begin(self, phase, start_time=None):
+        """
+        标记一个阶段开始。
+        :param phase: 阶段名称。
+        :param start_time: 阶段的开始时间，默认是现在。
+        """
+        self._active[phase] = [start_time if start_time is not None else time.time(), 0]
+
+    def is_active(self, phase):
+        """阶段是否已经开始且尚未结束。"""
+        return phase in self._active
+
+    def next_interval(self, phase, default=None):
+        """
+        记录一次轮询，并返回距离下一次轮询应等待的时间。阶段尚未开始时会自动开始。
+        :param phase: 阶段名称。
+        :param default: 没有足够历史数据时使用的间隔。
+        :return: 等待的秒数。
+        """
+        if phase not in self._active:
+            self.begin(phase)
+        active = self._active[phase]
+        active[1] += 1
+        return self.interval_at(phase, time.time() - active[0], default)
+
+    def finish(self, phase):
+        """
+        标记阶段结束（目标已出现），记录耗时；距离上次写入历史文件超过 save_interval 秒时持久化。
+        :param phase: 阶段名称。
+        :return: 本阶段耗时（秒）；阶段未开始时返回 None。
+        """
+        active = self._active.pop(phase, None)
+        if active is None:
+            return None
+        start_time, polls = active
+        # 最后一次成功的识别也算一次轮询
+        polls += 1
+        duration = time.time() - start_time
+        samples = self.durations.setdefault(phase, [])
+        samples.append(round(duration, 3))
+        del samples[:-self.history]
+        self._sorted.pop(phase, None)
+        self._windows.pop(phase, None)
+        self._dirty = True
+        if time.time() - self._saved_at >= self.save_interval:
+            self._save()
+
+        baseline_polls = int(duration / self.default_interval) + 1
+        self.total_polls += polls
+        self.total_baseline_polls += baseline_polls
+        # 模拟整段历史的 report() 开销较大，只在需要时由调用方单独调用
+        print(f"[调度器] 阶段 '{phase}' 用时 {duration:.2f}s，轮询 {polls} 次 (固定间隔约需 {baseline_polls} 次)")
+        return duration
+
+    def cancel(self, phase):
+        """放弃一个阶段（例如超时），不记录耗时。"""
+        self._active.pop(phase, None)
+
+    def _simulate(self, phase, arrival, fixed_interval=None):
+        """
+        模拟在 arrival 秒时目标出现的情况下，按调度（或固定间隔）轮询的结果，忽略OCR本身的耗时。
+        :param phase: 阶段名称。
+        :param arrival: 目标出现的时刻（秒）。
+        :param fixed_interval: 指定时使用固定间隔模拟。
+        :return: (检测延迟秒数, 轮询次数)
+        """
+        elapsed = 0.0
+        polls = 0
+        while True:
+            polls += 1
+            if elapsed >= arrival:
+                return elapsed - arrival, polls
+            if fixed_interval is not None:
+                elapsed += fixed_interval
+            else:
+                elapsed += self.interval_at(phase, elapsed)
+
+    def report(self, phase):
+        """
+        用历史样本评估调度效果。
+        :param phase: 阶段名称。
+        :return: 字典，包含调度与固定间隔下的平均检测延迟和平均轮询次数；样本不足时返回 None。
+        """
+        samples = self.durations.get(phase, [])
+        if self.window(phase) is None:
+            return None
+        scheduled = [self._simulate(phase, arrival) for arrival in samples]
+        baseline = [self._simulate(phase, arrival, self.default_interval) for arrival in samples]
+        count = len(samples)
+        return {
+            "expected_delay": sum(delay for delay, _ in scheduled) / count,
+            "baseline_delay": sum(delay for delay, _ in baseline) / count,
+            "polls": sum(polls for _, polls in scheduled) / count,
+            "baseline_polls": sum(polls for _, polls in baseline) / count,
+        }
+
+    def summary(self):
+        """
+        返回累计节省的轮询次数。
+        :return: 字典，包含实际轮询次数、固定间隔估算次数和节省的次数。
+        """
+        return {
+            "polls": self.total_polls,
+            "baseline_polls": self.total_baseline_polls,
+            "saved": self.total_baseline_polls - self.total_polls,
+        }
@@ -0,0 +1,310 @@
+# screen_sources.py
+
+import hashlib
+import mmap
+import os
+import struct
+import time
+import zlib
+from bisect import bisect_right
+from collections import OrderedDict
+
+import mss
+import numpy as np
+
+# ==============================================================================
+# 2.11 截图来源 - 实时截图、录制会话、回放会话
+# ==============================================================================
+# 录制文件格式：
+#   文件头 MAGIC，之后是若干个数据块。每个块为 [压缩后长度 u32][原始长度 u32][zlib 压缩的数据]。
+#   块内是连续的记录，每条记录为 _RECORD（时间戳, 帧编号, 区域 x, y, w, h, 通道数, 是否带像素数据），
+#   带像素数据的记录后面紧跟 h * w * 通道数 字节的像素。内容相同的帧只保存一次，之后的记录只引用帧编号。
+#   每个块都是独立压缩的，程序中途退出时，已经写完的块仍然可以回放。
+MAGIC = b"OCRREC1\n"
+_CHUNK_HEADER = struct.Struct("<II")
+_RECORD = struct.Struct("<dIiiiiBB")
+
+
+def grab_frame(sct, region):
+    """
+    截取屏幕的指定区域，并直接在 mss 的像素缓冲区上建立 numpy 视图（np.array(sct_img) 会再复制一份）。
+    :param sct: mss 实例。
+    :param region: 区域元组 (x, y, width, height)。
+    :return: BGRA 格式的截图数组（只在下一次截图之前有效，需要保留时请复制）。
+    """
+    # 定义mss需要的监控区域格式
+    monitor = {"top": region[1], "left": region[0], "width": region[2], "height": region[3]}
+    sct_img = sct.grab(monitor)
+    return np.frombuffer(sct_img.raw, dtype=np.uint8).reshape(sct_img.height, sct_img.width, 4)
+
+
+def screen_size(monitor=1):
+    """
+    :param monitor: mss 的显示器编号，1 为主显示器。
+    :return: 显示器尺寸 (宽, 高)。
+    """
+    with mss.mss() as sct:
+        info = sct.monitors[monitor]
+    return info["width"], info["height"]
+
+
+class MSSSource:
+    """实时截图来源，直接使用 mss。"""
+    def __init__(self):
+        self.sct = mss.mss()
+
+    def grab(self, region):
+        """
+        截取屏幕的指定区域。
+        :param region: 区域元组 (x, y, width, height)。
+        :return: BGRA 格式的截图数组（不复制 mss 的缓冲区）。
+        """
+        return grab_frame(self.sct, region)
+
+    def close(self):
+        self.sct.close()
+
+
+class RecordingSource:
+    """
+    包装另一个截图来源，把每次截图连同时间戳和区域写入录制文件。
+    写入只是追加到内存中的当前块，攒够 chunk_frames 条记录才压缩写盘一次。
+    """
+    def __init__(self, inner, path, chunk_frames=256, compression_level=6):
+        """
+        初始化录制。
+        :param inner: 被包装的截图来源，例如 MSSSource。
+        :param path: 录制文件路径（覆盖已有文件）。
+        :param chunk_frames: 每个数据块包含的记录数。
+        :param compression_level: zlib 压缩级别 (1~9)。
+        """
+        self.inner = inner
+        self.path = path
+        self.chunk_frames = chunk_frames
+        self.compression_level = compression_level
+        self._file = open(path, "wb")
+        self._file.write(MAGIC)
+        self._chunk = bytearray()
+        self._chunk_records = 0
+        # 帧内容的哈希 -> 帧编号，用于去重
+        self._frame_ids = {}
+        self.records = 0
+        self.unique_frames = 0
+        self.raw_bytes = 0
+
+    def grab(self, region):
+        frame = self.inner.grab(region)
+        self._append(time.time(), region, frame)
+        return frame
+
+    def _append(self, timestamp, region, frame):
+        """
+        追加一条记录。
+        :param timestamp: 截图时间。
+        :param region: 区域元组。
+        :param frame: 截图数组。
+        """
+        data = np.ascontiguousarray(frame).tobytes()
+        channels = frame.shape[2] if frame.ndim == 3 else 1
+        digest = hashlib.blake2b(data, digest_size=16).digest()
+        frame_id = self._frame_ids.get(digest)
+        has_data = frame_id is None
+        if has_data:
+            frame_id = self._frame_ids[digest] = len(self._frame_ids)
+            self.unique_frames += 1
+        self._chunk += _RECORD.pack(timestamp, frame_id, region[0], region[1], frame.shape[1], frame.shape[0],
+                                    channels, int(has_data))
+        if has_data:
+            self._chunk += data
+        self.records += 1
+        self.raw_bytes += len(data)
+        self._chunk_records += 1
+        if self._chunk_records >= self.chunk_frames:
+            self.flush()
+
+    def flush(self):
+        """把当前块压缩后写入文件。"""
+        if not self._chunk_records:
+            return
+        compressed = zlib.compress(bytes(self._chunk), self.compression_level)
+        self._file.write(_CHUNK_HEADER.pack(len(compressed), len(self._chunk)))
+        self._file.write(compressed)
+        self._file.flush()
+        self._chunk = bytearray()
+        self._chunk_records = 0
+
+    def close(self):
+        """写完剩余的记录并关闭文件。"""
+        self.flush()
+        self._file.close()
+        size = max(1, os.path.getsize(self.path))
+        print(f"[录制] 共 {self.records} 条截图记录，去重后 {self.unique_frames} 帧，"
+              f"原始 {self.raw_bytes / 1048576:.1f} MiB，文件 {size / 1048576:.2f} MiB ({self.raw_bytes / size:.0f}x)")
+        self.inner.close()
+
+
+class ReplaySource:
+    """
+    从录制文件回放截图。文件通过内存映射打开，打开时只扫描一遍块头和记录头建立索引，
+    像素数据按需解压，只缓存最近用到的几个块。
+    - speed 为正数时按录制时的时间轴回放（2.0 表示两倍速）：每次截图返回“当前回放时刻”该区域最新的一帧；
+    - speed 为 None 时逐帧回放：每次截图返回该区域的下一条记录，适合尽可能快地跑基准测试。
+    """
+    def __init__(self, path, speed=1.0, loop=False, cache_chunks=4):
+        """
+        打开录制文件。
+        :param path: 录制文件路径。
+        :param speed: 回放速度倍数；None 表示逐帧回放。
+        :param loop: 回放到结尾后是否从头开始；否则一直返回最后一帧（逐帧模式下抛出 EOFError）。
+        :param cache_chunks: 缓存的已解压块数量。
+        """
+        self.path = path
+        self.speed = speed
+        self.loop = loop
+        self.cache_chunks = cache_chunks
+        self._file = open(path, "rb")
+        self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._mmap[:len(MAGIC)] != MAGIC:
+            raise ValueError(f"{path} 不是录制文件")
+        # 块编号 -> (压缩数据的起始位置, 压缩后长度)
+        self._chunks = []
+        # 帧编号 -> (块编号, 像素在块内的偏移, 形状)
+        self._frames = {}
+        # 区域 -> ([时间戳...], [帧编号...])
+        self.timelines = {}
+        self._decoded = OrderedDict()
+        self._build_index()
+        self.start_time = min((times[0] for times, _ in self.timelines.values()), default=0.0)
+        self.end_time = max((times[-1] for times, _ in self.timelines.values()), default=0.0)
+        self._wall_start = None
+        self._cursors = {}
+
+    def _build_index(self):
+        """扫描整个文件，记录每个块的位置以及每个区域的时间轴。"""
+        offset = len(MAGIC)
+        size = len(self._mmap)
+        while offset + _CHUNK_HEADER.size <= size:
+            compressed_length, _ = _CHUNK_HEADER.unpack_from(self._mmap, offset)
+            data_start = offset + _CHUNK_HEADER.size
+            if data_start + compressed_length > size:
+                # 最后一个块没有写完整（录制中途被打断），忽略它
+                break
+            chunk_index = len(self._chunks)
+            self._chunks.append((data_start, compressed_length))
+            raw = self._chunk_data(chunk_index)
+            position = 0
+            while position < len(raw):
+                timestamp, frame_id, x, y, w, h, channels, has_data = _RECORD.unpack_from(raw, position)
+                position += _RECORD.size
+                if has_data:
+                    shape = (h, w, channels) if channels > 1 else (h, w)
+                    self._frames[frame_id] = (chunk_index, position, shape)
+                    position += h * w * channels
+                times, frame_ids = self.timelines.setdefault((x, y, w, h), ([], []))
+                times.append(timestamp)
+                frame_ids.append(frame_id)
+            offset = data_start + compressed_length
+
+    def _chunk_data(self, chunk_index):
+        """返回解压后的块数据，使用 LRU 缓存。"""
+        raw = self._decoded.get(chunk_index)
+        if raw is not None:
+            self._decoded.move_to_end(chunk_index)
+            return raw
+        start, length = self._chunks[chunk_index]
+        raw = zlib.decompress(self._mmap[start:start + length])
+        self._decoded[chunk_index] = raw
+        if len(self._decoded) > self.cache_chunks:
+            self._decoded.popitem(last=False)
+        return raw
+
+    def frame(self, frame_id):
+        """
+        按帧编号取出一帧。
+        :param frame_id: 帧编号。
+        :return: 只读的截图数组。
+        """
+        chunk_index, position, shape = self._frames[frame_id]
+        raw = self._chunk_data(chunk_index)
+        length = int(np.prod(shape))
+        return np.frombuffer(raw, dtype=np.uint8, count=length, offset=position).reshape(shape)
+
+    def _timeline_for(self, region):
+        """
+        找到能提供该区域画面的时间轴：优先完全相同的区域，其次是包含它的录制区域。
+        :return: (时间轴, 在录制区域中的裁剪偏移 (dx, dy))；找不到时抛出 KeyError。
+        """
+        region = tuple(region)
+        if region in self.timelines:
+            return self.timelines[region], None
+        x, y, w, h = region
+        for (rx, ry, rw, rh), timeline in self.timelines.items():
+            if rx <= x and ry <= y and x + w <= rx + rw and y + h <= ry + rh:
+                return timeline, (x - rx, y - ry)
+        raise KeyError(f"录制文件中没有区域 {region} 的画面")
+
+    def has_region(self, region):
+        """
+        :return: 录制文件能否提供该区域的画面。
+        """
+        try:
+            self._timeline_for(region)
+        except KeyError:
+            return False
+        return True
+
+    def now(self):
+        """
+        :return: 当前的回放时刻（录制时的时间戳）。
+        """
+        if self._wall_start is None:
+            self._wall_start = time.time()
+        elapsed = (time.time() - self._wall_start) * self.speed
+        duration = self.end_time - self.start_time
+        if self.loop and duration > 0:
+            elapsed %= duration
+        return self.start_time + elapsed
+
+    def grab(self, region):
+        (times, frame_ids), offset = self._timeline_for(region)
+        if self.speed is None:
+            cursor = self._cursors.get(tuple(region), 0)
+            if cursor >= len(frame_ids):
+                if not self.loop:
+                    raise EOFError(f"区域 {region} 的录制画面已经回放完毕")
+                cursor = 0
+            self._cursors[tuple(region)] = cursor + 1
+            index = cursor
+        else:
+            index = max(0, bisect_right(times, self.now()) - 1)
+        frame = self.frame(frame_ids[index])
+        if offset is not None:
+            dx, dy = offset
+            frame = frame[dy:dy + region[3], dx:dx + region[2]]
+        return frame
+
+    def finished(self):
+        """
+        :return: 按时间轴回放时，是否已经回放到结尾。
+        """
+        return not self.loop and self.speed is not None and self.now() >= self.end_time
+
+    def close(self):
+        self._decoded.clear()
+        self._mmap.close()
+        self._file.close()
+
+
+def create_source(record_path=None, replay_path=None, replay_speed=1.0):
+    """
+    根据配置创建截图来源。
+    :param record_path: 指定时，实时截图的同时录制到这个文件。
+    :param replay_path: 指定时，从这个录制文件回放，而不是实时截图。
+    :param replay_speed: 回放速度，见 ReplaySource。
+    :return: 截图来源。
+    """
+    if replay_path:
+        return ReplaySource(replay_path, speed=replay_speed)
+    if record_path:
+        return RecordingSource(MSSSource(), record_path)
+    return MSSSource()
@@ -0,0 +1,323 @@
+# simulator.py
+
+import random
+import time as _real_time
+
+import numpy as np
+
+from config import EXIT_SEQUENCE_STEPS, MONITOR_REGION, START_GAME_REGION, TARGET_TEXT
+from ocr_backends import OCRBackend, register_backend
+
+# ==============================================================================
+# 7. 无头模拟器 - 在 Linux 上加速运行整轮流程，用于长时间的压力测试
+# ==============================================================================
+# 模拟器中的游戏界面
+SIM_MAIN_MENU = "main_menu"
+SIM_LOADING = "loading"
+SIM_IN_MATCH = "in_match"
+SIM_ESC_MENU = "esc_menu"
+SIM_CONFIRM = "confirm_dialog"
+SIM_RESULTS = "results"
+
+
+class VirtualClock:
+    """
+    虚拟时钟。替换掉各模块中的 time 模块后，time.sleep 只是把虚拟时间往前拨，不会真的等待，
+    time.time / time.perf_counter 返回虚拟时间。其余函数（strftime 等）仍然使用真实的 time 模块。
+    """
+    def __init__(self, start=None):
+        """
+        :param start: 虚拟时间的起点，默认是当前真实时间。
+        """
+        self.now = start if start is not None else _real_time.time()
+        self._installed = []
+
+    def time(self):
+        return self.now
+
+    def perf_counter(self):
+        return self.now
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += max(0.0, seconds)
+
+    def __getattr__(self, name):
+        return getattr(_real_time, name)
+
+    def install(self, *modules):
+        """
+        让这些模块使用虚拟时钟（替换模块中的 time 名称）。
+        :param modules: 通过 import time 使用时间的模块，例如 vision、workflows。
+        """
+        for module in modules:
+            self._installed.append((module, module.time))
+            module.time = self
+
+    def uninstall(self):
+        """恢复各模块原来的 time 模块。"""
+        for module, original in reversed(self._installed):
+            module.time = original
+        self._installed = []
+
+
+class SimulatedGame:
+    """
+    脚本化的游戏状态机：主菜单 -> 加载 -> 比赛中 -> ESC菜单 -> 确认框 -> 结算 -> 主菜单。
+    根据收到的按键和点击切换界面，界面切换的耗时按正态分布随机，可选地随机丢弃按键来模拟卡顿。
+    """
+    def __init__(self, clock, load_time=(12.0, 1.0), menu_delay=(0.3, 0.05), dialog_delay=(0.25, 0.05),
+                 results_time=(0.8, 0.1), drop_rate=0.0, hang_rate=0.0, hang_time=120.0, rng=None):
+        """
+        初始化模拟游戏。
+        :param clock: 虚拟时钟。
+        :param load_time: 加载时间的 (平均值, 标准差)（秒）。
+        :param menu_delay: 按下ESC到菜单出现的 (平均值, 标准差)。
+        :param dialog_delay: 点击“离开比赛”到确认框出现的 (平均值, 标准差)。
+        :param results_time: 结算动画的 (平均值, 标准差)，动画结束前按空格无效。
+        :param drop_rate: 每次按键或点击被游戏忽略的概率。
+        :param hang_rate: 每次加载卡住的概率。
+        :param hang_time: 卡住时加载所需的时间（秒）。
+        :param rng: random.Random 实例，便于复现。
+        """
+        self.clock = clock
+        self.load_time = load_time
+        self.menu_delay = menu_delay
+        self.dialog_delay = dialog_delay
+        self.results_time = results_time
+        self.drop_rate = drop_rate
+        self.hang_rate = hang_rate
+        self.hang_time = hang_time
+        self.rng = rng or random.Random()
+        self.leave_step, self.confirm_step = EXIT_SEQUENCE_STEPS[0], EXIT_SEQUENCE_STEPS[1]
+        # 文字表，顺序决定了每个文字画成几条竖线
+        self.texts = [TARGET_TEXT, self.leave_step['text'], self.confirm_step['text']]
+        self.state = SIM_MAIN_MENU
+        # 当前界面在这个时刻之后才真正出现（用于加载、菜单弹出等延迟）
+        self.ready_at = clock.time()
+        self.mouse = (0, 0)
+        self.rounds_completed = 0
+        self.events = 0
+
+    def _delay(self, spec):
+        """按 (平均值, 标准差) 取一个非负的随机延迟。"""
+        return max(0.0, self.rng.gauss(*spec))
+
+    def _goto(self, state, delay=0.0):
+        """切换到新界面，delay 秒后界面内容才显示出来。"""
+        self.state = state
+        self.ready_at = self.clock.time() + delay
+
+    def _dropped(self):
+        """这一次输入是否被游戏忽略。"""
+        self.events += 1
+        return self.drop_rate and self.rng.random() < self.drop_rate
+
+    def current_state(self):
+        """
+        :return: 当前界面；加载尚未完成时仍然是加载中。
+        """
+        if self.state == SIM_LOADING and self.clock.time() >= self.ready_at:
+            self.state = SIM_IN_MATCH
+        return self.state
+
+    def visible_texts(self):
+        """
+        :return: 当前屏幕上显示的 (文字, 区域) 列表。
+        """
+        state = self.current_state()
+        if self.clock.time() < self.ready_at:
+            return []
+        if state == SIM_IN_MATCH:
+            return [(TARGET_TEXT, MONITOR_REGION)]
+        if state == SIM_ESC_MENU:
+            return [(self.leave_step['text'], self.leave_step['region'])]
+        if state == SIM_CONFIRM:
+            return [(self.confirm_step['text'], self.confirm_step['region'])]
+        return []
+
+    @staticmethod
+    def _inside(point, region):
+        x, y, w, h = region
+        return x <= point[0] <= x + w and y <= point[1] <= y + h
+
+    def press(self, key):
+        """
+        接收一次按键。
+        :param key: 按键名称。
+        """
+        if self._dropped():
+            return
+        state = self.current_state()
+        ready = self.clock.time() >= self.ready_at
+        if key == 'esc':
+            if state == SIM_IN_MATCH:
+                self._goto(SIM_ESC_MENU, self._delay(self.menu_delay))
+            elif state == SIM_ESC_MENU and ready:
+                # 菜单已经打开时再按ESC会关掉菜单
+                self._goto(SIM_IN_MATCH)
+        elif key == 'space' and state == SIM_RESULTS and ready:
+            self._goto(SIM_MAIN_MENU)
+            self.rounds_completed += 1
+
+    def move(self, x, y):
+        self.mouse = (x, y)
+
+    def click(self):
+        """在当前鼠标位置点击一次。"""
+        if self._dropped():
+            return
+        state = self.current_state()
+        if self.clock.time() < self.ready_at:
+            return
+        if state == SIM_MAIN_MENU and self._inside(self.mouse, START_GAME_REGION):
+            hang = self.hang_rate and self.rng.random() < self.hang_rate
+            self._goto(SIM_LOADING, self.hang_time if hang else self._delay(self.load_time))
+        elif state == SIM_ESC_MENU and self._inside(self.mouse, self.leave_step['region']):
+            self._goto(SIM_CONFIRM, self._delay(self.dialog_delay))
+        elif state == SIM_CONFIRM and self._inside(self.mouse, self.confirm_step['region']):
+            self._goto(SIM_RESULTS, self._delay(self.results_time))
+
+    def render_text(self, text, width, height):
+        """
+        把一个文字画成灰度图案：第 k 个文字画 k+1 条白色竖线，竖线宽度随区域宽度缩放，
+        使画面变化的像素比例与真实文字接近，能触发 FrameChangeGate。
+        :param text: 文字表中的文字。
+        :param width: 图案宽度。
+        :param height: 图案高度。
+        :return: 灰度图案数组。
+        """
+        pattern = np.zeros((height, width), dtype=np.uint8)
+        bars = self.texts.index(text) + 1
+        # 竖线与间隔等宽，左右各留一个间隔
+        bar_width = max(1, width // (2 * len(self.texts) + 1))
+        for i in range(bars):
+            start = bar_width * (2 * i + 1)
+            pattern[height // 4:height - height // 4, start:start + bar_width] = 255
+        return pattern
+
+    def render(self, region):
+        """
+        渲染屏幕上的一个区域，每个可见文字按 render_text 画在它自己的区域里。
+        :param region: 区域元组 (x, y, width, height)。
+        :return: BGRA 格式的图像。
+        """
+        x, y, w, h = region
+        frame = np.zeros((h, w, 4), dtype=np.uint8)
+        for text, (tx, ty, tw, th) in self.visible_texts():
+            # 文字区域与请求区域的交集
+            left, top = max(x, tx), max(y, ty)
+            right, bottom = min(x + w, tx + tw), min(y + h, ty + th)
+            if left >= right or top >= bottom:
+                continue
+            pattern = self.render_text(text, tw, th)
+            frame[top - y:bottom - y, left - x:right - x, :3] = pattern[top - ty:bottom - ty, left - tx:right - tx, None]
+        return frame
+
+
+class SimulatedOCRBackend(OCRBackend):
+    """
+    只用于无头模拟测试的后端，导入本模块时注册为 "sim"。模拟器把第 k 个文字画成 k+1 条白色竖线，
+    这里数出图像中的竖线条数，换算回文字。不依赖任何模型，识别一个区域只需几十微秒。
+    """
+    name = "sim"
+
+    def __init__(self, texts=()):
+        """
+        :param texts: 模拟器使用的文字表，顺序必须与模拟器一致。
+        """
+        self.texts = list(texts)
+
+    def _decode(self, img):
+        """
+        数出竖线条数并换算成文字。
+        :param img: 二值图像。
+        :return: 文字；不是模拟器画出的图案时返回空字符串。
+        """
+        if img.size == 0:
+            return ""
+        # 竖线画在中间一半的行里；按列统计白色像素是否过半，比只看一行更不容易被噪声打断
+        height = img.shape[0]
+        band = img[height // 4:height - height // 4] if height >= 4 else img
+        row = np.count_nonzero(band, axis=0) * 2 > band.shape[0]
+        # 从黑到白的跳变次数即竖线条数
+        bars = int(row[0]) + int(np.count_nonzero(row[1:] & ~row[:-1]))
+        if 0 < bars <= len(self.texts):
+            return self.texts[bars - 1]
+        return ""
+
+    def recognize(self, img, horizontal_list=None, free_list=None, detail=1, batch_size=1):
+        height, width = img.shape[:2]
+        if not horizontal_list:
+            horizontal_list = [[0, width, 0, height]]
+        results = []
+        for x_min, x_max, y_min, y_max in horizontal_list:
+            text = self._decode(img[max(0, y_min):y_max, max(0, x_min):x_max])
+            if text:
+                results.append(([[x_min, y_min], [x_max, y_min], [x_max, y_max], [x_min, y_max]], text, 0.99))
+        return results
+
+    def readtext(self, img):
+        return self.recognize(img)
+
+
+# 只有用到模拟器时才能按名称创建 "sim" 后端，正式运行的后端列表里没有它
+register_backend(SimulatedOCRBackend)
+
+
+class SimulatedScreen:
+    """模拟器的截图来源，接口与 screen_sources.MSSSource 相同。每次截图消耗一点虚拟时间，近似截图和识别的耗时。"""
+    def __init__(self, game, grab_cost=0.03):
+        """
+        :param game: SimulatedGame 实例。
+        :param grab_cost: 每次截图消耗的虚拟时间（秒）。
+        """
+        self.game = game
+        self.grab_cost = grab_cost
+        self.grabs = 0
+
+    def grab(self, region):
+        self.grabs += 1
+        self.game.clock.sleep(self.grab_cost)
+        return self.game.render(region)
+
+    def close(self):
+        pass
+
+
+class SimulatedGuiExecutor:
+    """代替 PyAutoGuiExecutor，把移动、点击和按键发给模拟游戏。"""
+    def __init__(self, game, input_delay=(0.05, 0.12), rng=None):
+        """
+        :param game: SimulatedGame 实例。
+        :param input_delay: 每次输入消耗的虚拟时间范围（秒）。
+        :param rng: random.Random 实例，默认使用游戏的 rng，相同的种子得到相同的输入耗时。
+        """
+        self.game = game
+        self.input_delay = input_delay
+        self.rng = rng if rng is not None else game.rng
+
+    def human_like_move_to(self, target_x, target_y, duration=0.15):
+        self.game.clock.sleep(duration)
+        self.game.move(target_x, target_y)
+
+    def click(self):
+        self.game.clock.sleep(self.rng.uniform(*self.input_delay))
+        self.game.click()
+
+    def human_like_press(self, key):
+        self.game.clock.sleep(self.rng.uniform(*self.input_delay))
+        self.game.press(key)
+
+
+class SimulatedActionExecutor(SimulatedGuiExecutor):
+    """代替 ActionExecutor：游戏内动作序列与真实的 run_action_sequence 消耗相同的（虚拟）时间。"""
+    def __init__(self, game, sensitivity_multiplier=1.0, rng=None):
+        super().__init__(game, input_delay=(0.2, 0.3), rng=rng)
+        self.multiplier = sensitivity_multiplier
+
+    def run_action_sequence(self):
+        self.human_like_press('shift')
+        self.game.clock.sleep(self.rng.uniform(0.4, 0.5))
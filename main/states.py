@@ -0,0 +1,89 @@
+# states.py
+
+# ==============================================================================
+# 2.8 画面状态分类器 - 一次截图判断游戏当前处于哪个界面
+# ==============================================================================
+# 游戏界面状态
+MAIN_MENU = "main_menu"            # 主菜单（可以点击“开始”）
+LOADING = "loading"                # 加载中，或者没有识别出任何已知界面
+IN_MATCH = "in_match"              # 比赛中（出现“精通科目开启”）
+ESC_MENU = "esc_menu"              # 按下ESC后的菜单（出现“离开比赛”）
+CONFIRM_DIALOG = "confirm_dialog"  # 离开比赛的确认框（出现“确认”）
+RESULTS = "results"                # 结算画面
+
+
+class ScreenStateClassifier:
+    """
+    根据一组“探针”判断当前画面所处的界面。每个探针是某个界面上一定会出现的文字及其区域。
+    所有探针的区域在同一次截图中批量识别，然后按配置的优先级依次判断，
+    第一个有探针命中的状态即为当前状态；一个都没命中时视为加载中。
+    """
+    def __init__(self, watcher, probes, similarity_threshold=None):
+        """
+        初始化分类器。
+        :param watcher: OCRWatcher 实例。
+        :param probes: 按优先级排列的列表，每项为 (状态, [{'text': 文字, 'region': 区域}, ...])。
+                       探针列表为空的状态不会被识别（例如尚未校准区域的界面）。
+        :param similarity_threshold: 判定探针命中的相似度阈值，默认使用 watcher 的阈值。
+        """
+        self.watcher = watcher
+        self.probes = [(state, list(state_probes)) for state, state_probes in probes]
+        self.threshold = similarity_threshold if similarity_threshold is not None else watcher.threshold
+        # 按名称索引所有探针，便于批量识别
+        self._named_probes = {}
+        for state, state_probes in self.probes:
+            for i, probe in enumerate(state_probes):
+                self._named_probes[f"{state}:{i}"] = (state, probe)
+
+    def can_detect(self, state):
+        """
+        判断某个状态是否配置了探针。
+        :param state: 状态名称。
+        :return: 是否能被识别。
+        """
+        return any(s == state and state_probes for s, state_probes in self.probes)
+
+    def reset(self):
+        """丢弃所有探针区域在此之前的缓存结果，保证之后的判断都基于新的画面；区域已被定位器重新解析时改用新的区域。"""
+        for _, probe in self._named_probes.values():
+            probe['region'] = self.watcher.current_region(probe['region'])
+            self.watcher.reset_region(probe['region'])
+
+    def report_miss(self, states):
+        """
+        等待这些状态超时后调用，把它们所有探针的区域报告为没有找到，见 OCRWatcher.report_miss。
+        :param states: 状态名称的集合。
+        """
+        for state, probe in self._named_probes.values():
+            if state in states:
+                probe['region'] = self.watcher.report_miss(probe['region'])
+
+    def _probe_hit(self, probe, ocr_results):
+        """
+        判断一个探针是否命中。
+        :param probe: {'text': 文字, 'region': 区域}。
+        :param ocr_results: 该探针区域的识别结果。
+        :return: 命中时返回文字框（相对于区域），否则返回 None。
+        """
+        # 按钮文字通常是识别结果的一部分，包含即视为完全命中，见 FuzzyMatcher
+        found = self.watcher.matcher.match(ocr_results, [probe['text']], self.threshold)
+        return found[2][0] if found is not None else None
+
+    def classify(self):
+        """
+        截一次图并判断当前界面。
+        :return: (状态, 命中信息)。命中信息为 {'text': 文字, 'region': 区域, 'bbox': 文字框}，加载中时为 None。
+        """
+        if not self._named_probes:
+            return LOADING, None
+        regions = {name: probe['region'] for name, (_, probe) in self._named_probes.items()}
+        targets = {name: probe['text'] for name, (_, probe) in self._named_probes.items()}
+        batch_results = self.watcher.read_text_from_regions(regions, target_texts=targets)
+        for state, state_probes in self.probes:
+            for i, probe in enumerate(state_probes):
+                bbox = self._probe_hit(probe, batch_results[f"{state}:{i}"])
+                if bbox is not None:
+                    # 记录这次识别结果，供模板库学习
+                    self.watcher.confirm_text(probe['text'], probe['region'], bbox)
+                    return state, {'text': probe['text'], 'region': probe['region'], 'bbox': bbox}
+        return LOADING, None
@@ -0,0 +1,186 @@
+# templates.py
+
+import hashlib
+import json
+import os
+import time
+
+import cv2
+import numpy as np
+
+# ==============================================================================
+# 2.2 按钮模板库 - 首次OCR成功后记住按钮的样子，之后用模板匹配代替OCR
+# ==============================================================================
+class TemplateStore:
+    """
+    按 (目标文字, 区域) 保存已识别成功的按钮截图，并用归一化相关系数做快速匹配。
+    模板保存在磁盘目录中（index.json + png），程序重启后依然可用。
+    当OCR确认文字存在而模板却没能匹配上的次数累计过多时，模板会被判定为过期并删除。
+    模板判定“不存在”时并不完全可信：每次等待的第一次匹配、以及距离上次OCR复核超过 verify_interval 秒时，都交给OCR复核。
+    """
+    def __init__(self, directory="templates", accept_score=0.85, reject_score=0.5,
+                 verify_interval=2.0, expire_after=3):
+        """
+        初始化模板库。
+        :param directory: 保存模板的目录。
+        :param accept_score: 匹配分数达到此值即视为找到目标，不再调用OCR。
+        :param reject_score: 匹配分数低于此值即视为目标不存在，同样不调用OCR。介于两者之间时交给OCR判断。
+        :param verify_interval: 判定“不存在”时，距离上次OCR复核超过这么多秒就再复核一次，防止模板失效后迟迟等不到目标。
+                                按时间而不是按次数复核，复核的间隔与轮询间隔无关，总是短于调用方的超时时间。
+        :param expire_after: OCR确认目标存在、但模板没有匹配上的次数达到此值时，删除该模板。
+        """
+        self.directory = directory
+        self.accept_score = accept_score
+        self.reject_score = reject_score
+        self.verify_interval = verify_interval
+        self.expire_after = expire_after
+        self.index_path = os.path.join(directory, "index.json")
+        os.makedirs(directory, exist_ok=True)
+        # key -> 模板元数据；key -> 模板图像
+        self.entries = {}
+        self.images = {}
+        self._load()
+
+    @staticmethod
+    def make_key(text, region):
+        """
+        生成模板的键。
+        :param text: 目标文字。
+        :param region: 区域元组 (x, y, width, height)。
+        :return: 字符串键。
+        """
+        return f"{text}|{region[0]},{region[1]},{region[2]},{region[3]}"
+
+    def _load(self):
+        """从磁盘读取模板索引和图像，损坏或缺失的条目会被忽略。"""
+        if not os.path.exists(self.index_path):
+            return
+        with open(self.index_path, "r", encoding="utf-8") as f:
+            entries = json.load(f)
+        for key, entry in entries.items():
+            image = cv2.imread(os.path.join(self.directory, entry["file"]), cv2.IMREAD_GRAYSCALE)
+            if image is None:
+                continue
+            # 运行期计数不需要持久化
+            entry["verified_at"] = 0.0
+            self.entries[key] = entry
+            self.images[key] = image
+        print(f"[模板库] 已从 {self.directory} 载入 {len(self.entries)} 个按钮模板。")
+
+    def _save_index(self):
+        """把索引写入磁盘。先写临时文件再替换，避免中途退出导致索引损坏。"""
+        serializable = {key: {k: v for k, v in entry.items() if k != "verified_at"}
+                        for key, entry in self.entries.items()}
+        tmp_path = self.index_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(serializable, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self.index_path)
+
+    def has(self, text, region):
+        """判断是否已有该目标的模板。"""
+        return self.make_key(text, region) in self.entries
+
+    def match(self, text, region, binary_img, verify=False):
+        """
+        在区域画面中查找模板。
+        :param text: 目标文字。
+        :param region: 区域元组。
+        :param binary_img: 该区域预处理后的二值图像。
+        :param verify: 是否不信任这次“不存在”的判定、交给OCR复核，例如每次等待的第一次匹配。
+        :return: (判定, 分数, bbox)。判定为 "hit"（找到）、"miss"（不存在）或 "ambiguous"（需要OCR），
+                 没有模板时为 None。bbox 为 EasyOCR 格式的四个角点（相对于区域）。
+        """
+        key = self.make_key(text, region)
+        template = self.images.get(key)
+        if template is None:
+            return None, 0.0, None
+        entry = self.entries[key]
+        t_height, t_width = template.shape[:2]
+        if binary_img.shape[0] < t_height or binary_img.shape[1] < t_width:
+            return "ambiguous", 0.0, None
+        scores = cv2.matchTemplate(binary_img, template, cv2.TM_CCOEFF_NORMED)
+        _, score, _, (x, y) = cv2.minMaxLoc(scores)
+        # 画面完全是纯色时相关系数无定义，按不匹配处理
+        if not np.isfinite(score):
+            score = 0.0
+        bbox = [[x, y], [x + t_width, y], [x + t_width, y + t_height], [x, y + t_height]]
+        if score >= self.accept_score:
+            entry["misses"] = 0
+            entry["hits"] += 1
+            return "hit", score, bbox
+        now = time.time()
+        if score < self.reject_score and not verify and now - entry["verified_at"] < self.verify_interval:
+            return "miss", score, bbox
+        # 分数模糊、调用方要求复核，或者距离上次OCR复核已经太久，需要OCR复核
+        entry["verified_at"] = now
+        return "ambiguous", score, bbox
+
+    def observe(self, text, region, binary_img, bbox):
+        """
+        在OCR确认目标文字出现后调用：没有模板时学习一个新模板；已有模板说明它这次没有匹配上，记一次失误。
+        :param text: 目标文字。
+        :param region: 区域元组。
+        :param binary_img: OCR所用的二值图像。
+        :param bbox: OCR给出的文字框（四个角点，相对于区域）。
+        """
+        key = self.make_key(text, region)
+        entry = self.entries.get(key)
+        if entry is not None:
+            entry["misses"] += 1
+            if entry["misses"] >= self.expire_after:
+                print(f"[模板库] 模板 '{text}' 已连续 {entry['misses']} 次未能匹配，判定过期并删除。")
+                self.remove(text, region)
+            return
+        self.learn(text, region, binary_img, bbox)
+
+    def learn(self, text, region, binary_img, bbox):
+        """
+        把OCR确认过的文字框截取下来，保存为模板。
+        :param text: 目标文字。
+        :param region: 区域元组。
+        :param binary_img: OCR所用的二值图像。
+        :param bbox: 文字框（四个角点，相对于区域）。
+        """
+        xs = [int(round(point[0])) for point in bbox]
+        ys = [int(round(point[1])) for point in bbox]
+        height, width = binary_img.shape[:2]
+        x0, x1 = max(0, min(xs)), min(width, max(xs))
+        y0, y1 = max(0, min(ys)), min(height, max(ys))
+        if x1 - x0 < 4 or y1 - y0 < 4:
+            return
+        crop = binary_img[y0:y1, x0:x1].copy()
+        # 纯色的截图无法用相关系数匹配，不保存
+        if crop.min() == crop.max():
+            return
+        key = self.make_key(text, region)
+        filename = hashlib.md5(key.encode("utf-8")).hexdigest() + ".png"
+        cv2.imwrite(os.path.join(self.directory, filename), crop)
+        self.entries[key] = {
+            "text": text,
+            "region": list(region),
+            "bbox": [x0, y0, x1 - x0, y1 - y0],
+            "file": filename,
+            "hits": 0,
+            "misses": 0,
+            "created": time.strftime("%Y-%m-%d %H:%M:%S", time.localtime()),
+            "verified_at": time.time(),
+        }
+        self.images[key] = crop
+        self._save_index()
+        print(f"[模板库] 已为 '{text}' 保存新模板 (文字框 {self.entries[key]['bbox']})。")
+
+    def remove(self, text, region):
+        """
+        删除一个模板及其图像文件。
+        :param text: 目标文字。
+        :param region: 区域元组。
+        """
+        key = self.make_key(text, region)
+        entry = self.entries.pop(key, None)
+        self.images.pop(key, None)
+        if entry is None:
+            return
+        path = os.path.join(self.directory, entry["file"])
+        if os.path.exists(path):
+            os.remove(path)
+        self._save_index()
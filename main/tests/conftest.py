@@ -0,0 +1,5 @@
+import os
+import sys
+
+# 让测试可以像 main 目录下的模块一样直接导入
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
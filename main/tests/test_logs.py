@@ -0,0 +1,34 @@
+from logs import FileWriter
+
+
+def test_unstarted_writer_writes_inline(tmp_path):
+    writer = FileWriter()
+    path = str(tmp_path / "count.txt")
+    writer.replace(path, "1")
+    writer.append(path, "\n2")
+    assert (tmp_path / "count.txt").read_text(encoding="utf-8") == "1\n2"
+
+
+def test_replace_keeps_latest_and_append_keeps_order(tmp_path):
+    writer = FileWriter()
+    writer.start()
+    replaced, appended = str(tmp_path / "count.txt"), str(tmp_path / "log.txt")
+    for i in range(100):
+        writer.replace(replaced, str(i))
+        writer.append(appended, f"{i}\n")
+    writer.stop()
+    assert (tmp_path / "count.txt").read_text(encoding="utf-8") == "99"
+    assert (tmp_path / "log.txt").read_text(encoding="utf-8").split() == [str(i) for i in range(100)]
+
+
+def test_failed_writes_do_not_stop_the_thread(tmp_path, capsys):
+    writer = FileWriter()
+    writer.start()
+    # 编码错误（不是 OSError）、目录不存在、重复的 replace 任务，之后的写入都必须照常完成
+    writer.append(str(tmp_path / "bad.txt"), "\ud800")
+    writer.replace(str(tmp_path / "missing" / "count.txt"), "1")
+    writer.queue.put(("replace", str(tmp_path / "count.txt"), None))
+    writer.append(str(tmp_path / "log.txt"), "ok\n")
+    writer.stop()
+    assert (tmp_path / "log.txt").read_text(encoding="utf-8") == "ok\n"
+    assert capsys.readouterr().out.count("[写入线程] 警告") == 3
@@ -0,0 +1,61 @@
+from matcher import FuzzyMatcher, normalize_text, union_bbox
+
+BOX_A = [[0, 0], [10, 0], [10, 5], [0, 5]]
+BOX_B = [[12, 1], [30, 1], [30, 6], [12, 6]]
+
+
+def test_normalize_text_folds_width_case_and_spaces():
+    assert normalize_text("ＡＢ c\t1") == "abc1"
+
+
+def test_exact_and_contained_text_scores_one():
+    matcher = FuzzyMatcher(["开始游戏"])
+    assert matcher.similarity("开始游戏", "开始游戏") == 1.0
+    assert matcher.similarity("开始游戏", "点击开始游戏吧") == 1.0
+
+
+def test_confusable_substitution_is_cheap():
+    matcher = FuzzyMatcher(confusion_cost=0.2)
+    # "升" 与 "开" 是混淆字符，只计 0.2 次编辑；"天" 不是，计一次完整编辑
+    assert abs(matcher.similarity("开始游戏", "升始游戏") - (1 - 0.2 / 4)) < 1e-9
+    assert abs(matcher.similarity("开始游戏", "天始游戏") - (1 - 1 / 4)) < 1e-9
+
+
+def test_extra_confusions_are_symmetric():
+    matcher = FuzzyMatcher(confusions=[("甲", "乙")])
+    assert matcher.similarity("甲", "乙") == matcher.similarity("乙", "甲") == 0.8
+
+
+def test_floor_returns_bound_below_floor():
+    matcher = FuzzyMatcher()
+    exact = matcher.similarity("精通科目开启", "完全无关")
+    bounded = matcher.similarity("精通科目开启", "完全无关", floor=0.8)
+    assert exact < 0.8
+    assert bounded < 0.8
+    assert bounded >= exact
+
+
+def test_empty_target_never_matches():
+    assert FuzzyMatcher().similarity("", "任何文字") == 0.0
+
+
+def test_best_prefers_highest_target_and_joins_split_boxes():
+    matcher = FuzzyMatcher(["开始游戏", "离开"])
+    results = [(BOX_A, "开始", 0.9), (BOX_B, "游戏", 0.7)]
+    target, score, (bbox, text, prob) = matcher.best(results)
+    assert (target, score, text) == ("开始游戏", 1.0, "开始游戏")
+    assert bbox == union_bbox(results)
+    assert prob == 0.7
+
+
+def test_match_applies_threshold():
+    matcher = FuzzyMatcher(["开始游戏"], threshold=0.8)
+    assert matcher.match([(BOX_A, "开始游", 0.9)]) is None
+    assert matcher.match([(BOX_A, "开始游", 0.9)], threshold=0.7)[0] == "开始游戏"
+    assert matcher.match([]) is None
+
+
+def test_targets_compile_on_demand():
+    matcher = FuzzyMatcher()
+    assert matcher.best([(BOX_A, "确认", 0.9)]) is None
+    assert matcher.match([(BOX_A, "确认", 0.9)], targets=["确认"])[1] == 1.0
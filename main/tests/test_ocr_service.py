@@ -0,0 +1,106 @@
+import os
+import random
+from multiprocessing.connection import Client
+
+import numpy as np
+import pytest
+
+from ocr_backends import RemoteOCRBackend
+from ocr_service import OCRService, _Request
+from simulator import SimulatedGame, SimulatedOCRBackend, VirtualClock
+
+GAME = SimulatedGame(VirtualClock(), rng=random.Random(0))
+AUTHKEY = os.urandom(32)
+
+
+def crop(text, width=120, height=32):
+    return GAME.render_text(text, width, height)
+
+
+def texts_of(results):
+    return [text for _, text, _ in results]
+
+
+@pytest.fixture(scope="module")
+def service():
+    service = OCRService(backend=SimulatedOCRBackend.name, backend_options={"texts": GAME.texts},
+                         address=("127.0.0.1", 0), authkey=AUTHKEY, batch_window=0.05, report_interval=None)
+    service.start()
+    yield service
+    service.stop()
+
+
+def client(service, session):
+    return RemoteOCRBackend(address=service.address, authkey=AUTHKEY, session=session)
+
+
+def test_recognize_and_readtext_round_trip(service):
+    remote = client(service, "a")
+    try:
+        text = GAME.texts[2]
+        assert texts_of(remote.recognize(crop(text))) == [text]
+        assert texts_of(remote.readtext(crop(text))) == [text]
+        assert remote.requests == 2 and remote.last_wait >= 0.0
+    finally:
+        remote.conn.close()
+
+
+@pytest.mark.parametrize("message", [
+    (),
+    ["recognize"],
+    ("recognize", np.zeros((8, 8), dtype=np.uint8)),
+    ("recognize", "不是图像", None),
+    ("recognize", np.zeros((8, 8, 4), dtype=np.uint8), None),
+    ("readtext",),
+    ("hello", 42),
+    (["recognize"], 1),
+    ("shutdown",),
+])
+def test_malformed_messages_get_an_error_and_keep_the_connection(service, message):
+    conn = Client(service.address, authkey=AUTHKEY)
+    try:
+        conn.send(message)
+        assert conn.poll(5.0)
+        status, error, wait = conn.recv()
+        assert status == "error" and error and wait == 0.0
+        conn.send(("stats",))
+        assert conn.poll(5.0) and conn.recv()[0] == "ok"
+    finally:
+        conn.close()
+
+
+def test_waits_are_recorded_per_session(service):
+    first, second = client(service, "first"), client(service, "second")
+    try:
+        for _ in range(3):
+            first.recognize(crop(GAME.texts[0]))
+        second.recognize(crop(GAME.texts[1]))
+        sessions = first.stats()["sessions"]
+        assert sessions["first"]["count"] == 3
+        assert sessions["second"]["count"] == 1
+    finally:
+        first.conn.close()
+        second.conn.close()
+
+
+def test_batch_results_are_split_back_to_each_request():
+    service = OCRService(authkey=AUTHKEY, reader=SimulatedOCRBackend(GAME.texts))
+    texts = [GAME.texts[0], GAME.texts[2], GAME.texts[1]]
+    # 不同大小的图像上下拼在一起，第二个请求只识别右半边
+    requests = [
+        _Request("a", None, "recognize", crop(texts[0], 120, 32), None, 0.0),
+        _Request("b", None, "recognize", np.hstack([crop(texts[2], 60, 40), crop(texts[1], 160, 40)]),
+                 [[60, 220, 0, 40]], 0.0),
+        _Request("c", None, "recognize", crop(texts[2], 80, 24), None, 0.0),
+    ]
+    outputs = service._recognize_batch(requests)
+    assert [texts_of(results) for results in outputs] == [[texts[0]], [texts[1]], [texts[2]]]
+    # 坐标换算回各自的图像
+    assert outputs[1][0][0] == [[60, 0], [220, 0], [220, 40], [60, 40]]
+    assert outputs[2][0][0] == [[0, 0], [80, 0], [80, 24], [0, 24]]
+
+
+def test_refuses_non_loopback_address():
+    service = OCRService(address=("0.0.0.0", 0), authkey=AUTHKEY, reader=SimulatedOCRBackend(GAME.texts))
+    with pytest.raises(ValueError):
+        service.start()
@@ -0,0 +1,47 @@
+import numpy as np
+import pytest
+
+from ocr_worker import FrameRing
+
+
+@pytest.fixture
+def ring():
+    ring = FrameRing(slots=4, max_frame_bytes=64 * 16)
+    yield ring
+    ring.close()
+
+
+def test_write_then_view_round_trips_without_copy(ring):
+    frame = np.arange(16 * 32, dtype=np.uint8).reshape(16, 32)
+    slot, seq = ring.write(3, frame)
+    region_id, timestamp, view = ring.view(slot, seq)
+    assert region_id == 3 and timestamp > 0
+    assert np.array_equal(view, frame)
+    assert np.shares_memory(view, ring.data)
+    assert ring.is_current(slot, seq)
+
+
+def test_overwritten_slot_is_detected(ring):
+    slot, seq = ring.write(0, np.zeros((4, 4), dtype=np.uint8))
+    for _ in range(ring.slots):
+        ring.write(1, np.ones((4, 4), dtype=np.uint8))
+    assert not ring.is_current(slot, seq)
+    assert ring.view(slot, seq) is None
+
+
+def test_second_ring_attaches_by_name(ring):
+    slot, seq = ring.write(2, np.full((8, 8), 7, dtype=np.uint8))
+    reader = FrameRing(slots=ring.slots, max_frame_bytes=ring.max_frame_bytes, names=ring.names)
+    try:
+        region_id, _, view = reader.view(slot, seq)
+        total = int(view.sum())
+        # 关闭共享内存之前必须释放所有视图
+        del view
+    finally:
+        reader.close()
+    assert region_id == 2 and total == 7 * 64
+
+
+def test_oversized_frame_is_rejected(ring):
+    with pytest.raises(ValueError):
+        ring.write(0, np.zeros((32, 64), dtype=np.uint8))
@@ -0,0 +1,143 @@
+import os
+import signal
+import sys
+import time
+
+import numpy as np
+import pytest
+
+from ocr_backends import register_backend
+from ocr_worker import OCRWorkerPool
+from simulator import SimulatedOCRBackend
+
+TEXTS = ["开始游戏", "离开"]
+REGION = (0, 0, 120, 30)
+
+
+@register_backend
+class SlowOCRBackend(SimulatedOCRBackend):
+    """每次识别都要花 delay 秒的模拟后端，用来让工作进程保持忙碌。工作进程按模块路径导入这个类。"""
+    name = "test-slow"
+
+    def __init__(self, texts=(), delay=0.0):
+        super().__init__(texts)
+        self.delay = delay
+
+    def recognize(self, img, horizontal_list=None, free_list=None, detail=1, batch_size=1):
+        time.sleep(self.delay)
+        return super().recognize(img, horizontal_list=horizontal_list, free_list=free_list, detail=detail,
+                                 batch_size=batch_size)
+
+
+class BarSource:
+    """假的截图来源：画出 bars 条白色竖线，模拟后端把它认成 TEXTS[bars - 1]。"""
+    bars = 1
+
+    def grab(self, region):
+        frame = np.zeros((region[3], region[2], 4), dtype=np.uint8)
+        for i in range(self.bars):
+            frame[:, 10 + i * 20:14 + i * 20, :3] = 255
+        return frame
+
+    def close(self):
+        pass
+
+
+def wait_for(predicate, timeout=30.0):
+    """轮询直到 predicate() 返回真值；超时返回 None。"""
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        value = predicate()
+        if value:
+            return value
+        time.sleep(0.05)
+    return None
+
+
+def texts_of(latest):
+    return [text for _, text, _ in latest[0]]
+
+
+@pytest.fixture
+def make_pool():
+    pools = []
+
+    def make(workers=2, delay=0.0, **kwargs):
+        pool = OCRWorkerPool(workers=workers, capture_interval=0.1, backend=SlowOCRBackend.name,
+                             backend_options={"texts": TEXTS, "delay": delay}, change_sensitivity=None,
+                             source_factory=BarSource, **kwargs)
+        pools.append(pool)
+        pool.start()
+        return pool
+
+    yield make
+    for pool in pools:
+        pool.stop()
+
+
+def test_watched_region_gets_recognized(make_pool):
+    pool = make_pool()
+    assert pool.latest(REGION) is None
+    latest = wait_for(lambda: pool.latest(REGION))
+    assert latest is not None and texts_of(latest) == ["开始游戏"]
+    assert pool.latest(REGION, newer_than=time.time() + 60) is None
+
+
+def test_restart_while_workers_are_busy_keeps_pool_working(make_pool):
+    # 识别耗时必须短于环形缓冲区转一圈的时间（16 个槽位 x 0.1s），否则读到的帧总会被覆盖而丢弃
+    pool = make_pool(workers=2, delay=0.5)
+    assert wait_for(lambda: pool.latest(REGION)) is not None
+    # 两个进程此时都在识别，重启后新的一批进程必须继续工作
+    restarted_at = time.time()
+    assert pool.restart_workers(background=False)
+    assert len(pool.pids) == 2
+    latest = wait_for(lambda: pool.latest(REGION, newer_than=restarted_at + 0.5))
+    assert latest is not None
+    assert all(process.is_alive() for process in pool._processes)
+
+
+def test_background_restart_ignores_concurrent_requests(make_pool):
+    pool = make_pool(workers=1, delay=0.2)
+    assert wait_for(lambda: pool.latest(REGION)) is not None
+    assert pool.restart_workers()
+    assert not pool.restart_workers()
+    pool._restart_thread.join()
+    restarted_at = time.time()
+    assert wait_for(lambda: pool.latest(REGION, newer_than=restarted_at)) is not None
+
+
+def test_collector_keeps_only_the_newest_result(make_pool):
+    pool = make_pool(workers=0)
+    region_id = pool.watch(REGION)
+    now = time.time()
+    for seq, text in ((5, "新"), (3, "旧"), (4, "较旧")):
+        pool._result_queue.put((region_id, seq, now + seq, [([[0, 0], [1, 0], [1, 1], [0, 1]], text, 0.9)]))
+    assert wait_for(lambda: pool.latest(REGION, newer_than=now + 5)) is not None
+    time.sleep(0.3)
+    assert texts_of(pool.latest(REGION)) == ["新"]
+
+
+def test_oversized_region_is_rejected(make_pool):
+    pool = make_pool(workers=0, max_frame_bytes=64 * 16)
+    with pytest.raises(ValueError):
+        pool.watch((0, 0, 120, 30))
+
+
+def test_frames_overwritten_during_recognition_are_dropped(make_pool):
+    # 两个槽位 0.2s 就转一圈，0.5s 的识别结束时槽位早已被覆盖，结果必须丢弃
+    pool = make_pool(workers=1, delay=0.5, slots=2)
+    pool.watch(REGION)
+    time.sleep(3.0)
+    assert pool.latest(REGION) is None
+
+
+@pytest.mark.skipif(sys.platform == "win32", reason="需要 SIGSTOP 模拟卡住的进程")
+def test_hung_worker_is_killed_and_queues_replaced(make_pool):
+    pool = make_pool(workers=1, delay=0.1)
+    assert wait_for(lambda: pool.latest(REGION)) is not None
+    old_queue = pool._task_queue
+    os.kill(pool.pids[0], signal.SIGSTOP)
+    restarted_at = time.time()
+    pool.restart_workers(background=False)
+    assert pool._task_queue is not old_queue
+    assert wait_for(lambda: pool.latest(REGION, newer_than=restarted_at + 0.5)) is not None
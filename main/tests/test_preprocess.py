@@ -0,0 +1,47 @@
+import numpy as np
+import pytest
+
+from preprocess import PreprocessPipeline, load_pipelines, save_pipelines, scale_bbox
+from vision import preprocess_frame
+
+
+def gradient_frame():
+    """一张从暗到亮的 BGRA 截图。"""
+    frame = np.zeros((20, 64, 4), dtype=np.uint8)
+    frame[..., :3] = np.linspace(0, 255, 64, dtype=np.uint8)[None, :, None]
+    return frame
+
+
+def test_default_pipeline_matches_fixed_threshold():
+    pipeline = PreprocessPipeline()
+    assert pipeline.is_default and pipeline.scale == 1.0
+    assert np.array_equal(pipeline.apply(gradient_frame()), preprocess_frame(gradient_frame()))
+
+
+def test_resize_steps_multiply_scale_and_bbox_maps_back():
+    pipeline = PreprocessPipeline([{"op": "resize", "scale": 2.0}, {"op": "otsu"}, {"op": "resize", "scale": 0.5},
+                                   {"op": "invert"}])
+    assert not pipeline.is_default
+    assert pipeline.scale == 1.0
+    assert pipeline.apply(gradient_frame()).shape == (20, 64)
+    assert PreprocessPipeline([{"op": "resize", "scale": 2.0}]).apply(gradient_frame()).shape == (40, 128)
+    assert scale_bbox([[10, 4], [20, 4], [20, 8], [10, 8]], 0.5) == [[5, 2], [10, 2], [10, 4], [5, 4]]
+
+
+@pytest.mark.parametrize("steps", [[{"op": "sharpen"}], [{"op": "morph", "kind": "blur"}]])
+def test_unknown_steps_are_rejected(steps):
+    with pytest.raises(ValueError):
+        PreprocessPipeline(steps)
+
+
+def test_describe_lists_options():
+    pipeline = PreprocessPipeline([{"op": "adaptive", "block_size": 21}, {"op": "morph", "kind": "open"}])
+    assert pipeline.describe() == "adaptive(block_size=21) -> morph(kind=open)"
+
+
+def test_pipelines_file_round_trip(tmp_path):
+    path = str(tmp_path / "preprocess.json")
+    pipelines = {(895, 1003, 283, 45): [{"op": "otsu"}], (10, 20, 30, 40): [{"op": "threshold", "value": 120}]}
+    save_pipelines(path, pipelines)
+    assert load_pipelines(path) == pipelines
+    assert load_pipelines(str(tmp_path / "missing.json")) == {}
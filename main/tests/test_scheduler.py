@@ -0,0 +1,99 @@
+import json
+
+import pytest
+
+from scheduler import AdaptivePollScheduler
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr("scheduler.time.time", lambda: now[0])
+    return now
+
+
+def run_phase(scheduler, clock, phase, duration):
+    """让一个阶段持续 duration 秒后结束。"""
+    scheduler.begin(phase)
+    clock[0] += duration
+    return scheduler.finish(phase)
+
+
+def make_scheduler(**kwargs):
+    options = dict(stats_path=None, min_interval=0.2, max_interval=2.0, default_interval=0.75,
+                   early_quantile=0.0, late_quantile=1.0, min_samples=5)
+    options.update(kwargs)
+    return AdaptivePollScheduler(**options)
+
+
+def test_default_interval_until_enough_samples(clock):
+    scheduler = make_scheduler()
+    for _ in range(4):
+        run_phase(scheduler, clock, "loading", 10.0)
+    assert scheduler.window("loading") is None
+    assert scheduler.quantile("loading", 0.5) is None
+    assert scheduler.interval_at("loading", 0.0) == 0.75
+    assert scheduler.interval_at("loading", 0.0, default=1.0) == 1.0
+
+
+def test_window_follows_quantiles(clock):
+    scheduler = make_scheduler(early_quantile=0.25, late_quantile=0.75)
+    for duration in (10.0, 12.0, 14.0, 16.0, 18.0):
+        run_phase(scheduler, clock, "loading", duration)
+    assert scheduler.window("loading") == (12.0, 16.0)
+    assert scheduler.quantile("loading", 0.5) == 14.0
+
+
+def test_interval_is_sparse_before_dense_inside_and_default_after_window(clock):
+    scheduler = make_scheduler()
+    for duration in (10.0, 11.0, 12.0, 13.0, 14.0):
+        run_phase(scheduler, clock, "loading", duration)
+    # 窗口之前等待剩余时间的一半，受 max_interval 限制
+    assert scheduler.interval_at("loading", 0.0) == 2.0
+    assert scheduler.interval_at("loading", 9.0) == 0.5
+    assert scheduler.interval_at("loading", 9.8) == 0.2
+    assert scheduler.interval_at("loading", 12.0) == 0.2
+    assert scheduler.interval_at("loading", 20.0) == 0.75
+
+
+def test_finish_invalidates_cached_window(clock):
+    scheduler = make_scheduler(history=5)
+    for _ in range(5):
+        run_phase(scheduler, clock, "loading", 10.0)
+    assert scheduler.window("loading") == (10.0, 10.0)
+    run_phase(scheduler, clock, "loading", 20.0)
+    assert scheduler.window("loading") == (10.0, 20.0)
+    assert len(scheduler.durations["loading"]) == 5
+
+
+def test_cancel_and_unknown_phase_record_nothing(clock):
+    scheduler = make_scheduler()
+    scheduler.begin("loading")
+    scheduler.cancel("loading")
+    assert not scheduler.is_active("loading")
+    assert scheduler.finish("loading") is None
+    assert "loading" not in scheduler.durations
+
+
+def test_next_interval_starts_phase_and_counts_polls(clock):
+    scheduler = make_scheduler()
+    assert scheduler.next_interval("loading") == 0.75
+    assert scheduler.is_active("loading")
+    clock[0] += 1.0
+    scheduler.next_interval("loading")
+    assert scheduler.finish("loading") == 1.0
+    assert scheduler.total_polls == 3
+
+
+def test_saves_are_throttled_until_flush(tmp_path, clock):
+    path = tmp_path / "phase_stats.json"
+    scheduler = make_scheduler(stats_path=str(path), save_interval=60.0)
+    run_phase(scheduler, clock, "loading", 10.0)
+    assert not path.exists()
+    clock[0] += 60.0
+    run_phase(scheduler, clock, "loading", 11.0)
+    assert json.loads(path.read_text(encoding="utf-8")) == {"loading": [10.0, 11.0]}
+    run_phase(scheduler, clock, "loading", 12.0)
+    scheduler.flush()
+    reloaded = make_scheduler(stats_path=str(path))
+    assert reloaded.durations == {"loading": [10.0, 11.0, 12.0]}
@@ -0,0 +1,85 @@
+import numpy as np
+import pytest
+
+from screen_sources import RecordingSource, ReplaySource
+
+REGION = (10, 20, 8, 4)
+
+
+class ListSource:
+    """按顺序返回预先准备好的截图。"""
+    def __init__(self, frames):
+        self.frames = list(frames)
+        self.closed = False
+
+    def grab(self, region):
+        return self.frames.pop(0)
+
+    def close(self):
+        self.closed = True
+
+
+def bgra(value):
+    frame = np.zeros((REGION[3], REGION[2], 4), dtype=np.uint8)
+    frame[..., :3] = value
+    frame[0, 0, 0] = value // 2
+    return frame
+
+
+def record(path, frames, chunk_frames=3):
+    inner = ListSource(frames)
+    recorder = RecordingSource(inner, str(path), chunk_frames=chunk_frames)
+    for _ in range(len(frames)):
+        recorder.grab(REGION)
+    recorder.close()
+    assert inner.closed
+    return recorder
+
+
+def test_round_trip_across_chunks_with_dedup(tmp_path):
+    path = tmp_path / "session.rec"
+    frames = [bgra(v) for v in (10, 10, 20, 10, 30, 30, 20)]
+    recorder = record(path, frames)
+    assert recorder.records == 7 and recorder.unique_frames == 3
+
+    replay = ReplaySource(str(path), speed=None)
+    try:
+        assert len(replay._chunks) == 3
+        for expected in frames:
+            assert np.array_equal(replay.grab(REGION), expected)
+        with pytest.raises(EOFError):
+            replay.grab(REGION)
+    finally:
+        replay.close()
+
+
+def test_gray_frames_and_cropped_regions(tmp_path):
+    path = tmp_path / "gray.rec"
+    gray = np.arange(REGION[2] * REGION[3], dtype=np.uint8).reshape(REGION[3], REGION[2])
+    record(path, [gray])
+    replay = ReplaySource(str(path), speed=None)
+    try:
+        assert replay.has_region((12, 21, 4, 2)) and not replay.has_region((0, 0, 4, 2))
+        assert np.array_equal(replay.grab((12, 21, 4, 2)), gray[1:3, 2:6])
+    finally:
+        replay.close()
+
+
+def test_truncated_last_chunk_is_ignored(tmp_path):
+    path = tmp_path / "cut.rec"
+    record(path, [bgra(v) for v in (10, 20, 30, 40)], chunk_frames=2)
+    data = path.read_bytes()
+    path.write_bytes(data[:-5])
+    replay = ReplaySource(str(path), speed=None)
+    try:
+        assert len(replay._chunks) == 1
+        assert [int(replay.grab(REGION)[1, 1, 0]) for _ in range(2)] == [10, 20]
+    finally:
+        replay.close()
+
+
+def test_rejects_other_files(tmp_path):
+    path = tmp_path / "other.bin"
+    path.write_bytes(b"not a recording file")
+    with pytest.raises(ValueError):
+        ReplaySource(str(path))
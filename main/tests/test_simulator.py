@@ -0,0 +1,28 @@
+import random
+
+from simulator import SimulatedActionExecutor, SimulatedGame, SimulatedGuiExecutor, VirtualClock
+
+
+def play(seed):
+    """用给定的种子执行一组输入，返回每次输入之后的虚拟时间。"""
+    game = SimulatedGame(VirtualClock(start=0.0), rng=random.Random(seed))
+    menu, ingame = SimulatedGuiExecutor(game), SimulatedActionExecutor(game)
+    times = []
+    for _ in range(5):
+        menu.human_like_press('esc')
+        menu.click()
+        ingame.run_action_sequence()
+        times.append(game.clock.time())
+    return times
+
+
+def test_seeded_inputs_are_reproducible():
+    assert play(7) == play(7)
+    assert play(7) != play(8)
+
+
+def test_executor_rng_can_be_overridden():
+    game = SimulatedGame(VirtualClock(start=0.0), rng=random.Random(1))
+    rng = random.Random(2)
+    assert SimulatedGuiExecutor(game).rng is game.rng
+    assert SimulatedActionExecutor(game, rng=rng).rng is rng
@@ -0,0 +1,85 @@
+import numpy as np
+import pytest
+
+from templates import TemplateStore
+
+REGION = (100, 200, 80, 24)
+BBOX = [[10, 4], [50, 4], [50, 20], [10, 20]]
+
+
+def button(offset=0):
+    """一张带有“文字”条纹的二值图，offset 为条纹整体的水平偏移。"""
+    img = np.zeros((24, 80), dtype=np.uint8)
+    for x in range(12, 48, 5):
+        img[6:18, x + offset:x + offset + 2] = 255
+    img[8:10, 14 + offset:46 + offset] = 255
+    return img
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr("templates.time.time", lambda: now[0])
+    return now
+
+
+@pytest.fixture
+def store(tmp_path, clock):
+    store = TemplateStore(directory=str(tmp_path), verify_interval=2.0, expire_after=3)
+    store.observe("开始游戏", REGION, button(), BBOX)
+    return store
+
+
+def test_observe_learns_template_and_persists(store, tmp_path):
+    assert store.has("开始游戏", REGION)
+    reloaded = TemplateStore(directory=str(tmp_path))
+    assert reloaded.has("开始游戏", REGION)
+    assert "verified_at" not in (tmp_path / "index.json").read_text(encoding="utf-8")
+
+
+def test_no_template_returns_none(store):
+    assert store.match("离开", REGION, button()) == (None, 0.0, None)
+
+
+def test_shifted_button_is_a_hit(store):
+    verdict, score, bbox = store.match("开始游戏", REGION, button(offset=3))
+    assert verdict == "hit" and score >= store.accept_score
+    assert bbox[0] == [13, 4]
+
+
+def test_blank_frame_is_a_miss_until_verify_interval(store, clock):
+    blank = np.zeros((24, 80), dtype=np.uint8)
+    assert store.match("开始游戏", REGION, blank)[0] == "miss"
+    clock[0] += 2.5
+    # 距离上次复核已超过 verify_interval，交给OCR复核，之后重新计时
+    assert store.match("开始游戏", REGION, blank)[0] == "ambiguous"
+    assert store.match("开始游戏", REGION, blank)[0] == "miss"
+
+
+def test_verify_forces_ocr_on_a_miss(store):
+    blank = np.zeros((24, 80), dtype=np.uint8)
+    assert store.match("开始游戏", REGION, blank, verify=True)[0] == "ambiguous"
+    assert store.match("开始游戏", REGION, blank)[0] == "miss"
+
+
+def test_template_expires_after_repeated_ocr_confirmed_misses(store, tmp_path):
+    entry = store.entries[store.make_key("开始游戏", REGION)]
+    store.observe("开始游戏", REGION, button(), BBOX)
+    store.observe("开始游戏", REGION, button(), BBOX)
+    assert entry["misses"] == 2 and store.has("开始游戏", REGION)
+    store.observe("开始游戏", REGION, button(), BBOX)
+    assert not store.has("开始游戏", REGION)
+    assert not (tmp_path / entry["file"]).exists()
+
+
+def test_hit_resets_miss_count(store):
+    store.observe("开始游戏", REGION, button(), BBOX)
+    store.match("开始游戏", REGION, button())
+    entry = store.entries[store.make_key("开始游戏", REGION)]
+    assert entry["misses"] == 0 and entry["hits"] == 1
+
+
+def test_flat_crop_is_not_learned(tmp_path):
+    store = TemplateStore(directory=str(tmp_path))
+    store.learn("开始游戏", REGION, np.zeros((24, 80), dtype=np.uint8), BBOX)
+    assert not store.has("开始游戏", REGION)
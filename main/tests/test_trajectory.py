@@ -0,0 +1,76 @@
+import numpy as np
+import pytest
+
+from trajectory import TrajectoryEngine
+
+
+class FakeClock:
+    """只在 sleep 时前进的模拟时钟；cost 为每次发送额外花费的时间。"""
+    def __init__(self, cost=0.0):
+        self.now = 0.0
+        self.cost = cost
+        self.sent = []
+
+    def clock(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+    def send(self, dx, dy):
+        self.sent.append((dx, dy))
+        self.now += self.cost
+
+
+def engine(clock, **kwargs):
+    return TrajectoryEngine(step_interval=0.01, seed=1, clock=clock.clock, sleep=clock.sleep, spin_threshold=0,
+                            **kwargs)
+
+
+@pytest.mark.parametrize("dx, dy", [(300, -120), (-7, 3), (1, 0), (0, 0)])
+def test_plan_lands_exactly_on_target(dx, dy):
+    times, deltas = TrajectoryEngine(seed=3).plan(dx, dy, 0.3)
+    assert deltas.sum(axis=0).tolist() == [dx, dy]
+    assert deltas.dtype == np.int64
+
+
+def test_plan_duration_and_step_count():
+    times, deltas = TrajectoryEngine(step_interval=0.01, seed=3).plan(200, 50, 0.25)
+    assert len(times) == len(deltas) == 25
+    assert times[-1] == pytest.approx(0.25)
+    assert np.all(np.diff(times) > 0)
+
+
+def test_short_duration_still_has_one_step():
+    times, deltas = TrajectoryEngine(step_interval=0.01).plan(40, 10, 0.001)
+    assert len(times) == 1 and deltas.tolist() == [[40, 10]]
+
+
+def test_motion_starts_and_ends_slowly():
+    _, deltas = TrajectoryEngine(noise=0, curvature=0, seed=3).plan(1000, 0, 0.5)
+    speeds = np.abs(deltas[:, 0])
+    assert speeds[0] < speeds[len(speeds) // 2] and speeds[-1] < speeds[len(speeds) // 2]
+
+
+def test_same_seed_gives_same_trajectory():
+    first = TrajectoryEngine(seed=5).plan(300, 80, 0.2)[1]
+    second = TrajectoryEngine(seed=5).plan(300, 80, 0.2)[1]
+    assert np.array_equal(first, second)
+
+
+def test_execute_on_time_takes_planned_duration():
+    fake = FakeClock()
+    elapsed, sent, merged = engine(fake).move(300, -100, 0.2, fake.send)
+    assert elapsed == pytest.approx(0.2)
+    assert merged == 0 and sent == len(fake.sent)
+    assert np.sum(fake.sent, axis=0).tolist() == [300, -100]
+
+
+def test_late_steps_are_merged_without_losing_distance():
+    # 每次发送花费 25ms，远超 10ms 的步长，迟到的步骤会合并发送
+    fake = FakeClock(cost=0.025)
+    elapsed, sent, merged = engine(fake).move(300, -100, 0.2, fake.send)
+    assert merged > 0 and sent < 20
+    assert np.sum(fake.sent, axis=0).tolist() == [300, -100]
+    # 迟到不会累积：总耗时只超出最后一次发送的开销
+    assert elapsed <= 0.2 + 2 * fake.cost
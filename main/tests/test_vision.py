@@ -0,0 +1,84 @@
+import numpy as np
+
+from simulator import SimulatedOCRBackend
+from vision import FrameChangeGate, recognize_boxes
+
+REGION = (0, 0, 64, 16)
+RESULTS = [([[0, 0], [10, 0], [10, 5], [0, 5]], "开始游戏", 0.9)]
+
+
+def frame(columns=()):
+    """一张全黑的二值图，指定的列涂白。"""
+    img = np.zeros((16, 64), dtype=np.uint8)
+    for column in columns:
+        img[:, column] = 255
+    return img
+
+
+def test_first_lookup_misses_then_unchanged_frame_hits():
+    gate = FrameChangeGate(sensitivity=0.02)
+    hit, results, signature = gate.lookup(REGION, frame([10]))
+    assert not hit and results is None
+    gate.store(REGION, signature, RESULTS)
+    hit, results, _ = gate.lookup(REGION, frame([10]))
+    assert hit and results is RESULTS
+    assert gate.stats() == {"ocr_calls": 1, "ocr_skipped": 1, "saved_ratio": 0.5}
+
+
+def test_change_above_sensitivity_misses():
+    gate = FrameChangeGate(sensitivity=0.02)
+    _, _, signature = gate.lookup(REGION, frame([10]))
+    gate.store(REGION, signature, RESULTS)
+    # 一半的列变白，远超 2% 的平均像素差
+    hit, _, _ = gate.lookup(REGION, frame(range(32)))
+    assert not hit
+
+
+def test_small_change_within_sensitivity_hits():
+    gate = FrameChangeGate(sensitivity=0.05)
+    _, _, signature = gate.lookup(REGION, frame([10]))
+    gate.store(REGION, signature, RESULTS)
+    # 多出一列白色，平均像素差约 1/64
+    hit, _, _ = gate.lookup(REGION, frame([10, 40]))
+    assert hit
+
+
+def test_zero_sensitivity_only_reuses_identical_frames():
+    gate = FrameChangeGate(sensitivity=0.0)
+    _, _, signature = gate.lookup(REGION, frame([10]))
+    gate.store(REGION, signature, RESULTS)
+    assert gate.lookup(REGION, frame([10]))[0]
+    assert not gate.lookup(REGION, frame([10, 40]))[0]
+
+
+def test_regions_are_cached_separately_and_reset():
+    gate = FrameChangeGate()
+    other = (0, 20, 64, 16)
+    _, _, signature = gate.lookup(REGION, frame([10]))
+    gate.store(REGION, signature, RESULTS)
+    assert not gate.lookup(other, frame([10]))[0]
+    gate.reset(REGION)
+    assert not gate.lookup(REGION, frame([10]))[0]
+
+
+def test_max_cache_age_expires_results(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr("vision.time.time", lambda: now[0])
+    gate = FrameChangeGate(max_cache_age=1.0)
+    _, _, signature = gate.lookup(REGION, frame([10]))
+    gate.store(REGION, signature, RESULTS)
+    now[0] += 0.5
+    assert gate.lookup(REGION, frame([10]))[0]
+    now[0] += 1.0
+    assert not gate.lookup(REGION, frame([10]))[0]
+
+
+def test_recognize_boxes_gives_each_box_its_own_results():
+    img = np.zeros((16, 128), dtype=np.uint8)
+    img[4:12, 70:72] = 255
+    boxes = [(0, 0, 32, 16), (32, 0, 32, 16), (64, 0, 64, 16)]
+    outputs = recognize_boxes(SimulatedOCRBackend(["开始游戏"]), img, boxes)
+    assert [[text for _, text, _ in results] for results, _ in outputs] == [[], [], ["开始游戏"]]
+    # 空白框的结果列表互相独立
+    outputs[0][0].append("x")
+    assert outputs[1][0] == []
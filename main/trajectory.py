@@ -0,0 +1,109 @@
+# trajectory.py
+
+import time
+
+import numpy as np
+
+# ==============================================================================
+# 3.1 鼠标轨迹引擎 - 预先算好整条轨迹，按截止时间发送
+# ==============================================================================
+# 距离截止时间少于这么多秒时不再 sleep，改为忙等，避免系统 sleep 的粒度（Windows 上可达 15ms）导致迟到
+SPIN_THRESHOLD = 0.002
+
+
+class TrajectoryEngine:
+    """
+    鼠标轨迹引擎。一次性用 NumPy 计算整条轨迹，再按每一步的截止时间发送：
+    - 轨迹是二次贝塞尔曲线（控制点向一侧随机偏移），沿曲线的进度使用最小加加速度 (minimum-jerk) 曲线，
+      起步和停下都是平滑的；叠加有界的随机抖动，抖动在起点和终点处为 0；
+    - 先计算每一步的累计位置再取整，相邻两步取差作为相对位移，取整误差会被带到下一步，终点总是精确落在目标上；
+    - 发送时以开始时刻加上每一步的计划时间作为截止时间，而不是每步之后再 sleep 固定时长，
+      调用开销和 sleep 抖动不会累积；已经错过截止时间的步骤会合并成一次发送。
+    """
+    def __init__(self, step_interval=0.01, noise=1.5, curvature=0.1, seed=None, clock=time.perf_counter,
+                 sleep=time.sleep, spin_threshold=SPIN_THRESHOLD):
+        """
+        初始化轨迹引擎。
+        :param step_interval: 相邻两步之间的计划间隔（秒）。
+        :param noise: 随机抖动的最大幅度（像素，或游戏内的移动单位）。
+        :param curvature: 曲线弯曲程度的上限，控制点偏离直线的距离占总距离的比例。
+        :param seed: 随机种子，便于复现轨迹；None 表示每次都不同。
+        :param clock: 计时函数。
+        :param sleep: 等待函数。
+        :param spin_threshold: 距离截止时间少于这么多秒时改为忙等。使用不会自己前进的模拟时钟时应设为 0。
+        """
+        self.step_interval = step_interval
+        self.noise = noise
+        self.curvature = curvature
+        self.rng = np.random.default_rng(seed)
+        self.clock = clock
+        self.sleep = sleep
+        self.spin_threshold = spin_threshold
+
+    def plan(self, dx, dy, duration):
+        """
+        计算一次移动的完整轨迹。
+        :param dx: X 方向的总位移。
+        :param dy: Y 方向的总位移。
+        :param duration: 移动的总时长（秒）。
+        :return: (每一步的计划时间数组, 每一步的整数相对位移数组，形状为 (步数, 2))。相对位移之和精确等于取整后的总位移。
+        """
+        steps = max(1, int(round(duration / self.step_interval)))
+        tau = np.arange(1, steps + 1) / steps
+        # 最小加加速度曲线：速度从 0 平滑加速再平滑减速到 0
+        progress = tau ** 3 * (10 - 15 * tau + 6 * tau ** 2)
+        end = np.array([dx, dy], dtype=np.float64)
+        distance = float(np.hypot(dx, dy))
+        # 控制点在中点处沿垂直方向偏移，得到一条略微弯曲的曲线
+        normal = np.array([-dy, dx]) / distance if distance > 0 else np.zeros(2)
+        control = end / 2 + normal * self.rng.uniform(-self.curvature, self.curvature) * distance
+        s = progress[:, None]
+        points = 2 * (1 - s) * s * control + s ** 2 * end
+        if self.noise > 0 and steps > 1:
+            # 有界抖动，幅度在起点和终点处衰减为 0
+            envelope = np.sin(np.pi * tau)[:, None]
+            points += self.rng.uniform(-self.noise, self.noise, (steps, 2)) * envelope
+        points[-1] = end
+        # 先对累计位置取整再求差分，每一步的取整误差由下一步带走
+        positions = np.rint(points).astype(np.int64)
+        deltas = np.diff(positions, axis=0, prepend=np.zeros((1, 2), dtype=np.int64))
+        return tau * duration, deltas
+
+    def execute(self, times, deltas, send):
+        """
+        按截止时间发送轨迹。
+        :param times: 每一步相对开始时刻的计划时间。
+        :param deltas: 每一步的整数相对位移。
+        :param send: 发送一次相对位移的函数，以 (dx, dy) 调用。
+        :return: (实际总耗时秒数, 实际发送次数, 因迟到而合并的步数)
+        """
+        start = self.clock()
+        pending_x = pending_y = 0
+        sent = merged = 0
+        last = len(times) - 1
+        for i, (planned, (step_x, step_y)) in enumerate(zip(times, deltas)):
+            pending_x += int(step_x)
+            pending_y += int(step_y)
+            deadline = start + planned
+            remaining = deadline - self.clock()
+            if remaining < 0 and i < last and start + times[i + 1] <= self.clock():
+                # 下一步的截止时间也已经过了，把这一步并入下一步一起发送
+                merged += 1
+                continue
+            if remaining > self.spin_threshold:
+                self.sleep(remaining - self.spin_threshold)
+            while self.clock() < deadline:
+                pass
+            if pending_x or pending_y:
+                send(pending_x, pending_y)
+                sent += 1
+            pending_x = pending_y = 0
+        return self.clock() - start, sent, merged
+
+    def move(self, dx, dy, duration, send):
+        """
+        计算并执行一次移动，见 plan 和 execute。
+        :return: 与 execute 相同。
+        """
+        times, deltas = self.plan(dx, dy, duration)
+        return self.execute(times, deltas, send)
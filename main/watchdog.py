@@ -0,0 +1,222 @@
+# watchdog.py
+
+import faulthandler
+import json
+import os
+import sys
+import threading
+import time
+
+from logs import write_text_atomic
+
+# ==============================================================================
+# 5.2 卡住检测与恢复 - 阶段截止时间、逐级恢复、每天损失的时间
+# ==============================================================================
+class StallWatchdog:
+    """
+    防止一个意外的界面让整个流程卡住几个小时：
+    - 每个阶段的截止时间由调度器记录的历史耗时决定（高分位数乘以系数），历史数据不足时使用默认值；
+    - 一轮失败（某个阶段超过截止时间）时视为卡住，按顺序执行下一级恢复动作（例如重按ESC、重新执行退出流程、重新点击开始），
+      连续卡住时逐级升级，某一轮顺利完成后回到第一级；
+    - 按天统计卡住次数和损失的时间（失败轮次与恢复动作的耗时），保存到文件中，跨运行累积；
+    - 可选的后台线程：一轮运行时间远超所有截止时间（例如某个调用阻塞住了）时打印警告和各线程的调用栈。
+    """
+    def __init__(self, scheduler=None, recoveries=(), stats_path="stall_stats.json", deadline_quantile=0.99,
+                 deadline_factor=1.5, min_deadline=5.0, max_deadline=300.0, default_deadline=60.0,
+                 default_deadlines=None, hang_timeout=600.0, keep_days=30, save_interval=60.0, writer=None):
+        """
+        初始化看门狗。
+        :param scheduler: 可选的 AdaptivePollScheduler，提供各阶段的历史耗时。
+        :param recoveries: 按升级顺序排列的恢复动作列表，每项为 (名称, 无参数的可调用对象)。
+        :param stats_path: 每天卡住统计的保存文件，为 None 时不持久化。
+        :param deadline_quantile: 截止时间使用的历史耗时分位数。
+        :param deadline_factor: 分位数乘以这个系数作为截止时间。
+        :param min_deadline: 截止时间的下限（秒）。
+        :param max_deadline: 截止时间的上限（秒）。
+        :param default_deadline: 历史数据不足时的截止时间（秒）。
+        :param default_deadlines: 可选字典，阶段 -> 历史数据不足时该阶段的截止时间。
+        :param hang_timeout: 后台线程判定“一轮完全没有进展”的秒数。
+        :param keep_days: 统计文件中保留的天数。
+        :param save_interval: 顺利完成的轮次只更新内存中的统计，距离上次写入超过这么多秒才写入文件；
+                              卡住时总是立即写入，stop() 时写入剩余的统计。
+        :param writer: 可选的 logs.FileWriter，由它在后台线程写文件；为 None 时直接写入。
+        """
+        self.scheduler = scheduler
+        self.recoveries = list(recoveries)
+        self.stats_path = stats_path
+        self.deadline_quantile = deadline_quantile
+        self.deadline_factor = deadline_factor
+        self.min_deadline = min_deadline
+        self.max_deadline = max_deadline
+        self.default_deadline = default_deadline
+        self.default_deadlines = dict(default_deadlines or {})
+        self.hang_timeout = hang_timeout
+        self.keep_days = keep_days
+        self.save_interval = save_interval
+        self.writer = writer
+        # 日期 -> {"stalls": 卡住次数, "lost_seconds": 损失秒数, "rounds": 完成轮数, "recoveries": {动作: 次数}}
+        self.days = self._load()
+        # 连续卡住的次数，决定下一次使用哪一级恢复动作
+        self.consecutive_stalls = 0
+        # 上次写入统计文件的时间，以及之后是否有尚未写入的统计
+        self._saved_at = time.time()
+        self._dirty = False
+        self._round_start = None
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    def _load(self):
+        """读取每天的卡住统计。"""
+        if self.stats_path and os.path.exists(self.stats_path):
+            try:
+                with open(self.stats_path, "r", encoding="utf-8") as f:
+                    return json.load(f)
+            except (OSError, ValueError) as e:
+                print(f"[看门狗] 无法读取卡住统计 {self.stats_path}: {e}，从头开始统计。")
+        return {}
+
+    def _save(self):
+        """把每天的卡住统计写入文件，只保留最近 keep_days 天。"""
+        for day in sorted(self.days)[:-self.keep_days]:
+            del self.days[day]
+        self._saved_at = time.time()
+        self._dirty = False
+        if not self.stats_path:
+            return
+        text = json.dumps(self.days, ensure_ascii=False, indent=2)
+        if self.writer is not None:
+            self.writer.replace(self.stats_path, text)
+        else:
+            write_text_atomic(self.stats_path, text)
+
+    def _today(self):
+        """今天的统计项。"""
+        day = time.strftime("%Y-%m-%d", time.localtime(time.time()))
+        return self.days.setdefault(day, {"stalls": 0, "lost_seconds": 0.0, "rounds": 0, "recoveries": {}})
+
+    def deadline(self, phase):
+        """
+        计算一个阶段的截止时间。
+        :param phase: 阶段名称（与调度器使用的名称相同）。
+        :return: 秒数。
+        """
+        observed = self.scheduler.quantile(phase, self.deadline_quantile) if self.scheduler is not None else None
+        if observed is None:
+            return self.default_deadlines.get(phase, self.default_deadline)
+        return min(self.max_deadline, max(self.min_deadline, observed * self.deadline_factor))
+
+    def round_started(self):
+        """每一轮开始时调用。"""
+        with self._lock:
+            self._round_start = time.time()
+
+    def round_completed(self):
+        """一轮顺利完成时调用，恢复等级回到第一级。"""
+        with self._lock:
+            self._round_start = None
+        if self.consecutive_stalls:
+            print(f"[看门狗] 连续卡住 {self.consecutive_stalls} 次后已恢复正常。")
+        self.consecutive_stalls = 0
+        self._today()["rounds"] += 1
+        self._dirty = True
+        if time.time() - self._saved_at >= self.save_interval:
+            self._save()
+
+    def round_failed(self, reason=""):
+        """
+        一轮失败（卡住）时调用：记录损失的时间，并执行下一级恢复动作。
+        :param reason: 失败原因，仅用于打印。
+        :return: 执行的恢复动作名称；没有配置恢复动作时返回 None。
+        """
+        now = time.time()
+        with self._lock:
+            lost = now - self._round_start if self._round_start is not None else 0.0
+            self._round_start = None
+        today = self._today()
+        today["stalls"] += 1
+        self.consecutive_stalls += 1
+        action = None
+        if self.recoveries:
+            # 超过最后一级后从第一级重新开始
+            level = (self.consecutive_stalls - 1) % len(self.recoveries)
+            action, recover = self.recoveries[level]
+            print(f"[看门狗] 检测到卡住{f'（{reason}）' if reason else ''}，连续第 {self.consecutive_stalls} 次，"
+                  f"执行第 {level + 1} 级恢复: {action}")
+            if level == len(self.recoveries) - 1:
+                print("[看门狗] 警告：已经用到最后一级恢复动作，如果仍然卡住，可能需要人工处理。")
+            start = time.time()
+            try:
+                recover()
+            except Exception as e:
+                print(f"[看门狗] 恢复动作 {action} 出错: {e}")
+            lost += time.time() - start
+            today["recoveries"][action] = today["recoveries"].get(action, 0) + 1
+        today["lost_seconds"] += lost
+        self._save()
+        return action
+
+    def report(self):
+        """
+        :return: 今天卡住情况的一行摘要。
+        """
+        today = self._today()
+        summary = f"今天完成 {today['rounds']} 轮，卡住 {today['stalls']} 次，损失 {today['lost_seconds'] / 60:.1f} 分钟"
+        if today["recoveries"]:
+            summary += "，恢复动作 " + "、".join(f"{name} {count} 次" for name, count in today["recoveries"].items())
+        return summary
+
+    def start(self):
+        """启动后台线程，检测完全没有进展的轮次。"""
+        if self._thread is not None:
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._monitor, name="stall-watchdog", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """停止后台线程，并写入尚未保存的统计。"""
+        if self._dirty:
+            self._save()
+        if self._thread is None:
+            return
+        self._stop_event.set()
+        self._thread.join()
+        self._thread = None
+
+    def _monitor(self):
+        """后台线程：一轮运行超过 hang_timeout 时打印警告和所有线程的调用栈（每轮只打印一次）。"""
+        reported = None
+        while not self._stop_event.wait(min(10.0, self.hang_timeout / 4)):
+            with self._lock:
+                round_start = self._round_start
+            if round_start is None or round_start == reported or time.time() - round_start < self.hang_timeout:
+                continue
+            reported = round_start
+            print(f"[看门狗] 警告：本轮已经运行 {time.time() - round_start:.0f}s，超过 {self.hang_timeout:.0f}s 没有完成，"
+                  f"可能有调用被阻塞。各线程的调用栈已写入标准错误输出。")
+            faulthandler.dump_traceback(file=sys.__stderr__, all_threads=True)
+
+
+def default_recoveries(executor, exiter, starter, settle_time=1.0):
+    """
+    默认的逐级恢复动作：重按ESC -> 重新执行退出流程 -> 重新点击开始。
+    :param executor: 菜单/UI执行者。
+    :param exiter: GameExiter 实例。
+    :param starter: GameStarter 实例。
+    :param settle_time: 每个动作之后等待界面稳定的秒数。
+    :return: 恢复动作列表，见 StallWatchdog。
+    """
+    def press_esc():
+        executor.human_like_press('esc')
+        time.sleep(settle_time)
+
+    def rerun_exit():
+        exiter.run_exit_sequence()
+        time.sleep(settle_time)
+
+    def click_start():
+        starter.start_new_game()
+        time.sleep(settle_time)
+
+    return [("重按ESC", press_esc), ("重新执行退出流程", rerun_exit), ("重新点击开始", click_start)]
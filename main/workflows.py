@@ -2,6 +2,7 @@
 
 import time
 import random
+from states import MAIN_MENU, IN_MATCH, ESC_MENU, CONFIRM_DIALOG
 
 # ==============================================================================
 # 4. “退出者”类 - 负责退出比赛流程
@@ -19,62 +20,174 @@ class GameExiter:
         self.executor = executor
         self.steps = steps_config
 
-    def find_and_click_button(self, text_to_find, region, timeout=5):
+    def _find_button(self, text_to_find, ocr_results):
+        """
+        在识别结果中查找包含目标文字的按钮。个别字符识别错误（例如把“确认”认成“确队”）时也能命中，见 FuzzyMatcher。
+        :param text_to_find: 按钮上的目标文字。
+        :param ocr_results: 区域内的识别结果列表。
+        :return: 找到时返回 (bbox, text, prob)，否则返回 None。
+        """
+        found = self.watcher.matcher.match(ocr_results, [text_to_find])
+        return found[2] if found is not None else None
+
+    def click_bbox(self, region, bbox):
+        """
+        点击区域内某个文字框的中心。
+        :param region: 文字框所在的屏幕区域。
+        :param bbox: 文字框，[[左上], [右上], [右下], [左下]]的坐标（相对于区域）。
+        """
+        top_left = bbox[0]
+        bottom_right = bbox[2]
+        # 计算按钮的中心点（相对于截图区域的坐标）
+        center_x_relative = (top_left[0] + bottom_right[0]) / 2
+        center_y_relative = (top_left[1] + bottom_right[1]) / 2
+        # 获取区域本身的左上角绝对坐标
+        region_x, region_y, _, _ = region
+        # 计算出按钮中心的绝对屏幕坐标
+        absolute_center_x = int(region_x + center_x_relative)
+        absolute_center_y = int(region_y + center_y_relative)
+
+        # 移动并点击
+        self.executor.human_like_move_to(absolute_center_x, absolute_center_y, duration=0.3)
+        self.executor.click()
+
+    def find_and_click_button(self, text_to_find, region, timeout=5, phase=None):
         """
         在指定区域内查找包含特定文本的按钮，并点击它。
         :param text_to_find: 按钮上的目标文字。
         :param region: 在哪个屏幕区域内查找。
         :param timeout: 查找的超时时间（秒）。
+        :param phase: 阶段名称，用于自适应轮询，见 OCRWatcher.poll_interval。
         :return: 如果成功找到并点击，返回True，否则返回False。
         """
         print(f"[退出者] 正在寻找按钮 '{text_to_find}'...")
+        region = self.watcher.current_region(region)
+        self.watcher.reset_region(region)
         start_time = time.time()
         # 在超时时间内持续尝试
         while time.time() - start_time < timeout:
             # 调用观察者的通用识别方法获取区域内的所有文字和它们的位置
-            ocr_results = self.watcher.read_text_from_region(region)
-            
-            # 遍历所有识别结果
-            for (bbox, text, prob) in ocr_results:
-                # 如果识别到的文本包含目标文本（移除空格后比较）
-                if text_to_find in text.replace(" ", ""):
-                    print(f"[退出者] 找到按钮 '{text}' (置信度: {prob:.2f})! 准备精确点击。")
-                    # bbox是[[左上], [右上], [右下], [左下]]的坐标
-                    top_left = bbox[0]
-                    bottom_right = bbox[2]
-                    # 计算按钮的中心点（相对于截图区域的坐标）
-                    center_x_relative = (top_left[0] + bottom_right[0]) / 2
-                    center_y_relative = (top_left[1] + bottom_right[1]) / 2
-                    # 获取区域本身的左上角绝对坐标
-                    region_x, region_y, _, _ = region
-                    # 计算出按钮中心的绝对屏幕坐标
-                    absolute_center_x = int(region_x + center_x_relative)
-                    absolute_center_y = int(region_y + center_y_relative)
-                    
-                    # 移动并点击
-                    self.executor.human_like_move_to(absolute_center_x, absolute_center_y, duration=0.3)
-                    self.executor.click()
-                    return True # 成功，返回
-            time.sleep(1) # 暂停1秒后再次尝试
-        
+            ocr_results = self.watcher.read_text_from_region(region, target_text=text_to_find)
+            found = self._find_button(text_to_find, ocr_results)
+            if found:
+                bbox, text, prob = found
+                print(f"[退出者] 找到按钮 '{text}' (置信度: {prob:.2f})! 准备精确点击。")
+                # 记录这次识别结果，供模板库学习按钮外观
+                self.watcher.confirm_text(text_to_find, region, bbox)
+                self.watcher.finish_phase(phase)
+                self.watcher.metrics.observe(f"exit.{text_to_find}", time.time() - start_time)
+                self.click_bbox(region, bbox)
+                return True # 成功，返回
+            time.sleep(self.watcher.poll_interval(phase, 1)) # 暂停一段时间后再次尝试（默认1秒）
+
         print(f"[退出者] 警告：在 {timeout} 秒内未找到按钮 '{text_to_find}'。")
+        self.watcher.report_miss(region)
+        self._cancel_phase(phase)
         return False
 
-    def run_exit_sequence(self):
+    def _begin_phase(self, phase):
+        """从现在开始为一个阶段计时。"""
+        if self.watcher.scheduler is not None and phase is not None:
+            self.watcher.scheduler.begin(phase)
+
+    def _cancel_phase(self, phase):
+        """放弃一个未能完成的阶段，不把超时计入历史耗时。"""
+        if self.watcher.scheduler is not None and phase is not None:
+            self.watcher.scheduler.cancel(phase)
+
+    @staticmethod
+    def step_phase(step):
+        """退出步骤对应的阶段名称（从上一个动作到该按钮出现）。"""
+        return f"exit:{step['text']}"
+
+    def click_steps_batched(self, timeout=8, poll_interval=0.25):
+        """
+        一次截图、一次识别同时检查所有尚未完成的退出步骤，并点击看到的按钮。
+        如果后面步骤的按钮已经出现（例如确认框已弹出），会直接点击它并跳过前面的步骤。
+        :param timeout: 完成所有步骤的总超时时间（秒）。
+        :param poll_interval: 两次检查之间的间隔（秒）。
+        :return: 所有步骤都成功点击时返回True，否则返回False。
+        """
+        pending = list(range(len(self.steps)))
+        names = "、".join(f"'{step['text']}'" for step in self.steps)
+        print(f"[退出者] 正在同时寻找按钮 {names}...")
+        for step in self.steps:
+            step['region'] = self.watcher.current_region(step['region'])
+            self.watcher.reset_region(step['region'])
+        phases = {i: self.step_phase(self.steps[i]) for i in pending}
+        start_time = time.time()
+        # 上一次点击的时间，用于统计每个步骤的耗时
+        step_start = start_time
+        while pending and time.time() - start_time < timeout:
+            regions = {i: self.steps[i]['region'] for i in pending}
+            targets = {i: self.steps[i]['text'] for i in pending}
+            batch_results = self.watcher.read_text_from_regions(regions, target_texts=targets)
+            # 从最后一个步骤往前找，优先点击流程中最靠后的已出现按钮
+            for i in reversed(pending):
+                found = self._find_button(targets[i], batch_results[i])
+                if not found:
+                    continue
+                bbox, text, prob = found
+                print(f"[退出者] 找到按钮 '{text}' (置信度: {prob:.2f})! 准备精确点击。")
+                self.watcher.confirm_text(targets[i], regions[i], bbox)
+                self.watcher.finish_phase(phases[i])
+                self.watcher.metrics.observe(f"exit.{targets[i]}", time.time() - step_start)
+                self.click_bbox(regions[i], bbox)
+                step_start = time.time()
+                # 点击之前的识别结果已经过时，后续步骤只看点击之后的画面，阶段也从点击之后重新计时
+                for j in pending:
+                    self.watcher.reset_region(self.steps[j]['region'])
+                    if j < i:
+                        self._cancel_phase(phases[j])
+                    elif j > i:
+                        self._begin_phase(phases[j])
+                pending = [j for j in pending if j > i]
+                # 等待界面响应点击
+                time.sleep(random.uniform(0.2, 0.3))
+                break
+            else:
+                # 取所有未完成步骤中最短的轮询间隔，保证任何一个按钮出现时都能尽快发现
+                time.sleep(min(self.watcher.poll_interval(phases[i], poll_interval) for i in pending))
+
+        if pending:
+            missing = "、".join(f"'{self.steps[i]['text']}'" for i in pending)
+            print(f"[退出者] 警告：在 {timeout} 秒内未找到按钮 {missing}。")
+            for i in pending:
+                # 定位器可能已经让过时的区域失效，之后改用重新解析出的区域
+                self.steps[i]['region'] = self.watcher.report_miss(self.steps[i]['region'])
+                self._cancel_phase(phases[i])
+            return False
+        return True
+
+    def run_exit_sequence(self, timeout=8):
         """
         执行完整的退出流程。
+        :param timeout: 找到并点击所有退出按钮的总超时时间（秒），见 click_steps_batched。
+        :return: 所有按钮都点击成功时返回True；有按钮没有找到时返回False（不再跳过结算，交给调用方处理）。
         """
         print("\n--- [退出者] 开始执行退出流程 ---")
         # 1. 按下 'esc' 键打开菜单
         self.executor.human_like_press('esc')
+        # 所有按钮的等待阶段都从按下ESC开始计时
+        for step in self.steps:
+            self._begin_phase(self.step_phase(step))
         time.sleep(random.uniform(0.2, 0.3))
         
-        # 2. 循环执行预设的点击步骤（例如：点击“离开比赛”，然后点击“确认”）
-        for step in self.steps:
-            self.find_and_click_button(step['text'], step['region'])
-            time.sleep(random.uniform(0.2, 0.3))
+        # 2. 执行预设的点击步骤（例如：点击“离开比赛”，然后点击“确认”）
+        # 所有步骤的按钮在同一次截图和识别中检查，不再逐个步骤串行轮询
+        if not self.click_steps_batched(timeout=timeout):
+            print("\n--- [退出者] 退出流程未能完成 ---")
+            return False
             
         # 3. 执行一系列按键来跳过结算画面（这些按键是针对特定游戏设计的）
+        self.skip_results()
+        print("\n--- [退出者] 退出流程执行完毕！---")
+        return True
+
+    def skip_results(self):
+        """
+        按固定的节奏按下空格键，跳过结算画面并回到主菜单。
+        """
         print("[退出者] 执行键盘快捷键以跳过结算...")
         time.sleep(random.uniform(0.5, 0.75))
         self.executor.human_like_press('space')
@@ -86,7 +199,6 @@ class GameExiter:
         self.executor.human_like_press('space')
         self.executor.human_like_press('space')
         self.executor.human_like_press('space')
-        print("\n--- [退出者] 退出流程执行完毕！---")
 
 # ==============================================================================
 # 5. “启动者”类 - 负责开始新游戏
@@ -116,4 +228,177 @@ class GameStarter:
         # 移动并点击
         self.executor.human_like_move_to(random_x, random_y, duration=0.5)
         self.executor.click()
-        print("[启动者] 已点击开始，等待游戏加载...")
\ No newline at end of file
+        print("[启动者] 已点击开始，等待游戏加载...")
+
+# ==============================================================================
+# 5.1 “回合状态机” - 看到下一个界面就立刻进入下一步，不再依赖固定等待
+# ==============================================================================
+class RoundStateMachine:
+    """
+    用画面状态分类器驱动一整轮流程：主菜单 -> 加载 -> 比赛中 -> ESC菜单 -> 确认框 -> 结算 -> 主菜单。
+    每一步都在观察到目标界面后立即执行，而不是按最坏情况固定睡眠；
+    同时记录每个阶段和每一轮的耗时，方便对比优化前后的平均每轮秒数。
+    """
+    def __init__(self, classifier, starter, exiter, ingame_executor, poll_interval=0.2,
+                 phase_timeout=60, esc_retry_interval=1.5, space_interval=0.6, watchdog=None):
+        """
+        初始化状态机。
+        :param classifier: ScreenStateClassifier 实例。
+        :param starter: GameStarter 实例。
+        :param exiter: GameExiter 实例，用于按键和点击按钮，也在缺少探针时提供原来的固定流程。
+        :param ingame_executor: ActionExecutor 实例，执行游戏内动作。
+        :param poll_interval: 两次画面判断之间的间隔（秒）。
+        :param phase_timeout: 单个阶段等待目标界面的最长时间（秒）。
+        :param esc_retry_interval: 按下ESC后多久还没看到菜单就再按一次（秒）。
+        :param space_interval: 跳过结算时两次按空格之间的间隔（秒）。
+        :param watchdog: 可选的 StallWatchdog，提供每个阶段根据历史耗时得出的截止时间，代替固定的 phase_timeout。
+        """
+        self.classifier = classifier
+        self.starter = starter
+        self.exiter = exiter
+        self.ingame_executor = ingame_executor
+        self.poll_interval = poll_interval
+        self.phase_timeout = phase_timeout
+        self.esc_retry_interval = esc_retry_interval
+        self.space_interval = space_interval
+        self.watchdog = watchdog
+        # 最近一轮各阶段的耗时，以及完成的轮数和总耗时（只保留累计值，连续运行几天也不会增长）
+        self.phase_durations = {}
+        self.rounds_completed = 0
+        self.total_round_seconds = 0.0
+
+    def wait_for_state(self, targets, timeout=None, on_poll=None, phase=None):
+        """
+        持续判断画面，直到出现目标状态之一。
+        :param targets: 目标状态的集合。
+        :param timeout: 最长等待时间（秒），默认使用看门狗给出的阶段截止时间，没有看门狗时使用 phase_timeout。
+        :param on_poll: 可选的回调，每次判断后以 (状态, 已等待秒数) 调用，可用于按键重试。
+        :param phase: 阶段名称，用于自适应轮询，见 OCRWatcher.poll_interval。
+        :return: (状态, 命中信息)；超时返回 (None, None)。
+        """
+        watcher = self.classifier.watcher
+        if timeout is None:
+            timeout = self.watchdog.deadline(phase) if self.watchdog is not None and phase else self.phase_timeout
+        self.classifier.reset()
+        start_time = time.time()
+        while True:
+            state, match = self.classifier.classify()
+            if state in targets:
+                watcher.finish_phase(phase)
+                return state, match
+            elapsed = time.time() - start_time
+            if elapsed >= timeout:
+                if watcher.scheduler is not None and phase is not None:
+                    watcher.scheduler.cancel(phase)
+                self.classifier.report_miss(targets)
+                return None, None
+            if on_poll is not None:
+                on_poll(state, elapsed)
+            time.sleep(watcher.poll_interval(phase, self.poll_interval))
+
+    def _timed(self, phase, start_time):
+        """记录一个阶段的耗时。"""
+        self.phase_durations[phase] = time.time() - start_time
+        self.classifier.watcher.metrics.observe(f"round.{phase}", self.phase_durations[phase])
+
+    def _begin_phase(self, phase):
+        """通知调度器一个阶段从现在开始。"""
+        scheduler = self.classifier.watcher.scheduler
+        if scheduler is not None:
+            scheduler.begin(phase)
+
+    def run_round(self):
+        """
+        执行一整轮流程。
+        :return: 本轮是否顺利完成。
+        """
+        round_start = time.time()
+        self.phase_durations = {}
+        print("\n--- [状态机] 开始新一轮 ---")
+
+        # 1. 在主菜单点击开始（没有配置主菜单探针时直接点击）
+        phase_start = time.time()
+        if self.classifier.can_detect(MAIN_MENU):
+            # 阶段名称与第6步区分开：这里通常立即命中，第6步要等结算结束，两者的耗时分布完全不同
+            state, _ = self.wait_for_state({MAIN_MENU}, phase="main_menu_check")
+            if state is None:
+                print("[状态机] 警告：没有等到主菜单，仍然尝试点击开始。")
+        self.starter.start_new_game()
+        self._begin_phase("loading")
+        self._timed("start", phase_start)
+
+        # 2. 等待进入比赛
+        phase_start = time.time()
+        state, _ = self.wait_for_state({IN_MATCH}, phase="loading")
+        self._timed("loading", phase_start)
+        if state is None:
+            print("[状态机] 警告：等待进入比赛超时。")
+            return False
+        print("[状态机] 已进入比赛。")
+
+        # 3. 执行游戏内动作
+        phase_start = time.time()
+        self.ingame_executor.run_action_sequence()
+        self._timed("action", phase_start)
+
+        # 4. 打开ESC菜单：按下ESC后一旦看到菜单（或确认框）立即继续，迟迟没有出现才再按一次
+        phase_start = time.time()
+        self.exiter.executor.human_like_press('esc')
+        self._begin_phase("esc_menu")
+        last_press = [time.time()]
+
+        def retry_esc(state, elapsed):
+            if state not in (ESC_MENU, CONFIRM_DIALOG) and time.time() - last_press[0] >= self.esc_retry_interval:
+                print("[状态机] 还没看到ESC菜单，再按一次ESC。")
+                self.exiter.executor.human_like_press('esc')
+                last_press[0] = time.time()
+
+        state, match = self.wait_for_state({ESC_MENU, CONFIRM_DIALOG}, on_poll=retry_esc, phase="esc_menu")
+        self._timed("esc_menu", phase_start)
+        if state is None:
+            print("[状态机] 警告：没有等到ESC菜单。")
+            return False
+
+        # 5. 点击“离开比赛”，然后点击“确认”
+        phase_start = time.time()
+        if state == ESC_MENU:
+            self.exiter.click_bbox(match['region'], match['bbox'])
+            self._begin_phase("confirm")
+            # 确认框通常立即弹出，没有看门狗时只等待较短的时间
+            confirm_timeout = None if self.watchdog is not None else 10
+            state, match = self.wait_for_state({CONFIRM_DIALOG}, timeout=confirm_timeout, phase="confirm")
+            if state is None:
+                print("[状态机] 警告：没有等到确认框。")
+                return False
+        self.exiter.click_bbox(match['region'], match['bbox'])
+        self._begin_phase("results_exit")
+        self._timed("leave", phase_start)
+
+        # 6. 跳过结算，回到主菜单
+        phase_start = time.time()
+        if self.classifier.can_detect(MAIN_MENU):
+            last_press = [0.0]
+
+            def press_space(state, elapsed):
+                if time.time() - last_press[0] >= self.space_interval:
+                    self.exiter.executor.human_like_press('space')
+                    last_press[0] = time.time()
+
+            state, _ = self.wait_for_state({MAIN_MENU}, on_poll=press_space, phase="results_exit")
+            if state is None:
+                # 卡在结算或其他界面：本轮算作失败，让看门狗执行恢复动作，而不是带着未知的界面开始下一轮
+                print("[状态机] 警告：跳过结算后没有回到主菜单。")
+                self._timed("results", phase_start)
+                return False
+        else:
+            # 没有配置主菜单探针，无法判断何时回到主菜单，使用原来的固定按键流程
+            self.exiter.skip_results()
+        self._timed("results", phase_start)
+
+        round_seconds = time.time() - round_start
+        self.rounds_completed += 1
+        self.total_round_seconds += round_seconds
+        mean_seconds = self.total_round_seconds / self.rounds_completed
+        phases = ", ".join(f"{name} {seconds:.1f}s" for name, seconds in self.phase_durations.items())
+        print(f"[状态机] 本轮耗时 {round_seconds:.1f}s ({phases})；平均每轮 {mean_seconds:.1f}s")
+        return True
@@ -0,0 +1,113 @@
+import argparse
+import os
+import statistics
+import sys
+import time
+import tracemalloc
+
+import mss
+import mss.screenshot
+import numpy as np
+
+# 让工具脚本可以直接导入 main 目录下的模块
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'main'))
+from config import MONITOR_REGION
+from screen_sources import grab_frame
+from vision import FrameBuffers, preprocess_frame, text_row_span
+
+
+class SyntheticGrabber:
+    """
+    代替 mss 的假截图源：每次返回一张新分配的 ScreenShot，与真实 mss 的行为一致，但不需要显示器。
+    画面中间有一条“文字”，用于测试按行裁剪。
+    """
+    def __init__(self):
+        self.frame_index = 0
+        self._frames = {}
+
+    def grab(self, monitor):
+        width, height = monitor["width"], monitor["height"]
+        if (width, height) not in self._frames:
+            frames = []
+            # 预先生成几帧，每帧的“文字”移动一点，避免所有帧完全相同
+            for offset in range(8):
+                pixels = np.zeros((height, width, 4), dtype=np.uint8)
+                pixels[height // 3:2 * height // 3, offset:width - 8 + offset:4] = 255
+                frames.append(pixels.tobytes())
+            self._frames[width, height] = frames
+        frames = self._frames[width, height]
+        self.frame_index += 1
+        # mss 每次截图都会分配一块新的像素缓冲区，这里同样复制一份
+        return mss.screenshot.ScreenShot(bytearray(frames[self.frame_index % len(frames)]), monitor)
+
+
+def copy_path(sct, region):
+    """原来的做法：np.array 复制截图，cvtColor 和 threshold 每次分配新数组。"""
+    monitor = {"top": region[1], "left": region[0], "width": region[2], "height": region[3]}
+    return preprocess_frame(np.array(sct.grab(monitor)))
+
+
+def zero_copy_path(sct, region, buffers, crop_rows):
+    """新的做法：直接在 mss 缓冲区上建立视图，预处理写入复用的缓冲区，可选按行裁剪。"""
+    img = buffers.preprocess(region, grab_frame(sct, region))
+    if crop_rows:
+        span = text_row_span(img)
+        if span is not None:
+            img = img[span[0]:span[1]]
+    return img
+
+
+def run(func, iterations):
+    """
+    反复调用一个函数，记录每次耗时和 Python 堆上的内存变化。
+    :param func: 无参数的可调用对象。
+    :param iterations: 调用次数。
+    :return: (每次耗时列表（微秒）, 分配峰值字节数, 结束时仍占用的字节数)
+    """
+    # 预热，排除第一次分配缓冲区的影响
+    for _ in range(10):
+        func()
+    timings = []
+    tracemalloc.start()
+    baseline, _ = tracemalloc.get_traced_memory()
+    tracemalloc.reset_peak()
+    for _ in range(iterations):
+        start = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - start) * 1e6)
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return timings, peak - baseline, current - baseline
+
+
+# --- 主程序入口 ---
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description="对比复制截图+分配新数组的预处理与零拷贝+复用缓冲区的预处理",
+        epilog="加速比随区域大小变化：假截图源上，默认的小区域约 1.05-1.1x，640x160 约 1.2x，1920x1080 约 1.4x；"
+               "无论区域大小，内存峰值都大约减半。--crop-rows 在这里只计入找文字行的开销，小区域上会更慢，"
+               "它的收益在于减少送入识别模型的像素，需要用 tools/benchmark_recognize.py --crop-rows 衡量。")
+    parser.add_argument("--iterations", type=int, default=2000, help="每种方式的轮询次数")
+    parser.add_argument("--region", type=int, nargs=4, default=MONITOR_REGION, metavar=("X", "Y", "W", "H"),
+                        help="截图区域，默认使用 config.MONITOR_REGION")
+    parser.add_argument("--synthetic", action="store_true", help="使用假截图源，不需要显示器")
+    parser.add_argument("--crop-rows", action="store_true", help="零拷贝路径额外按文字行裁剪")
+    args = parser.parse_args()
+
+    region = tuple(args.region)
+    sct = SyntheticGrabber() if args.synthetic else mss.mss()
+    buffers = FrameBuffers()
+    cases = [
+        ("复制+分配", lambda: copy_path(sct, region)),
+        ("零拷贝+复用", lambda: zero_copy_path(sct, region, buffers, args.crop_rows)),
+    ]
+
+    print(f"区域 {region}，每种方式 {args.iterations} 次{'（假截图源）' if args.synthetic else ''}")
+    means = []
+    for name, func in cases:
+        timings, peak, retained = run(func, args.iterations)
+        means.append(statistics.mean(timings))
+        p95 = statistics.quantiles(timings, n=20)[18]
+        print(f"{name:<8} 平均 {means[-1]:.1f} us，中位数 {statistics.median(timings):.1f} us，p95 {p95:.1f} us，"
+              f"内存峰值 +{peak / 1024:.1f} KiB，结束时 +{retained / 1024:.1f} KiB")
+    print(f"加速比: {means[0] / means[1]:.2f}x")
@@ -0,0 +1,361 @@
+import argparse
+import glob
+import json
+import os
+import random
+import sys
+import time
+
+import cv2
+import numpy as np
+
+# 让工具脚本可以直接导入 main 目录下的模块
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'main'))
+from config import (
+    CROP_TEXT_ROWS, EXIT_SEQUENCE_STEPS, MONITOR_REGION, OCR_BACKEND, OCR_BACKEND_OPTIONS, PREPROCESS_PIPELINES_PATH,
+    RECOGNIZE_ONLY, SIMILARITY_THRESHOLD, TARGET_TEXT,
+)
+from logs import write_text_atomic
+from preprocess import load_pipelines
+from ocr_backends import register_backend
+from simulator import SimulatedGame, SimulatedOCRBackend, VirtualClock
+from vision import OCRWatcher, crop_region
+
+
+class CorpusSource:
+    """截图来源：每次截图都返回当前样本的画面，让样本走与实时截图完全相同的识别路径。"""
+    def __init__(self):
+        self.frame = None
+
+    def grab(self, region):
+        return self.frame
+
+    def close(self):
+        pass
+
+
+def target_regions():
+    """
+    :return: 区域 -> 该区域的目标文字（TARGET_TEXT 以及退出流程各步骤的文字）。
+    """
+    targets = {tuple(MONITOR_REGION): TARGET_TEXT}
+    for step in EXIT_SEQUENCE_STEPS:
+        targets[tuple(step['region'])] = step['text']
+    return targets
+
+
+class NoisyTextBackend(SimulatedOCRBackend):
+    """
+    给模拟后端的识别结果加上真实OCR常见的错误：个别字符认错，或者只认出文字的一部分。
+    模拟后端本身要么完全认对、要么什么都认不出，相似度只有 0 和 1 两种，不同阈值下的误报/漏报完全相同；
+    加上这些错误之后，相似度分布在阈值附近，阈值扫描才有意义。
+    """
+    name = "sim-noisy"
+
+    def __init__(self, texts=(), char_error_rate=0.05, partial_rate=0.1, seed=0):
+        """
+        :param texts: 模拟器使用的文字表。
+        :param char_error_rate: 每个字符被认成其他字符的概率。
+        :param partial_rate: 一个文字只被认出前面或后面一部分的概率。
+        :param seed: 随机种子。
+        """
+        super().__init__(texts)
+        self.char_error_rate = char_error_rate
+        self.partial_rate = partial_rate
+        self.rng = random.Random(seed)
+        self.alphabet = sorted({char for text in self.texts for char in text})
+
+    def _corrupt(self, text):
+        if len(text) > 1 and self.rng.random() < self.partial_rate:
+            keep = self.rng.randint(max(1, len(text) // 2), len(text) - 1)
+            text = text[:keep] if self.rng.random() < 0.5 else text[-keep:]
+        return "".join(self.rng.choice(self.alphabet) if self.rng.random() < self.char_error_rate else char
+                       for char in text)
+
+    def recognize(self, img, horizontal_list=None, free_list=None, detail=1, batch_size=1):
+        results = super().recognize(img, horizontal_list=horizontal_list, free_list=free_list, detail=detail,
+                                    batch_size=batch_size)
+        return [(bbox, self._corrupt(text), prob) for bbox, text, prob in results]
+
+
+register_backend(NoisyTextBackend)
+
+
+def load_corpus(crops_dir, labels_path):
+    """
+    读取标注好的截图（与 tune_preprocess.py 使用同一份 labels.json）。
+    标注中包含该区域目标文字的截图是正样本，其余（包括标注为空字符串的）是负样本。
+    :return: 样本列表，每项为 (名称, 区域, 目标文字, 截图, 是否正样本)。
+    """
+    with open(labels_path, "r", encoding="utf-8") as f:
+        labels = json.load(f)
+    targets = target_regions()
+    samples = []
+    for path in sorted(glob.glob(os.path.join(crops_dir, "*.png"))):
+        name = os.path.basename(path)
+        region = crop_region(path)
+        if name not in labels or region not in targets:
+            continue
+        target = targets[region]
+        samples.append((name, region, target, cv2.imread(path), target in labels[name].replace(" ", "")))
+    return samples
+
+
+def near_misses(target):
+    """
+    :param target: 目标文字。
+    :return: 与目标文字很像、但不是目标的文字列表：中间一个字不同的文字，以及目标文字的前一部分。
+    """
+    middle = len(target) // 2
+    decoys = [target[:middle] + ("口" if target[middle] != "口" else "日") + target[middle + 1:]]
+    if len(target) > 2:
+        decoys.append(target[:(2 * len(target) + 2) // 3])
+    return decoys
+
+
+def synthetic_corpus(count, noise, seed):
+    """
+    用模拟器（simulator.py）生成语料：每个区域 count 个正样本和 count 个负样本，
+    负样本依次是空白画面、其他按钮的文字，以及与目标很像的文字（见 near_misses）。亮度、对比度和噪声随机，使部分样本难以识别。
+    :param count: 每个区域的正样本数（负样本数相同）。
+    :param noise: 高斯噪声的标准差。
+    :param seed: 随机种子。
+    :return: (样本列表, 模拟器的文字表，包括与目标很像的文字)
+    """
+    rng = random.Random(seed)
+    np_rng = np.random.default_rng(seed)
+    game = SimulatedGame(VirtualClock(0.0))
+    regions = target_regions()
+    decoys = {target: near_misses(target) for target in regions.values()}
+    # 模拟器按文字在文字表中的位置画图案，把相似文字追加到文字表末尾，模拟后端就能认出它们
+    game.texts.extend(decoy for target_decoys in decoys.values() for decoy in target_decoys
+                      if decoy not in game.texts)
+    samples = []
+    for region, target in regions.items():
+        _, _, w, h = region
+        others = [text for text in game.texts[:len(regions)] if text != target]
+        for i in range(2 * count):
+            positive = i < count
+            if positive:
+                pattern = game.render_text(target, w, h)
+            elif i % 3 == 0:
+                pattern = np.zeros((h, w), dtype=np.uint8)
+            elif i % 3 == 1:
+                pattern = game.render_text(rng.choice(others), w, h)
+            else:
+                pattern = game.render_text(rng.choice(decoys[target]), w, h)
+            background = rng.uniform(0, 80)
+            foreground = rng.uniform(140, 255)
+            gray = background + pattern.astype(np.float32) / 255.0 * (foreground - background)
+            gray += np_rng.normal(0, noise, gray.shape)
+            frame = cv2.cvtColor(np.clip(gray, 0, 255).astype(np.uint8), cv2.COLOR_GRAY2BGRA)
+            samples.append((f"synthetic_{region}_{i}", region, target, frame, positive))
+    return samples, game.texts
+
+
+def percentile(sorted_values, q):
+    """
+    :param sorted_values: 已排序的数值列表。
+    :param q: 分位数 (0~1)。
+    :return: 最近秩法的分位数值。
+    """
+    index = min(len(sorted_values) - 1, max(0, int(round(q * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[index]
+
+
+def peak_rss_mib():
+    """
+    :return: 进程的峰值常驻内存（MiB）；当前平台无法获取时返回 None。
+    """
+    try:
+        import resource
+        # Linux 上 ru_maxrss 的单位是 KiB
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    except ImportError:
+        pass
+    try:
+        import psutil
+    except ImportError:
+        return None
+    info = psutil.Process().memory_info()
+    return getattr(info, "peak_wset", info.rss) / 1048576
+
+
+def run_corpus(watcher, source, samples, repeat):
+    """
+    逐个样本执行 read_text_from_region 与 wait_for_text 中的相似度匹配。
+    每次读取前丢弃该区域的缓存，保证每个样本都真正经过识别。
+    :return: (每次读取的耗时毫秒列表, 每个样本的相似度列表, 总耗时秒数)
+    """
+    latencies = []
+    similarities = []
+    start = time.perf_counter()
+    for _, region, target, frame, _ in samples:
+        source.frame = frame
+        for _ in range(repeat):
+            watcher.reset_region(region)
+            read_start = time.perf_counter()
+            results = watcher.read_text_from_region(region, target_text=target)
+            _, similarity, _ = watcher.match_text(target, results)
+            latencies.append((time.perf_counter() - read_start) * 1000)
+        similarities.append(similarity)
+    return latencies, similarities, time.perf_counter() - start
+
+
+def score(samples, similarities, thresholds):
+    """
+    计算各阈值下的误报率和漏报率。
+    :return: 阈值字符串 -> {误报数, 误报率, 漏报数, 漏报率}。
+    """
+    positives = sum(1 for sample in samples if sample[4])
+    negatives = len(samples) - positives
+    scores = {}
+    for threshold in thresholds:
+        false_positives = sum(1 for sample, sim in zip(samples, similarities) if not sample[4] and sim >= threshold)
+        false_negatives = sum(1 for sample, sim in zip(samples, similarities) if sample[4] and sim < threshold)
+        scores[f"{threshold:.2f}"] = {
+            "false_positives": false_positives,
+            "false_positive_rate": false_positives / negatives if negatives else 0.0,
+            "false_negatives": false_negatives,
+            "false_negative_rate": false_negatives / positives if positives else 0.0,
+        }
+    return scores
+
+
+def compare(current, baseline, latency_tolerance, accuracy_tolerance, memory_tolerance):
+    """
+    与基线对比。
+    :param latency_tolerance: 延迟和吞吐量允许变差的相对比例。
+    :param accuracy_tolerance: 误报率、漏报率允许升高的绝对值。
+    :param memory_tolerance: 峰值内存允许升高的相对比例。
+    :return: 回归描述的列表，为空表示没有回归。
+    """
+    regressions = []
+    for key in ("p50", "p95", "p99"):
+        now, base = current["latency_ms"][key], baseline["latency_ms"][key]
+        if now > base * (1 + latency_tolerance):
+            regressions.append(f"延迟 {key}: {base:.2f} ms -> {now:.2f} ms")
+    now, base = current["throughput"], baseline["throughput"]
+    if now < base / (1 + latency_tolerance):
+        regressions.append(f"吞吐量: {base:.1f} 次/秒 -> {now:.1f} 次/秒")
+    for threshold, base_scores in baseline["thresholds"].items():
+        scores = current["thresholds"].get(threshold)
+        if scores is None:
+            continue
+        for key, label in (("false_positive_rate", "误报率"), ("false_negative_rate", "漏报率")):
+            if scores[key] > base_scores[key] + accuracy_tolerance:
+                regressions.append(f"阈值 {threshold} {label}: {base_scores[key]*100:.2f}% -> {scores[key]*100:.2f}%")
+    now, base = current.get("peak_rss_mib"), baseline.get("peak_rss_mib")
+    if now is not None and base is not None and now > base * (1 + memory_tolerance):
+        regressions.append(f"峰值内存: {base:.1f} MiB -> {now:.1f} MiB")
+    return regressions
+
+
+# --- 主程序入口 ---
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="在标注语料上测量 OCRWatcher 的延迟、吞吐量和误报/漏报率，并与基线对比")
+    parser.add_argument("crops_dir", nargs="?", help="保存截图的目录（OCRWatcher 的 save_crops_dir），需要 labels.json 标注")
+    parser.add_argument("--labels", default=None, help="标注文件（JSON：文件名 -> 正确文字），默认为 crops_dir/labels.json")
+    parser.add_argument("--synthetic", type=int, default=0,
+                        help="不使用截图，改用模拟器为每个区域生成这么多正样本和负样本（使用加了识别错误的 sim-noisy 后端）")
+    parser.add_argument("--noise", type=float, default=15.0, help="合成语料的噪声标准差")
+    parser.add_argument("--char-error-rate", type=float, default=0.05,
+                        help="合成语料：模拟后端把每个字符认错的概率")
+    parser.add_argument("--partial-rate", type=float, default=0.1,
+                        help="合成语料：模拟后端只认出文字一部分的概率")
+    parser.add_argument("--seed", type=int, default=0, help="合成语料的随机种子")
+    parser.add_argument("--backend", default=OCR_BACKEND, help="OCR后端名称")
+    parser.add_argument("--repeat", type=int, default=1, help="每个样本重复读取的次数")
+    parser.add_argument("--thresholds", default="0.6,0.7,0.8,0.9", help="统计误报/漏报率的相似度阈值，逗号分隔")
+    parser.add_argument("--output", default="ocr_benchmark.json", help="写入本次结果的文件")
+    parser.add_argument("--baseline", default="ocr_benchmark_baseline.json", help="基线结果文件")
+    parser.add_argument("--save-baseline", action="store_true", help="把本次结果保存为新的基线")
+    parser.add_argument("--latency-tolerance", type=float, default=0.2, help="延迟/吞吐量允许变差的相对比例")
+    parser.add_argument("--accuracy-tolerance", type=float, default=0.01, help="误报率/漏报率允许升高的绝对值")
+    parser.add_argument("--memory-tolerance", type=float, default=0.2, help="峰值内存允许升高的相对比例")
+    args = parser.parse_args()
+
+    if args.synthetic:
+        samples, texts = synthetic_corpus(args.synthetic, args.noise, args.seed)
+        backend, pipelines = NoisyTextBackend.name, None
+        backend_options = {"texts": texts, "char_error_rate": args.char_error_rate, "partial_rate": args.partial_rate,
+                           "seed": args.seed}
+        corpus_name = (f"synthetic(count={args.synthetic}, noise={args.noise}, char_error_rate={args.char_error_rate}, "
+                       f"partial_rate={args.partial_rate}, seed={args.seed})")
+    elif args.crops_dir:
+        labels_path = args.labels or os.path.join(args.crops_dir, "labels.json")
+        if not os.path.exists(labels_path):
+            print(f"找不到标注文件 {labels_path}，可以先用 tune_preprocess.py --init-labels 生成。")
+            sys.exit(1)
+        samples = load_corpus(args.crops_dir, labels_path)
+        backend, backend_options = args.backend, OCR_BACKEND_OPTIONS.get(args.backend)
+        pipelines = load_pipelines(PREPROCESS_PIPELINES_PATH)
+        corpus_name = os.path.abspath(args.crops_dir)
+    else:
+        parser.error("需要指定 crops_dir 或 --synthetic")
+    if not samples:
+        print("语料中没有任何属于已配置区域的标注截图。")
+        sys.exit(1)
+    positives = sum(1 for sample in samples if sample[4])
+    print(f"语料 {corpus_name}：{len(samples)} 个样本（正样本 {positives}，负样本 {len(samples) - positives}）")
+
+    source = CorpusSource()
+    watcher = OCRWatcher(similarity_threshold=SIMILARITY_THRESHOLD, recognize_only=RECOGNIZE_ONLY, lazy_load=False,
+                         backend=backend, backend_options=backend_options, crop_rows=CROP_TEXT_ROWS,
+                         preprocess=pipelines, source=source)
+    # 预热一次，避免首次推理的额外开销影响结果
+    run_corpus(watcher, source, samples[:1], 1)
+    latencies, similarities, elapsed = run_corpus(watcher, source, samples, args.repeat)
+
+    thresholds = sorted({float(v) for v in args.thresholds.split(",")} | {SIMILARITY_THRESHOLD})
+    ordered = sorted(latencies)
+    current = {
+        "corpus": corpus_name,
+        "backend": backend,
+        "samples": len(samples),
+        "positives": positives,
+        "repeat": args.repeat,
+        "latency_ms": {
+            "mean": sum(ordered) / len(ordered),
+            "p50": percentile(ordered, 0.50),
+            "p95": percentile(ordered, 0.95),
+            "p99": percentile(ordered, 0.99),
+        },
+        "throughput": len(latencies) / elapsed,
+        "thresholds": score(samples, similarities, thresholds),
+        "peak_rss_mib": peak_rss_mib(),
+    }
+
+    latency = current["latency_ms"]
+    print("\n" + "=" * 40)
+    print(f"延迟: p50 {latency['p50']:.2f} ms, p95 {latency['p95']:.2f} ms, p99 {latency['p99']:.2f} ms, "
+          f"平均 {latency['mean']:.2f} ms；吞吐量 {current['throughput']:.1f} 次/秒")
+    for threshold, scores in current["thresholds"].items():
+        marker = "  <- SIMILARITY_THRESHOLD" if float(threshold) == SIMILARITY_THRESHOLD else ""
+        print(f"阈值 {threshold}: 误报 {scores['false_positives']} ({scores['false_positive_rate']*100:.2f}%)，"
+              f"漏报 {scores['false_negatives']} ({scores['false_negative_rate']*100:.2f}%){marker}")
+    if current["peak_rss_mib"] is not None:
+        print(f"峰值内存: {current['peak_rss_mib']:.1f} MiB")
+    write_text_atomic(args.output, json.dumps(current, ensure_ascii=False, indent=2))
+    print(f"结果已写入 {args.output}")
+
+    if args.save_baseline:
+        write_text_atomic(args.baseline, json.dumps(current, ensure_ascii=False, indent=2))
+        print(f"已保存为基线 {args.baseline}")
+        sys.exit(0)
+    if not os.path.exists(args.baseline):
+        print(f"没有基线文件 {args.baseline}，跳过对比。可以用 --save-baseline 保存本次结果作为基线。")
+        sys.exit(0)
+    with open(args.baseline, "r", encoding="utf-8") as f:
+        baseline = json.load(f)
+    if baseline.get("corpus") != current["corpus"] or baseline.get("samples") != current["samples"]:
+        print(f"注意：基线使用的语料 ({baseline.get('corpus')}, {baseline.get('samples')} 个样本) 与本次不同，对比结果仅供参考。")
+    regressions = compare(current, baseline, args.latency_tolerance, args.accuracy_tolerance, args.memory_tolerance)
+    if regressions:
+        print("\n" + "!" * 40)
+        print(f"[回归] 与基线 {args.baseline} 相比有 {len(regressions)} 项变差:")
+        for regression in regressions:
+            print(f"  - {regression}")
+        print("!" * 40)
+        sys.exit(1)
+    print(f"与基线 {args.baseline} 相比没有回归。")
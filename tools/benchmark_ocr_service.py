@@ -0,0 +1,130 @@
+import argparse
+import contextlib
+import io
+import os
+import random
+import statistics
+import sys
+import threading
+import time
+
+# 让工具脚本可以直接导入 main 目录下的模块
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'main'))
+from config import OCR_BACKEND_OPTIONS, OCR_SERVICE_BATCH_WINDOW, OCR_SERVICE_MAX_BATCH
+from ocr_backends import RemoteOCRBackend, create_backend
+from ocr_service import OCRService
+from simulator import SimulatedGame, VirtualClock
+from vision import recognize_fixed_region
+
+
+class InferenceCostBackend:
+    """
+    给后端的每次推理加上固定耗时和按文字行计算的耗时，用来在模拟后端上估算真实模型的批量收益。
+    真实后端（--backend easyocr 等）不需要它。
+    """
+    def __init__(self, reader, batch_cost, line_cost):
+        """
+        :param reader: 实际执行识别的后端。
+        :param batch_cost: 每次推理的固定耗时（秒）。
+        :param line_cost: 每个文字行额外的耗时（秒）。
+        """
+        self.reader = reader
+        self.batch_cost = batch_cost
+        self.line_cost = line_cost
+
+    def recognize(self, img, horizontal_list=None, free_list=None, detail=1, batch_size=1):
+        time.sleep(self.batch_cost + self.line_cost * len(horizontal_list or [None]))
+        return self.reader.recognize(img, horizontal_list=horizontal_list, free_list=free_list, detail=detail,
+                                     batch_size=batch_size)
+
+    def readtext(self, img):
+        time.sleep(self.batch_cost + self.line_cost)
+        return self.reader.readtext(img)
+
+
+def run_session(client, crops, stop_event, interval, results):
+    """
+    一个会话的轮询循环：每隔 interval 秒识别一张图，记录往返耗时和服务端排队时间。
+    :param results: 追加 (往返秒数, 排队秒数, 是否识别正确) 的列表。
+    """
+    rng = random.Random(client.session)
+    while not stop_event.is_set():
+        text, crop = rng.choice(crops)
+        start = time.perf_counter()
+        ocr_results, _ = recognize_fixed_region(client, crop)
+        round_trip = time.perf_counter() - start
+        correct = any(res[1] == text for res in ocr_results)
+        results.append((round_trip, client.last_wait, correct))
+        if interval > round_trip:
+            time.sleep(interval - round_trip)
+
+
+def quantile(values, q):
+    """已排序列表的分位数（取最近的秩）。"""
+    return values[min(len(values) - 1, int(q * len(values)))] if values else 0.0
+
+
+# --- 主程序入口 ---
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="逐步增加会话数量压测共享OCR服务，找出排队时间开始上升的吞吐上限")
+    parser.add_argument("--sessions", default="1,2,4,8", help="依次测试的会话数量，逗号分隔")
+    parser.add_argument("--duration", type=float, default=5.0, help="每个会话数量测试多少秒")
+    parser.add_argument("--interval", type=float, default=0.1, help="每个会话两次识别之间的间隔（秒），对应轮询间隔")
+    parser.add_argument("--backend", default="sim", help="服务使用的OCR后端；sim 使用模拟器画出的文字")
+    parser.add_argument("--batch-cost", type=float, default=0.02,
+                        help="仅 sim 后端：模拟每次推理的固定耗时（秒）")
+    parser.add_argument("--line-cost", type=float, default=0.002,
+                        help="仅 sim 后端：模拟每个文字行额外的推理耗时（秒）")
+    parser.add_argument("--batch-window", type=float, default=OCR_SERVICE_BATCH_WINDOW, help="服务收集一批请求的等待时间（秒）")
+    parser.add_argument("--max-batch", type=int, default=OCR_SERVICE_MAX_BATCH,
+                        help="一批最多包含的请求数；设为 1 可以对比不做批量时的表现")
+    args = parser.parse_args()
+
+    game = SimulatedGame(VirtualClock(), rng=random.Random(0))
+    crops = [(text, game.render_text(text, 200, 48)) for text in game.texts]
+    if args.backend == "sim":
+        reader = InferenceCostBackend(create_backend("sim", texts=game.texts), args.batch_cost, args.line_cost)
+    else:
+        reader = create_backend(args.backend, **OCR_BACKEND_OPTIONS.get(args.backend, {}))
+
+    # 压测只在本进程内连接，使用一次性的随机密钥，不读取也不生成用户的密钥文件
+    authkey = os.urandom(32)
+    print(f"后端 {args.backend}，批次等待 {args.batch_window * 1000:.0f}ms，每批最多 {args.max_batch} 个请求，"
+          f"每个会话每 {args.interval:.2f}s 识别一次")
+    print(f"{'会话数':>6} {'请求/秒':>8} {'往返p50':>9} {'往返p95':>9} {'排队p50':>9} {'排队p95':>9} "
+          f"{'每批':>5} {'忙碌':>5} {'正确率':>6}")
+    for count in [int(n) for n in args.sessions.split(",")]:
+        # 每个会话数量使用一个新的服务，统计互不干扰；丢弃服务打印的连接信息
+        with contextlib.redirect_stdout(io.StringIO()):
+            service = OCRService(address=("127.0.0.1", 0), authkey=authkey,
+                                 batch_window=args.batch_window, max_batch=args.max_batch, report_interval=None,
+                                 reader=reader)
+            service.start()
+            clients = [RemoteOCRBackend(address=service.address, authkey=authkey, session=f"session-{i}")
+                       for i in range(count)]
+            stop_event = threading.Event()
+            results = [[] for _ in clients]
+            threads = [threading.Thread(target=run_session,
+                                        args=(client, crops, stop_event, args.interval, session_results))
+                       for client, session_results in zip(clients, results)]
+            start = time.perf_counter()
+            for thread in threads:
+                thread.start()
+            time.sleep(args.duration)
+            stop_event.set()
+            for thread in threads:
+                thread.join()
+            elapsed = time.perf_counter() - start
+            stats = clients[0].stats()
+            for client in clients:
+                client.conn.close()
+            service.stop()
+
+        merged = [item for session_results in results for item in session_results]
+        round_trips = sorted(item[0] for item in merged)
+        waits = sorted(item[1] for item in merged)
+        accuracy = statistics.mean(item[2] for item in merged) if merged else 0.0
+        print(f"{count:>6} {len(merged) / elapsed:>8.1f} {quantile(round_trips, 0.5) * 1000:>7.1f}ms "
+              f"{quantile(round_trips, 0.95) * 1000:>7.1f}ms {quantile(waits, 0.5) * 1000:>7.1f}ms "
+              f"{quantile(waits, 0.95) * 1000:>7.1f}ms {stats['mean_batch']:>5.1f} {stats['utilization'] * 100:>4.0f}% "
+              f"{accuracy * 100:>5.1f}%")
@@ -0,0 +1,82 @@
+import argparse
+import glob
+import os
+import statistics
+import sys
+import time
+
+import cv2
+
+# 让工具脚本可以直接导入 main 目录下的模块
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'main'))
+from config import OCR_BACKEND_OPTIONS
+from ocr_backends import create_backend
+from vision import preprocess_frame, recognize_fixed_region
+
+
+def time_call(func, repeat):
+    """
+    重复调用一个函数并记录每次耗时（毫秒）。
+    :param func: 无参数的可调用对象。
+    :param repeat: 重复次数。
+    :return: (最后一次的返回值, 耗时列表)
+    """
+    timings = []
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        timings.append((time.perf_counter() - start) * 1000)
+    return result, timings
+
+
+def join_text(results):
+    """把识别结果拼接成一个去掉空格的字符串，与 OCRWatcher.wait_for_text 的处理一致。"""
+    return "".join([res[1] for res in results]).replace(" ", "")
+
+
+# --- 主程序入口 ---
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="对比 readtext（检测+识别）与只识别快速路径的耗时")
+    parser.add_argument("crops_dir", help="保存截图的目录（例如 OCRWatcher 的 save_crops_dir）")
+    parser.add_argument("--repeat", type=int, default=5, help="每张截图每种方式重复的次数")
+    parser.add_argument("--min-confidence", type=float, default=0.5, help="快速路径的最低置信度")
+    parser.add_argument("--backend", default="easyocr", help="OCR后端名称")
+    parser.add_argument("--crop-rows", action="store_true", help="快速路径只识别含有文字的行")
+    args = parser.parse_args()
+
+    paths = sorted(glob.glob(os.path.join(args.crops_dir, "*.png")))
+    if not paths:
+        print(f"在 {args.crops_dir} 中没有找到任何 png 截图。")
+        sys.exit(1)
+
+    print("正在初始化 OCR 引擎...")
+    reader = create_backend(args.backend, **OCR_BACKEND_OPTIONS.get(args.backend, {}))
+    # 预热一次，避免首次推理的额外开销影响结果
+    reader.readtext(preprocess_frame(cv2.imread(paths[0])))
+
+    full_timings = []
+    fast_timings = []
+    fallbacks = 0
+    mismatches = 0
+    for path in paths:
+        img = preprocess_frame(cv2.imread(path))
+        full_results, timings = time_call(lambda: reader.readtext(img), args.repeat)
+        full_timings.extend(timings)
+        (fast_results, used_fallback), timings = time_call(
+            lambda: recognize_fixed_region(reader, img, args.min_confidence, args.crop_rows), args.repeat)
+        fast_timings.extend(timings)
+        fallbacks += int(used_fallback)
+        full_text, fast_text = join_text(full_results), join_text(fast_results)
+        if full_text != fast_text:
+            mismatches += 1
+        print(f"{os.path.basename(path)}: readtext='{full_text}' 快速路径='{fast_text}'{' (退回完整检测)' if used_fallback else ''}")
+
+    full_mean = statistics.mean(full_timings)
+    fast_mean = statistics.mean(fast_timings)
+    print("\n" + "=" * 40)
+    print(f"截图数量: {len(paths)}，每张重复 {args.repeat} 次")
+    print(f"readtext   平均 {full_mean:.1f} ms，中位数 {statistics.median(full_timings):.1f} ms")
+    print(f"快速路径   平均 {fast_mean:.1f} ms，中位数 {statistics.median(fast_timings):.1f} ms")
+    print(f"加速比: {full_mean / fast_mean:.2f}x")
+    print(f"退回完整检测: {fallbacks}/{len(paths)}，识别文字不一致: {mismatches}/{len(paths)}")
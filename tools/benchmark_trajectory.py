@@ -0,0 +1,78 @@
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+
+# 让工具脚本可以直接导入 main 目录下的模块
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'main'))
+from trajectory import TrajectoryEngine
+
+
+class FakeMouse:
+    """代替 pydirectinput.moveRel：只累计位移，并消耗与真实调用相近的时间。"""
+    def __init__(self, call_cost, pause):
+        """
+        :param call_cost: 每次调用本身的耗时（秒）。
+        :param pause: 调用后的停顿（秒），对应 pydirectinput 默认的 PAUSE（_pause=True 时）。
+        """
+        self.call_cost = call_cost
+        self.pause = pause
+        self.x = self.y = 0
+
+    def move_rel(self, dx, dy, pause=True):
+        self.x += dx
+        self.y += dy
+        time.sleep(self.call_cost + (self.pause if pause else 0.0))
+
+
+def legacy_move(mouse, offset_x, offset_y, duration):
+    """原来 ActionExecutor.human_like_move_to 的分步移动方式（每步截断取整、每步之后随机 sleep）。"""
+    steps = int(duration / 0.01)
+    if steps <= 0: steps = 1
+    step_x = offset_x / steps
+    step_y = offset_y / steps
+    for i in range(steps):
+        jitter_x = random.randint(-2, 2)
+        jitter_y = random.randint(-2, 2)
+        mouse.move_rel(int(step_x + jitter_x), int(step_y + jitter_y))
+        time.sleep(random.uniform(0.005, 0.015))
+
+
+def summarize(name, duration_errors, landing_errors):
+    print(f"{name}: 时长误差 平均 {statistics.mean(duration_errors)*1000:+.1f} ms，"
+          f"最大 {max(duration_errors, key=abs)*1000:+.1f} ms；"
+          f"落点误差 平均 {statistics.mean(landing_errors):.1f}，最大 {max(landing_errors):.1f}")
+
+
+# --- 主程序入口 ---
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="对比原来的分步移动与轨迹引擎的时长误差和落点误差（不会真的移动鼠标）")
+    parser.add_argument("--moves", type=int, default=20, help="每种方式移动的次数")
+    parser.add_argument("--duration", type=float, default=0.5, help="每次移动的计划时长（秒）")
+    parser.add_argument("--distance", type=float, default=600, help="每次移动的最大位移（已乘灵敏度）")
+    parser.add_argument("--call-cost", type=float, default=0.0005, help="模拟每次 moveRel 调用本身的耗时（秒）")
+    parser.add_argument("--pause", type=float, default=0.0,
+                        help="模拟 pydirectinput.PAUSE（原来的写法没有传 _pause=False，默认 PAUSE 为 0.1 秒）")
+    parser.add_argument("--seed", type=int, default=0, help="随机种子")
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    targets = [(random.uniform(-args.distance, args.distance), random.uniform(-args.distance, args.distance))
+               for _ in range(args.moves)]
+    engine = TrajectoryEngine(seed=args.seed)
+    for name, run in (
+        ("原来的分步移动", lambda mouse, x, y: legacy_move(mouse, x, y, args.duration)),
+        ("轨迹引擎", lambda mouse, x, y: engine.move(x, y, args.duration,
+                                                    lambda dx, dy: mouse.move_rel(dx, dy, pause=False))),
+    ):
+        duration_errors = []
+        landing_errors = []
+        for x, y in targets:
+            mouse = FakeMouse(args.call_cost, args.pause)
+            start = time.perf_counter()
+            run(mouse, x, y)
+            duration_errors.append(time.perf_counter() - start - args.duration)
+            landing_errors.append(((mouse.x - x) ** 2 + (mouse.y - y) ** 2) ** 0.5)
+        summarize(name, duration_errors, landing_errors)
@@ -0,0 +1,123 @@
+import argparse
+import os
+import sys
+import time
+
+import cv2
+
+# 让工具脚本可以直接导入 main 目录下的模块
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'main'))
+from config import (
+    EXIT_SEQUENCE_STEPS, MONITOR_REGION, OCR_BACKEND, OCR_BACKEND_OPTIONS, OCR_CONFUSIONS, SCREEN_STATE_PROBES,
+    SIMILARITY_THRESHOLD, START_GAME_REGION, START_GAME_TEXT, TARGET_TEXT, UI_INDEX_PATH, UI_SCALE,
+)
+from locator import UILocator, pad_region
+from matcher import FuzzyMatcher
+from ocr_backends import create_backend
+from screen_sources import MSSSource, screen_size
+
+
+def ui_elements():
+    """
+    需要校准的元素，按所在的界面分组。
+    :return: [(界面, [(元素名称, 要查找的文字, 参考区域), ...]), ...]
+    """
+    text_states = {probe['text']: state for state, probes in SCREEN_STATE_PROBES for probe in probes}
+    elements = [(TARGET_TEXT, TARGET_TEXT, MONITOR_REGION)]
+    elements += [(step['text'], step['text'], step['region']) for step in EXIT_SEQUENCE_STEPS]
+    groups = {}
+    for name, text, region in elements:
+        groups.setdefault(text_states.get(text, f"exit:{text}"), []).append((name, text, region))
+    if START_GAME_TEXT:
+        groups.setdefault("main_menu", []).append(("start", START_GAME_TEXT, START_GAME_REGION))
+    return list(groups.items())
+
+
+def find_elements(reader, matcher, frame, elements, args):
+    """
+    对整个屏幕做一次OCR（检测+识别），找出这个界面上的所有元素。
+    :param frame: 全屏截图。
+    :param elements: [(元素名称, 要查找的文字, 参考区域), ...]。
+    :return: 元素名称 -> 屏幕上的区域；没有找到的元素不在其中。
+    """
+    code = cv2.COLOR_BGRA2GRAY if frame.shape[2] == 4 else cv2.COLOR_BGR2GRAY
+    start = time.perf_counter()
+    results = reader.readtext(cv2.cvtColor(frame, code))
+    print(f"  全屏OCR用时 {time.perf_counter() - start:.1f}s，识别出 {len(results)} 段文字")
+    found = {}
+    for name, text, reference in elements:
+        match = matcher.match(results, [text], args.threshold)
+        if match is None:
+            candidates = "、".join(f"'{res[1]}'" for res in results[:10])
+            print(f"  未找到 '{text}'。识别出的文字: {candidates or '无'}")
+            continue
+        _, similarity, (bbox, detected, _) = match
+        xs = [point[0] for point in bbox]
+        ys = [point[1] for point in bbox]
+        tight = (int(min(xs)), int(min(ys)), int(max(xs) - min(xs)), int(max(ys) - min(ys)))
+        region = pad_region(tight, (frame.shape[1], frame.shape[0]), padding=args.padding)
+        found[name] = region
+        print(f"  找到 '{text}' -> '{detected}' (相似度 {similarity:.2f})，区域 {region}，"
+              f"面积为参考区域的 {region[2] * region[3] / (reference[2] * reference[3]) * 100:.0f}%")
+    return found
+
+
+# --- 主程序入口 ---
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="在每个界面对全屏做一次OCR，把各元素的位置写入界面索引（按分辨率和界面缩放区分）")
+    parser.add_argument("--index", default=UI_INDEX_PATH, help="界面索引文件")
+    parser.add_argument("--ui-scale", type=float, default=UI_SCALE, help="游戏的界面缩放比例")
+    parser.add_argument("--screenshots", default=None,
+                        help="不实时截图，改用这个目录中的 <界面>.png 全屏截图（例如 esc_menu.png）")
+    parser.add_argument("--backend", default=OCR_BACKEND, help="OCR后端名称")
+    parser.add_argument("--threshold", type=float, default=SIMILARITY_THRESHOLD, help="判定找到元素的相似度阈值")
+    parser.add_argument("--padding", type=float, default=0.25, help="文字框四周的余量，占文字高度的比例")
+    parser.add_argument("--delay", type=float, default=3.0, help="实时截图时，按回车后等待多少秒再截图（用于切回游戏窗口）")
+    args = parser.parse_args()
+
+    groups = ui_elements()
+    source = None
+    if args.screenshots:
+        first = next((os.path.join(args.screenshots, f"{state}.png") for state, _ in groups
+                      if os.path.exists(os.path.join(args.screenshots, f"{state}.png"))), None)
+        if first is None:
+            print(f"{args.screenshots} 中没有任何界面截图，需要的文件名: {', '.join(f'{state}.png' for state, _ in groups)}")
+            sys.exit(1)
+        image = cv2.imread(first)
+        size = (image.shape[1], image.shape[0])
+    else:
+        size = screen_size()
+        source = MSSSource()
+    locator = UILocator(path=args.index, screen_size=size, ui_scale=args.ui_scale)
+    print(f"校准布局 {locator.key}，索引文件 {args.index}")
+    print("正在初始化 OCR 引擎...")
+    reader = create_backend(args.backend, **OCR_BACKEND_OPTIONS.get(args.backend, {}))
+    matcher = FuzzyMatcher(threshold=args.threshold, confusions=OCR_CONFUSIONS)
+
+    calibrated = 0
+    for state, elements in groups:
+        names = "、".join(f"'{text}'" for _, text, _ in elements)
+        print(f"\n界面 {state}: {names}")
+        if source is None:
+            path = os.path.join(args.screenshots, f"{state}.png")
+            if not os.path.exists(path):
+                print(f"  跳过：没有截图 {path}")
+                continue
+            frame = cv2.imread(path)
+            if (frame.shape[1], frame.shape[0]) != size:
+                print(f"  跳过：{path} 的尺寸与其他截图不同")
+                continue
+        else:
+            if input("  请把游戏切换到这个界面后按回车（输入 s 跳过）: ").strip().lower() == "s":
+                continue
+            time.sleep(args.delay)
+            frame = source.grab((0, 0, size[0], size[1]))
+        for name, region in find_elements(reader, matcher, frame, elements, args).items():
+            locator.calibrate(name, region)
+            calibrated += 1
+
+    if source is not None:
+        source.close()
+    locator.save()
+    total = sum(len(elements) for _, elements in groups)
+    print(f"\n已校准 {calibrated}/{total} 个元素并写入 {args.index}。未校准的元素运行时按分辨率比例缩放参考坐标。")
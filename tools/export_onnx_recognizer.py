@@ -0,0 +1,59 @@
+import argparse
+import json
+import os
+
+import torch
+import easyocr
+from onnxruntime.quantization import QuantType, quantize_dynamic
+
+
+class RecognizerWrapper(torch.nn.Module):
+    """EasyOCR 的识别模型 forward 需要一个 CTC 解码时用不到的 text 参数，这里把它包掉，只保留图像输入。"""
+    def __init__(self, model):
+        super().__init__()
+        self.model = model
+
+    def forward(self, image):
+        return self.model(image, None)
+
+
+# --- 主程序入口 ---
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="把 EasyOCR 的识别模型导出为 int8 量化的 ONNX 模型，供 onnx 后端使用")
+    parser.add_argument("--output-dir", default=os.path.join("main", "models"), help="输出目录")
+    parser.add_argument("--img-height", type=int, default=64, help="模型输入的图像高度")
+    parser.add_argument("--opset", type=int, default=13, help="ONNX opset 版本")
+    args = parser.parse_args()
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    fp32_path = os.path.join(args.output_dir, "recognizer_fp32.onnx")
+    int8_path = os.path.join(args.output_dir, "recognizer_int8.onnx")
+    charset_path = os.path.join(args.output_dir, "charset.json")
+
+    print("正在载入 EasyOCR 识别模型...")
+    reader = easyocr.Reader(['ch_sim', 'en'], gpu=False)
+    model = reader.recognizer
+    # 在多卡环境下识别模型会被 DataParallel 包一层
+    if hasattr(model, "module"):
+        model = model.module
+    model.eval()
+
+    print(f"正在导出 {fp32_path} ...")
+    dummy = torch.zeros(1, 1, args.img_height, 256)
+    torch.onnx.export(
+        RecognizerWrapper(model), dummy, fp32_path, opset_version=args.opset,
+        input_names=["image"], output_names=["logits"],
+        dynamic_axes={"image": {0: "batch", 3: "width"}, "logits": {0: "batch", 1: "steps"}},
+    )
+
+    print(f"正在进行 int8 动态量化 -> {int8_path} ...")
+    quantize_dynamic(fp32_path, int8_path, weight_type=QuantType.QInt8)
+
+    # 字符表的第0项是CTC空白符，与模型输出的类别编号一一对应
+    with open(charset_path, "w", encoding="utf-8") as f:
+        json.dump(reader.converter.character, f, ensure_ascii=False)
+
+    print("\n导出完成：")
+    for path in (fp32_path, int8_path, charset_path):
+        print(f"  {path} ({os.path.getsize(path) / 1024 / 1024:.1f} MB)")
+    print("在 config.py 中把 OCR_BACKEND 设为 \"onnx\" 即可启用。")
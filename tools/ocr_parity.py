@@ -0,0 +1,71 @@
+import argparse
+import glob
+import os
+import sys
+import time
+
+import cv2
+
+# 让工具脚本可以直接导入 main 目录下的模块
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'main'))
+from config import OCR_BACKEND_OPTIONS
+from ocr_backends import create_backend
+from vision import preprocess_frame, recognize_fixed_region
+
+
+def read_all(backend, images, min_confidence):
+    """
+    用一个后端识别所有截图。
+    :param backend: OCRBackend 实例。
+    :param images: 预处理后的图像列表。
+    :param min_confidence: 快速路径的最低置信度。
+    :return: (识别出的文字列表, 总耗时秒数)
+    """
+    texts = []
+    start = time.perf_counter()
+    for img in images:
+        results, _ = recognize_fixed_region(backend, img, min_confidence)
+        texts.append("".join([res[1] for res in results]).replace(" ", ""))
+    return texts, time.perf_counter() - start
+
+
+# --- 主程序入口 ---
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="在保存的截图上比较两个OCR后端的识别结果是否一致")
+    parser.add_argument("crops_dir", help="保存截图的目录（例如 OCRWatcher 的 save_crops_dir）")
+    parser.add_argument("--reference", default="easyocr", help="作为基准的后端")
+    parser.add_argument("--candidate", default="onnx", help="要比较的后端")
+    parser.add_argument("--min-agreement", type=float, default=0.98, help="最低一致率，低于此值时以非零状态退出")
+    parser.add_argument("--min-confidence", type=float, default=0.5, help="快速路径的最低置信度")
+    args = parser.parse_args()
+
+    paths = sorted(glob.glob(os.path.join(args.crops_dir, "*.png")))
+    if not paths:
+        print(f"在 {args.crops_dir} 中没有找到任何 png 截图。")
+        sys.exit(1)
+    images = [preprocess_frame(cv2.imread(path)) for path in paths]
+
+    outputs = {}
+    for name in (args.reference, args.candidate):
+        backend = create_backend(name, **OCR_BACKEND_OPTIONS.get(name, {}))
+        # 预热一次，避免首次推理的额外开销影响耗时
+        recognize_fixed_region(backend, images[0], args.min_confidence)
+        outputs[name] = read_all(backend, images, args.min_confidence)
+
+    reference_texts, reference_seconds = outputs[args.reference]
+    candidate_texts, candidate_seconds = outputs[args.candidate]
+    agreed = 0
+    for path, expected, actual in zip(paths, reference_texts, candidate_texts):
+        if expected == actual:
+            agreed += 1
+        else:
+            print(f"不一致 {os.path.basename(path)}: {args.reference}='{expected}' {args.candidate}='{actual}'")
+
+    agreement = agreed / len(paths)
+    print("\n" + "=" * 40)
+    print(f"截图数量: {len(paths)}，一致率: {agreement * 100:.1f}%")
+    print(f"{args.reference}: 平均 {reference_seconds / len(paths) * 1000:.1f} ms/张")
+    print(f"{args.candidate}: 平均 {candidate_seconds / len(paths) * 1000:.1f} ms/张")
+    if agreement < args.min_agreement:
+        print(f"一致率低于要求的 {args.min_agreement * 100:.1f}%！")
+        sys.exit(1)
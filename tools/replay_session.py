@@ -0,0 +1,75 @@
+import argparse
+import os
+import sys
+import time
+
+# 让工具脚本可以直接导入 main 目录下的模块
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'main'))
+from config import (
+    CHANGE_SENSITIVITY, EXIT_SEQUENCE_STEPS, MONITOR_REGION, OCR_BACKEND, OCR_BACKEND_OPTIONS, RECOGNIZE_ONLY,
+)
+from screen_sources import ReplaySource
+from vision import OCRWatcher
+
+
+def known_regions():
+    """config.py 中配置的所有文字区域及其目标文字。"""
+    regions = {tuple(MONITOR_REGION): None}
+    for step in EXIT_SEQUENCE_STEPS:
+        regions[tuple(step['region'])] = step['text']
+    return regions
+
+
+# --- 主程序入口 ---
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="在录制的会话上离线回放 OCRWatcher，不需要游戏和显示器")
+    parser.add_argument("recording", help="录制文件（RECORD_SESSION_PATH）")
+    parser.add_argument("--speed", type=float, default=None,
+                        help="按录制时间轴回放的速度倍数；不指定时逐帧回放，尽可能快")
+    parser.add_argument("--backend", default=OCR_BACKEND, help="OCR后端名称")
+    parser.add_argument("--no-change-gate", action="store_true", help="关闭画面变化检测，每帧都OCR")
+    args = parser.parse_args()
+
+    source = ReplaySource(args.recording, speed=args.speed)
+    print(f"录制文件包含 {len(source.timelines)} 个截图区域，时长 {source.end_time - source.start_time:.1f}s")
+    regions = {}
+    for region, target in known_regions().items():
+        if source.has_region(region):
+            regions[region] = target
+        else:
+            print(f"跳过区域 {region}：录制文件中没有它的画面")
+    if not regions:
+        sys.exit(1)
+
+    watcher = OCRWatcher(change_sensitivity=None if args.no_change_gate else CHANGE_SENSITIVITY,
+                         recognize_only=RECOGNIZE_ONLY, lazy_load=False, backend=args.backend,
+                         backend_options=OCR_BACKEND_OPTIONS.get(args.backend), source=source)
+    last_texts = {}
+    polls = 0
+    start = time.perf_counter()
+    active = dict(regions)
+    while active:
+        for region, target in list(active.items()):
+            try:
+                results = watcher.read_text_from_region(region, target_text=target)
+            except EOFError:
+                del active[region]
+                continue
+            polls += 1
+            text = "".join([res[1] for res in results]).replace(" ", "")
+            if text != last_texts.get(region):
+                print(f"[回放] {region}: '{last_texts.get(region, '')}' -> '{text}' ({watcher.last_read_sources.get(region)})")
+                last_texts[region] = text
+        if args.speed is not None:
+            if source.finished():
+                break
+            time.sleep(0.05)
+    elapsed = time.perf_counter() - start
+
+    counters = watcher.metrics.counters
+    print("\n" + "=" * 40)
+    print(f"轮询 {polls} 次，用时 {elapsed:.2f}s ({polls / max(elapsed, 1e-9):.1f} 次/秒)")
+    print(f"实际OCR {counters.get('ocr.calls', 0)} 次，缓存命中 {counters.get('ocr.cache_hits', 0)} 次，"
+          f"退回完整检测 {counters.get('ocr.fallbacks', 0)} 次")
+    print(watcher.metrics.report())
+    source.close()
@@ -0,0 +1,183 @@
+import argparse
+import contextlib
+import io
+import os
+import random
+import resource
+import sys
+import time
+
+# 让工具脚本可以直接导入 main 目录下的模块
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'main'))
+import metrics
+import scheduler
+import templates
+import vision
+import watchdog
+import workflows
+from profiling import ResourceProfiler
+from config import (
+    CHANGE_SENSITIVITY, EXIT_SEQUENCE_STEPS, MONITOR_REGION, SCREEN_STATE_PROBES, SIMILARITY_THRESHOLD,
+    START_GAME_REGION, TARGET_TEXT, WATCHDOG_DEFAULT_DEADLINES,
+)
+from scheduler import AdaptivePollScheduler
+from simulator import (
+    SimulatedActionExecutor, SimulatedGame, SimulatedGuiExecutor, SimulatedScreen, VirtualClock,
+)
+from states import ScreenStateClassifier
+from vision import OCRWatcher
+from watchdog import StallWatchdog, default_recoveries
+from workflows import GameExiter, GameStarter, RoundStateMachine
+
+
+def rss_bytes():
+    """
+    :return: 当前进程的常驻内存（字节）。Linux 上读取 /proc，其他系统退回到峰值常驻内存。
+    """
+    try:
+        with open("/proc/self/statm", "r") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except OSError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def build(args, clock):
+    """
+    用模拟游戏、模拟截图和模拟执行者组装出与 action.py 相同的对象。
+    :return: (游戏, 截图来源, 观察者, 启动者, 退出者, 游戏内执行者, 状态机, 看门狗)
+    """
+    game = SimulatedGame(clock, drop_rate=args.drop_rate, hang_rate=args.hang_rate, rng=random.Random(args.seed))
+    screen = SimulatedScreen(game, grab_cost=args.grab_cost)
+    poll_scheduler = AdaptivePollScheduler(stats_path=None) if args.adaptive else None
+    watcher = OCRWatcher(similarity_threshold=SIMILARITY_THRESHOLD, change_sensitivity=CHANGE_SENSITIVITY,
+                         lazy_load=False, backend="sim", backend_options={"texts": game.texts},
+                         scheduler=poll_scheduler, source=screen)
+    menu_executor = SimulatedGuiExecutor(game)
+    ingame_executor = SimulatedActionExecutor(game)
+    exiter = GameExiter(watcher=watcher, executor=menu_executor, steps_config=EXIT_SEQUENCE_STEPS)
+    starter = GameStarter(executor=menu_executor, start_region=START_GAME_REGION)
+    stall_watchdog = None
+    if args.watchdog:
+        stall_watchdog = StallWatchdog(scheduler=poll_scheduler,
+                                       recoveries=default_recoveries(menu_executor, exiter, starter),
+                                       stats_path=None, default_deadline=args.phase_timeout,
+                                       default_deadlines=WATCHDOG_DEFAULT_DEADLINES)
+    classifier = ScreenStateClassifier(watcher=watcher, probes=SCREEN_STATE_PROBES)
+    state_machine = RoundStateMachine(classifier=classifier, starter=starter, exiter=exiter,
+                                      ingame_executor=ingame_executor, phase_timeout=args.phase_timeout,
+                                      watchdog=stall_watchdog)
+    return game, screen, watcher, starter, exiter, ingame_executor, state_machine, stall_watchdog
+
+
+def run_legacy_round(watcher, starter, exiter, ingame_executor, stall_watchdog=None):
+    """与 action.py 中不使用状态机时的流程相同。"""
+    starter.start_new_game()
+    loading_timeout = stall_watchdog.deadline("loading") if stall_watchdog is not None else None
+    if not watcher.wait_for_text(target_text=TARGET_TEXT, monitor_region=MONITOR_REGION, phase="loading",
+                                 timeout=loading_timeout):
+        return False
+    ingame_executor.run_action_sequence()
+    time_module = workflows.time
+    time_module.sleep(2)
+    exit_timeout = 8
+    if stall_watchdog is not None:
+        exit_timeout = max(stall_watchdog.deadline(GameExiter.step_phase(step)) for step in EXIT_SEQUENCE_STEPS)
+    return exiter.run_exit_sequence(timeout=exit_timeout)
+
+
+# --- 主程序入口 ---
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="在模拟游戏上加速运行大量轮次，统计吞吐量、内存增长和卡住的次数")
+    parser.add_argument("--rounds", type=int, default=10000, help="运行的轮数")
+    parser.add_argument("--mode", choices=("state_machine", "legacy"), default="state_machine",
+                        help="使用画面状态机，或原来的固定流程（legacy 流程不启用看门狗时无法从卡住中恢复，会一直等待）")
+    parser.add_argument("--seed", type=int, default=0, help="随机种子")
+    parser.add_argument("--drop-rate", type=float, default=0.0,
+                        help="每次输入被游戏忽略的概率；用于观察流程能否从丢失的输入中恢复")
+    parser.add_argument("--hang-rate", type=float, default=0.0, help="每次加载卡住的概率")
+    parser.add_argument("--grab-cost", type=float, default=0.03, help="每次截图+识别消耗的虚拟时间（秒）")
+    parser.add_argument("--phase-timeout", type=float, default=60, help="状态机单个阶段的超时（虚拟秒）")
+    parser.add_argument("--stall-seconds", type=float, default=120, help="一轮超过这么多虚拟秒视为卡住")
+    parser.add_argument("--adaptive", action="store_true", help="启用自适应轮询调度器（看门狗也用它的历史耗时计算截止时间）")
+    parser.add_argument("--watchdog", action="store_true", help="启用看门狗：卡住时逐级执行恢复动作，并统计损失的时间")
+    parser.add_argument("--profile-every", type=int, default=0,
+                        help="每多少轮做一次资源剖析（见 profiling.ResourceProfiler），0 表示不剖析")
+    parser.add_argument("--profile-dir", default="profiles", help="剖析文件所在的目录")
+    parser.add_argument("--rss-budget", type=float, default=None, help="常驻内存增长预算（MB），超出时重启OCR引擎")
+    parser.add_argument("--report-every", type=int, default=1000, help="每多少轮打印一次进度")
+    parser.add_argument("--verbose", action="store_true", help="显示流程本身的输出")
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    clock = VirtualClock()
+    clock.install(vision, workflows, scheduler, metrics, templates, watchdog)
+    game, screen, watcher, starter, exiter, ingame_executor, state_machine, stall_watchdog = build(args, clock)
+
+    profiler = None
+    if args.profile_every:
+        profiler = ResourceProfiler(directory=args.profile_dir, every=args.profile_every, rss_budget_mb=args.rss_budget,
+                                    on_budget=watcher.restart_engine)
+        profiler.start()
+
+    output = sys.stdout if args.verbose else io.StringIO()
+    stalls = 0
+    failures = 0
+    wall_start = time.perf_counter()
+    virtual_start = clock.time()
+    rss_start = rss_bytes()
+    rss_samples = []
+    for round_index in range(1, args.rounds + 1):
+        round_start = clock.time()
+        with contextlib.redirect_stdout(output):
+            if stall_watchdog is not None:
+                stall_watchdog.round_started()
+            if args.mode == "state_machine":
+                completed = state_machine.run_round()
+            else:
+                completed = run_legacy_round(watcher, starter, exiter, ingame_executor, stall_watchdog)
+            if stall_watchdog is not None:
+                if completed:
+                    stall_watchdog.round_completed()
+                else:
+                    stall_watchdog.round_failed()
+            if profiler is not None:
+                profiler.sample(round_index)
+        if not args.verbose:
+            # 丢弃流程的输出，避免占用内存
+            output.seek(0)
+            output.truncate()
+        failures += int(not completed)
+        if not completed or clock.time() - round_start > args.stall_seconds:
+            stalls += 1
+        if round_index % args.report_every == 0 or round_index == args.rounds:
+            wall = time.perf_counter() - wall_start
+            rss_samples.append(rss_bytes())
+            print(f"[模拟] {round_index} 轮: {round_index / wall:.1f} 轮/秒 (真实时间)，"
+                  f"虚拟时间平均每轮 {(clock.time() - virtual_start) / round_index:.1f}s，"
+                  f"卡住 {stalls} 轮，未完成 {failures} 轮，内存 {rss_samples[-1] / 1048576:.1f} MiB")
+
+    wall = time.perf_counter() - wall_start
+    virtual = clock.time() - virtual_start
+    clock.uninstall()
+    if profiler is not None:
+        profiler.stop()
+    # 第一次采样之后的内存增长，排除启动阶段的分配
+    growth = rss_samples[-1] - rss_samples[0] if len(rss_samples) > 1 else rss_samples[-1] - rss_start
+    print("\n" + "=" * 40)
+    print(f"模式 {args.mode}，{args.rounds} 轮，真实用时 {wall:.1f}s ({args.rounds / wall:.1f} 轮/秒)，"
+          f"虚拟用时 {virtual / 3600:.1f} 小时 ({args.rounds * 3600 / virtual:.1f} 轮/小时)")
+    print(f"游戏记录完成 {game.rounds_completed} 轮；卡住 {stalls} 轮，状态机报告未完成 {failures} 轮")
+    if stall_watchdog is not None:
+        days = stall_watchdog.days.values()
+        lost = sum(day["lost_seconds"] for day in days)
+        recoveries = {}
+        for day in days:
+            for name, count in day["recoveries"].items():
+                recoveries[name] = recoveries.get(name, 0) + count
+        print(f"看门狗: 卡住 {sum(day['stalls'] for day in days)} 次，损失 {lost / 60:.1f} 虚拟分钟 "
+              f"({lost / virtual * 100:.1f}%)，恢复动作 {recoveries}")
+    print(f"截图 {screen.grabs} 次 (每轮 {screen.grabs / args.rounds:.1f} 次)，实际OCR {watcher.metrics.counters.get('ocr.calls', 0)} 次")
+    print(f"内存: 开始 {rss_start / 1048576:.1f} MiB，结束 {rss_samples[-1] / 1048576:.1f} MiB，"
+          f"首次采样后增长 {growth / 1048576:.2f} MiB")
+    if profiler is not None:
+        print(f"剖析文件 {profiler.path}，重启OCR引擎 {profiler.restarts} 次")
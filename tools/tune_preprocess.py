@@ -0,0 +1,171 @@
+import argparse
+import glob
+import itertools
+import json
+import os
+import statistics
+import sys
+import time
+from collections import Counter, defaultdict
+from difflib import SequenceMatcher
+
+import cv2
+
+# 让工具脚本可以直接导入 main 目录下的模块
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'main'))
+from config import OCR_BACKEND_OPTIONS, PREPROCESS_PIPELINES_PATH, SIMILARITY_THRESHOLD
+from ocr_backends import create_backend
+from preprocess import DEFAULT_STEPS, PreprocessPipeline, load_pipelines, save_pipelines
+from vision import crop_region, recognize_fixed_region
+
+
+def candidate_steps():
+    """
+    生成所有候选流水线：缩放 × 对比度拉伸 × 二值化方式 × 反色 × 形态学。
+    :return: 步骤列表的列表，第一个是默认流水线。
+    """
+    scales = [None, 0.75, 0.5]
+    stretches = [False, True]
+    binarizations = [
+        {"op": "threshold", "value": 120},
+        {"op": "threshold", "value": 150},
+        {"op": "threshold", "value": 180},
+        {"op": "otsu"},
+        {"op": "adaptive", "block_size": 15, "c": -5},
+    ]
+    inverts = [False, True]
+    morphs = [None, {"op": "morph", "kind": "close", "size": 2}, {"op": "morph", "kind": "open", "size": 2}]
+    candidates = [list(DEFAULT_STEPS)]
+    for scale, stretch, binarize, invert, morph in itertools.product(scales, stretches, binarizations, inverts, morphs):
+        steps = []
+        if scale is not None:
+            steps.append({"op": "resize", "scale": scale})
+        if stretch:
+            steps.append({"op": "stretch"})
+        steps.append(binarize)
+        if invert:
+            steps.append({"op": "invert"})
+        if morph is not None:
+            steps.append(morph)
+        if steps != DEFAULT_STEPS:
+            candidates.append(steps)
+    return candidates
+
+
+def recognize_text(reader, pipeline, frame, min_confidence):
+    """
+    用一条流水线预处理截图并识别，与 OCRWatcher 的快速路径相同。
+    :return: (去掉空格的识别文字, 耗时秒数)
+    """
+    start = time.perf_counter()
+    results, _ = recognize_fixed_region(reader, pipeline.apply(frame), min_confidence)
+    elapsed = time.perf_counter() - start
+    return "".join([res[1] for res in results]).replace(" ", ""), elapsed
+
+
+def is_correct(text, label, target, threshold):
+    """
+    判断一次识别是否正确：有文字的截图要识别得足够像标注；没有目标文字的截图不能被误判为目标。
+    :param text: 识别出的文字。
+    :param label: 标注的文字，空字符串表示截图中没有目标文字。
+    :param target: 该区域的目标文字（标注中最常见的非空文字）。
+    :param threshold: 相似度阈值。
+    """
+    if label:
+        return SequenceMatcher(None, label, text).ratio() >= threshold
+    return not target or SequenceMatcher(None, target, text).ratio() < threshold
+
+
+def evaluate(reader, steps, samples, target, args):
+    """
+    在一个区域的所有截图上评估一条流水线。
+    :param samples: [(截图, 标注), ...]。
+    :return: (准确率, 平均耗时毫秒)
+    """
+    pipeline = PreprocessPipeline(steps)
+    correct = 0
+    timings = []
+    for frame, label in samples:
+        text, elapsed = recognize_text(reader, pipeline, frame, args.min_confidence)
+        correct += int(is_correct(text, label, target, args.threshold))
+        timings.append(elapsed * 1000)
+    return correct / len(samples), statistics.mean(timings)
+
+
+def init_labels(reader, paths, labels_path, min_confidence):
+    """用默认流水线的识别结果生成一份标注文件，人工修正后再用于调参。"""
+    pipeline = PreprocessPipeline()
+    labels = {}
+    for path in paths:
+        text, _ = recognize_text(reader, pipeline, cv2.imread(path), min_confidence)
+        labels[os.path.basename(path)] = text
+    with open(labels_path, "w", encoding="utf-8") as f:
+        json.dump(labels, f, ensure_ascii=False, indent=2)
+    print(f"已为 {len(labels)} 张截图生成标注 {labels_path}。请人工检查：截图中没有目标文字的，标注应为空字符串。")
+
+
+# --- 主程序入口 ---
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="在保存的截图上搜索每个区域识别最准、最快的预处理流水线")
+    parser.add_argument("crops_dir", help="保存截图的目录（OCRWatcher 的 save_crops_dir）")
+    parser.add_argument("--labels", default=None, help="标注文件（JSON：文件名 -> 正确文字），默认为 crops_dir/labels.json")
+    parser.add_argument("--init-labels", action="store_true", help="用默认流水线生成标注文件后退出")
+    parser.add_argument("--output", default=PREPROCESS_PIPELINES_PATH, help="写入结果的流水线配置文件")
+    parser.add_argument("--backend", default="easyocr", help="OCR后端名称")
+    parser.add_argument("--min-confidence", type=float, default=0.5, help="快速路径的最低置信度")
+    parser.add_argument("--threshold", type=float, default=SIMILARITY_THRESHOLD, help="判定识别正确的相似度阈值")
+    parser.add_argument("--tolerance", type=float, default=0.01,
+                        help="准确率与最优相差不超过此值的流水线中，选择最快的一条")
+    parser.add_argument("--top", type=int, default=5, help="每个区域打印排名前几的流水线")
+    args = parser.parse_args()
+
+    paths = sorted(p for p in glob.glob(os.path.join(args.crops_dir, "*.png")) if crop_region(p) is not None)
+    if not paths:
+        print(f"在 {args.crops_dir} 中没有找到 OCRWatcher 保存的截图。")
+        sys.exit(1)
+    labels_path = args.labels or os.path.join(args.crops_dir, "labels.json")
+
+    print("正在初始化 OCR 引擎...")
+    reader = create_backend(args.backend, **OCR_BACKEND_OPTIONS.get(args.backend, {}))
+    if args.init_labels:
+        init_labels(reader, paths, labels_path, args.min_confidence)
+        sys.exit(0)
+    if not os.path.exists(labels_path):
+        print(f"找不到标注文件 {labels_path}，可以先用 --init-labels 生成。")
+        sys.exit(1)
+    with open(labels_path, "r", encoding="utf-8") as f:
+        labels = json.load(f)
+
+    # 按区域分组
+    by_region = defaultdict(list)
+    for path in paths:
+        name = os.path.basename(path)
+        if name in labels:
+            by_region[crop_region(path)].append((cv2.imread(path), labels[name].replace(" ", "")))
+    candidates = candidate_steps()
+    # 预热一次，避免首次推理的额外开销影响耗时
+    first_frame = next(iter(by_region.values()))[0][0]
+    recognize_text(reader, PreprocessPipeline(), first_frame, args.min_confidence)
+
+    chosen = load_pipelines(args.output)
+    for region, samples in sorted(by_region.items()):
+        non_empty = [label for _, label in samples if label]
+        target = Counter(non_empty).most_common(1)[0][0] if non_empty else ""
+        print(f"\n区域 {region}：{len(samples)} 张截图，目标文字 '{target}'，候选流水线 {len(candidates)} 条")
+        scored = []
+        for steps in candidates:
+            accuracy, latency = evaluate(reader, steps, samples, target, args)
+            scored.append((accuracy, latency, steps))
+        best_accuracy = max(accuracy for accuracy, _, _ in scored)
+        # 准确率足够接近最优的流水线里，选最快的
+        eligible = [item for item in scored if item[0] >= best_accuracy - args.tolerance]
+        accuracy, latency, steps = min(eligible, key=lambda item: item[1])
+        default_accuracy, default_latency, _ = scored[0]
+        for rank, (acc, lat, cand) in enumerate(sorted(scored, key=lambda item: (-item[0], item[1]))[:args.top], 1):
+            print(f"  {rank}. 准确率 {acc*100:.1f}%  {lat:.1f} ms  {PreprocessPipeline(cand).describe()}")
+        print(f"  默认流水线: 准确率 {default_accuracy*100:.1f}%  {default_latency:.1f} ms")
+        print(f"  选择: 准确率 {accuracy*100:.1f}%  {latency:.1f} ms  {PreprocessPipeline(steps).describe()}")
+        chosen[region] = steps
+
+    save_pipelines(args.output, chosen)
+    print(f"\n已把 {len(by_region)} 个区域的流水线写入 {args.output}")